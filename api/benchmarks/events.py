@@ -0,0 +1,40 @@
+# Publisher cost of the EventBus with slow subscribers attached: python -m benchmarks.events
+import time
+
+from techxmodule.events import DROP_NEWEST, REQUEST_FIRST_TOKEN, REQUEST_START, TOOL_END, EventBus
+
+
+bus = EventBus()
+received = []
+
+
+def slow(data):
+    time.sleep(0.01)
+
+
+async def collect(batch):
+    received.extend(batch)
+
+
+bus.subscribe("request.*", slow, max_queue=100)
+bus.subscribe("*", collect, batch_size=256, batch_timeout=0.005, max_queue=100_000)
+bus.subscribe("tool.end", lambda data: None, policy=DROP_NEWEST, max_queue=10, inline=True)
+
+count = 100_000
+start = time.perf_counter()
+for index in range(count):
+    bus.publish(REQUEST_FIRST_TOKEN if index % 2 else TOOL_END, {"index": index})
+elapsed = time.perf_counter() - start
+print(f"publish: {elapsed / count * 1e6:.2f} us/event with a 10 ms subscriber attached")
+
+idle = EventBus()
+start = time.perf_counter()
+for _ in range(count):
+    idle.publish(REQUEST_START, None)
+print(f"publish without subscribers: {(time.perf_counter() - start) / count * 1e6:.3f} us/event")
+
+bus.flush(timeout=30)
+for stats in bus.stats():
+    print(stats)
+print(f"batched subscriber received {len(received)} of {count} events")
+bus.close()
@@ -0,0 +1,50 @@
+# Benchmark of the page text extractor against the former BeautifulSoup cleaner of scrape_webpage
+# (needs beautifulsoup4, not a dependency of the server):
+#   python -m benchmarks.extract [page.html ...]
+# Without arguments a synthetic page is used.
+import re
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from techxmodule.extract import LexborHTMLParser, extract_text
+
+
+def clean_html(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    for tag in soup(['script', 'style', 'svg', 'noscript']):
+        tag.decompose()
+    for tag in soup.find_all():
+        tag.attrs = {}
+    cleaned_html = str(soup.body) if soup.body else str(soup)
+    cleaned_html = re.sub(r'\s+', ' ', cleaned_html).strip()
+    return re.sub(r'<[^>]*>\s*</[^>]*>', '', cleaned_html)
+
+
+def measure(name, function, pages):
+    size = sum(len(page) for page in pages)
+    tracemalloc.start()
+    start = time.perf_counter()
+    for page in pages:
+        function(page)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<22} {size / elapsed / 1e6:8.2f} MB/s   peak {peak / 1e6:8.2f} MB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        pages = [open(path, encoding="utf-8", errors="replace").read() for path in sys.argv[1:]]
+    else:
+        paragraph = "<div class='c'><p>Some <b>readable</b> text with a <a href='/x'>link</a>.</p></div>"
+        boilerplate = "<nav><ul>" + "<li><a href='/m'>menu</a></li>" * 50 + "</ul></nav><script>var x = 1;</script>"
+        pages = [f"<html><body>{boilerplate}{paragraph * 5000}</body></html>"]
+
+    measure("clean_html", clean_html, pages)
+    measure("extract_text[python]", lambda page: extract_text(page, 4000, "python"), pages)
+    measure("extract_text[python*]", lambda page: extract_text(page, 10 ** 9, "python"), pages)
+    if LexborHTMLParser is not None:
+        measure("extract_text[lexbor]", lambda page: extract_text(page, 4000, "lexbor"), pages)
@@ -0,0 +1,44 @@
+# Memory of a history held as Message objects vs plain dictionaries: python -m benchmarks.messages
+import tracemalloc
+
+from collections import deque
+
+from techxmodule.messages import ChatMessage, estimate_tokens
+
+
+sessions, turns = 1000, 10
+
+
+def question(session, turn):
+    return f"<request>Question {turn} of session {session}</request>"
+
+
+def build_dicts():
+    histories = []
+    for session in range(sessions):
+        history = deque()
+        for turn in range(turns):
+            history.append({"role": "user", "content": [{"type": "text", "text": question(session, turn)}]})
+            history.append({"role": "assistant", "content": [{"type": "text", "text": "An answer."}]})
+        histories.append((history, deque(estimate_tokens(message) for message in history)))
+    return histories
+
+
+def build_messages():
+    histories = []
+    for session in range(sessions):
+        memory = ChatMessage(max_chat_message=2 * turns)
+        for turn in range(turns):
+            memory.append_message("user", question(session, turn))
+            memory.append_message("assistant", "An answer.")
+        histories.append(memory)
+    return histories
+
+
+for name, build in (("dict messages", build_dicts), ("Message objects", build_messages)):
+    tracemalloc.start()
+    histories = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<16} {size / sessions / 1024:8.1f} KiB per session of {2 * turns} messages")
+    del histories
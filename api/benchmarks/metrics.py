@@ -0,0 +1,25 @@
+# Cost of a histogram observation and of a /metrics scrape: python -m benchmarks.metrics
+import random
+import time
+
+from techxmodule import metrics
+
+
+histogram = metrics.Histogram("benchmark_seconds", "Benchmark.", metrics.TOKEN_LATENCY_BUCKETS)
+values = [random.random() / 10 for _ in range(1_000_000)]
+
+start = time.perf_counter()
+for value in values:
+    histogram.observe(value)
+print(f"observe:      {(time.perf_counter() - start) / len(values) * 1e9:8.1f} ns/value")
+
+start = time.perf_counter()
+histogram.observe_many(values)
+print(f"observe_many: {(time.perf_counter() - start) / len(values) * 1e9:8.1f} ns/value")
+print(f"p50 {histogram.quantile(0.5)}s, p99 {histogram.quantile(0.99)}s")
+
+for tool in ("browsing_web", "scrape_webpage", "retrieve_knowledge"):
+    metrics.TOOL_DURATION.observe(random.random(), labels=(tool,))
+start = time.perf_counter()
+text = metrics.render()
+print(f"render:       {(time.perf_counter() - start) * 1e3:8.2f} ms for {len(text.splitlines())} lines")
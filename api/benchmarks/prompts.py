@@ -0,0 +1,42 @@
+# Prompts/sec of Prompts.build against the previous per-request rendering: python -m benchmarks.prompts
+import time
+import xml.etree.ElementTree as ET
+
+from techxmodule import utils
+from techxmodule.core import Prompts
+from techxmodule.models.chat import Claude
+
+
+model = Claude.__new__(Claude)
+model.name = "claude"
+prompts = Prompts(model)
+
+
+def element(tag, text):
+    node = ET.Element(tag)
+    node.text = text
+    return ET.tostring(node, encoding="unicode", method="xml")
+
+
+def legacy_build(user, context="", example="", instruction=None):
+    return utils.sanitize_input(utils.combine_string([
+        element("context", context) if context else "",
+        element("request", user),
+        model.build_cot_prompt(instruction),
+        element("examples", example) if example else "",
+    ]))
+
+
+instruction = "Answer in the <answer> tag, citing the <documents> you used. " * 20
+example = "<example>Q: What is 2 & 2?\nA: <answer>4</answer></example>\n" * 30
+context = "The user is on the mobile app. Today is Monday."
+users = [f"Question {i}: how do I compare a < b && b > c in Python?" for i in range(1000)]
+
+for name, build in (("legacy", legacy_build), ("compiled", prompts.build)):
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for user in users:
+            build(user, context, example, instruction)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<10} {len(users) / best:12,.0f} prompts/s")
@@ -0,0 +1,44 @@
+# Recall / latency of VectorIndex on clustered random vectors, exact vs IVF: python -m benchmarks.retrieval
+import tempfile
+import time
+
+import numpy as np
+
+from techxmodule.retrieval import VectorIndex
+
+
+count, dim, queries, k = 200_000, 256, 200, 10
+rng = np.random.default_rng(42)
+centers = rng.standard_normal((1000, dim)).astype(np.float32)
+vectors = centers[rng.integers(0, len(centers), count)] + 0.35 * rng.standard_normal((count, dim)).astype(np.float32)
+vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+index = VectorIndex(dim)
+index.add(vectors, [{"text": str(row), "source": "bench", "metadata": {"shard": row % 4}}
+                    for row in range(count)])
+probes = vectors[rng.integers(0, count, queries)] + 0.2 * rng.standard_normal((queries, dim)).astype(np.float32)
+probes /= np.linalg.norm(probes, axis=1, keepdims=True)
+
+
+def run(index, **options):
+    start = time.perf_counter()
+    found = [{record["text"] for _, record in index.search(probe, k, **options)} for probe in probes]
+    return found, (time.perf_counter() - start) / queries * 1000
+
+
+with tempfile.TemporaryDirectory() as directory:
+    start = time.perf_counter()
+    index.save(directory)
+    print(f"save + build IVF ({count} x {dim}): {time.perf_counter() - start:.2f} s")
+    for mapped in (False, True):
+        start = time.perf_counter()
+        loaded = VectorIndex.load(directory, mmap=mapped)
+        print(f"load (mmap={mapped}): {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    truth, exact_ms = run(loaded, mode="exact")
+    print(f"{'exact':<16} {exact_ms:7.2f} ms/query   recall@{k} 1.000")
+    for nprobe in (1, 4, 8, 16, 32):
+        found, elapsed = run(loaded, mode="ann", nprobe=nprobe)
+        recall = np.mean([len(a & b) / k for a, b in zip(found, truth)])
+        print(f"{f'ann nprobe={nprobe}':<16} {elapsed:7.2f} ms/query   recall@{k} {recall:.3f}")
+    _, elapsed = run(loaded, mode="exact", where={"shard": [0, 1]})
+    print(f"{'exact shard 0-1':<16} {elapsed:7.2f} ms/query")
@@ -0,0 +1,39 @@
+# Payload encoding with an image-heavy history, full json.dumps vs encode_payload: python -m benchmarks.serialization
+import base64
+import json
+import os
+import time
+import tracemalloc
+
+from techxmodule.messages import ChatMessage, Image
+from techxmodule.serialization import encode_payload, orjson
+
+
+turns = 20
+images = [Image("base64", "image/png", base64.b64encode(os.urandom(750_000)).decode())
+          for _ in range(turns)]
+memory = ChatMessage(max_chat_message=2 * turns)
+
+
+def envelope(messages):
+    return {"anthropic_version": "bedrock-2023-05-31", "max_tokens": 4096,
+            "system": "You are Gracii.", "messages": messages}
+
+
+def run(name, encode):
+    memory.clear()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for turn in range(turns):
+        memory.append_message("user", f"Describe image {turn}", [images[turn]])
+        encode(envelope(list(memory.messages)))
+        memory.append_message("assistant", "It is a picture.")
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<28} {elapsed / turns * 1000:8.2f} ms/turn   peak alloc {peak / 1e6:8.2f} MB")
+
+
+run("json.dumps (full history)",
+    lambda payload: json.dumps(payload, default=lambda obj: obj.__json__()).encode("utf-8"))
+run(f"encode_payload ({'orjson' if orjson else 'json'})", encode_payload)
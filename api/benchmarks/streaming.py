@@ -0,0 +1,24 @@
+# Decoding throughput of ClaudeStreamDecoder on a long text stream: python -m benchmarks.streaming
+import json
+import time
+
+from techxmodule.streaming import ClaudeStreamDecoder
+
+
+text_event = json.dumps({"type": "content_block_delta", "index": 0,
+                         "delta": {"type": "text_delta", "text": "Hello world "}}).encode()
+events = [json.dumps({"type": "content_block_start", "index": 0,
+                      "content_block": {"type": "text", "text": ""}}).encode()]
+events += [text_event] * 100_000
+events += [json.dumps({"type": "content_block_stop", "index": 0}).encode(),
+           json.dumps({"type": "message_delta", "delta": {"stop_reason": "end_turn"},
+                       "usage": {"output_tokens": 100_000}}).encode()]
+
+decoder = ClaudeStreamDecoder()
+start = time.perf_counter()
+for raw in events:
+    decoder.feed_bytes(raw)
+length = len(decoder.text)
+elapsed = time.perf_counter() - start
+print(f"{len(events)} events, {length} chars in {elapsed:.3f}s "
+      f"({len(events) / elapsed:,.0f} events/s)")
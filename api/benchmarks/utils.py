@@ -0,0 +1,78 @@
+# Benchmark against the previous string-concatenating versions of the utils helpers: python -m benchmarks.utils
+import re
+import time
+
+from techxmodule.utils import clean_tag, combine_string, json_to_xml
+
+
+def legacy_combine_string(list_of_string):
+    result = ""
+    for s in list_of_string:
+        result = result + s + "\n"
+    return result
+
+
+def legacy_json_to_xml(json_obj):
+    def parse_value(key, value):
+        if isinstance(value, dict):
+            return f"<{key}>{dict_to_xml(value)}</{key}>"
+        elif isinstance(value, list):
+            return f"<{key}>" + "".join([parse_value(key[:-1] if key.endswith('s') else key, item) for item in value]) + f"</{key}>"
+        else:
+            return f"<{key}>{value}</{key}>"
+
+    def dict_to_xml(d):
+        xml = ""
+        for key, value in d.items():
+            xml += parse_value(key, value)
+        return xml
+
+    return dict_to_xml(json_obj)
+
+
+def bench(name, function, argument, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<44} {best * 1000:9.2f} ms")
+
+
+results = {"results": [{"title": f"Result {i} & more", "href": f"https://example.com/{i}?a=1&b=2",
+                        "body": "Lorem ipsum <b>dolor</b> sit amet. " * 8} for i in range(10_000)]}
+bench("json_to_xml legacy (unescaped), 10k results", legacy_json_to_xml, results)
+bench("json_to_xml, 10k search results", json_to_xml, results)
+
+lines = [f"line {i} " * 10 for i in range(10_000)]
+bench("combine_string legacy, 10k lines", legacy_combine_string, lines)
+bench("combine_string, 10k lines", combine_string, lines)
+
+
+def nested(depth):
+    document = {"leaf": "value"}
+    for level in range(depth):
+        document = {f"level{level}": document, "items": [1, 2, 3]}
+    return document
+
+
+bench("json_to_xml legacy, depth 300", legacy_json_to_xml, nested(300))
+bench("json_to_xml, depth 300", json_to_xml, nested(300))
+bench("json_to_xml, depth 20000 (legacy overflows)", json_to_xml, nested(20_000))
+
+# TagScanner against a DOTALL regex on large prompts (equivalence: tests/test_utils.py)
+reference = re.compile(r"<(instructions|examples|context|documents)>.*?</\1>", re.DOTALL)
+legacy_pattern = r"<(instructions|examples|context|documents)>.*?</\1>"
+
+block = "<context>\n" + "Retrieved paragraph with details.\n" * 50 + "</context>\n"
+prompt = (block + "<request>What changed?</request>\n<instructions>Think first.</instructions>\n") * 2000
+bench(f"clean_tag legacy (single line only), {len(prompt) // 1_000_000} MB prompt",
+      lambda text: re.sub(legacy_pattern, "", text), prompt)
+bench("clean_tag regex (DOTALL)", lambda text: reference.sub("", text), prompt)
+bench("clean_tag TagScanner", clean_tag, prompt)
+print(f"{'prompt size after clean_tag':<44} {len(re.sub(legacy_pattern, '', prompt)):>9} legacy, "
+      f"{len(clean_tag(prompt))} now")
+
+unclosed = "<context>" * 5_000
+bench("clean_tag regex (DOTALL), 5k unclosed tags", lambda text: reference.sub("", text), unclosed, repeat=1)
+bench("clean_tag TagScanner, 5k unclosed tags", clean_tag, unclosed)
@@ -1,15 +1,24 @@
 import logging
 import uvicorn
 from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import HTTPException
 import asyncio
-from io import StringIO
-import json
+import math
+import os
+import time
+import uuid
 import boto3
+from starlette.background import BackgroundTask
+from techxmodule import clients, metrics
+from techxmodule.admission import AdmissionController, Overloaded
 from techxmodule.models.chat import Claude
+from techxmodule.routing import BedrockRouter, Endpoint, THROTTLING_CODES, error_code
 from techxmodule.core import Prompts
+from techxmodule.responses import ResponseCache
+from techxmodule.sessions import create_session_store
+from techxmodule.streaming import ClaudeStreamDecoder, TextDelta
 from techxmodule.utils import real_time
 from toolsdata import return_tool
 
@@ -30,18 +39,89 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Session-Id"],  # Lets the web client read the id of a new session
 )
 
-# Create the Claude LLM instance once, outside the request handler
-llm = Claude("3.5-sonnet", boto3.Session(), "us-east-1", 10)
+# One pooled Bedrock client per region is shared by every session
+clients.configure(max_pool_connections=int(os.getenv("GRACII_BEDROCK_MAX_POOL", "100")))
+
+# Set GRACII_FAKE_BEDROCK=1 to serve from a local fake Bedrock stream (offline load tests).
+if os.getenv("GRACII_FAKE_BEDROCK"):
+    from techxmodule.stub import FakeSession
+    bedrock_session = FakeSession(token_delay=float(os.getenv("GRACII_FAKE_TOKEN_DELAY", "0.01")))
+else:
+    bedrock_session = boto3.Session()
+# Create the Claude LLM instance once, outside the request handler.
+# Every session gets a copy of it bound to its own memory, sharing the Bedrock client.
+# Prompt caching needs a model supporting it on Bedrock, e.g. GRACII_MODEL=3.5-sonnet-v2
+llm = Claude(os.getenv("GRACII_MODEL", "3.5-sonnet"), bedrock_session, "us-east-1", 10, 
+             max_memory_tokens=60000,
+             prompt_caching=os.getenv("GRACII_PROMPT_CACHING") == "1")
+
+# Admission control: concurrency cap, wait queue and token buckets adapting to throttling
+admission = AdmissionController(
+    max_concurrent=int(os.getenv("GRACII_MAX_CONCURRENT", "64")),
+    max_queue=int(os.getenv("GRACII_MAX_QUEUE", "128")),
+    queue_timeout=float(os.getenv("GRACII_QUEUE_TIMEOUT", "10")),
+    rate=float(os.getenv("GRACII_RATE_LIMIT", "20")),
+    session_rate=float(os.getenv("GRACII_SESSION_RATE_LIMIT", "0.5")),
+)
+
+# Spread requests over several regions, e.g. GRACII_BEDROCK_REGIONS=us-east-1,us-west-2,
+# failing over to GRACII_FALLBACK_MODEL (e.g. 3-haiku) when every region is throttled
+bedrock_regions = [region.strip() for region in os.getenv("GRACII_BEDROCK_REGIONS", "").split(",") if region.strip()]
+if bedrock_regions:
+    endpoints = [Endpoint(region, llm.modelId) for region in bedrock_regions]
+    fallback_model = os.getenv("GRACII_FALLBACK_MODEL")
+    if fallback_model:
+        fallback_id = Claude.resolve_model_id(fallback_model)
+        endpoints += [Endpoint(region, fallback_id, tier=1) for region in bedrock_regions]
+    router = BedrockRouter(endpoints, bedrock_session)
+    router.throttle_listeners.append(admission.on_throttle)
+    llm.set_router(router)
+# Knowledge base results use the cut-off of their embedder unless GRACII_KB_MIN_RELEVANCE is set
+if os.getenv("GRACII_KB_MIN_RELEVANCE"):
+    llm.KB_MIN_RELEVANCE = float(os.getenv("GRACII_KB_MIN_RELEVANCE"))
 prompt_construct = Prompts(llm)
 llm.tool_add(return_tool())
-llm.memory.messages.clear()
+llm.memory.clear()
+
+# Opt-in cache of answers to repeated first questions (GRACII_RESPONSE_CACHE=1),
+# rephrasings with the same content words share an answer, time-sensitive questions are never cached
+response_cache = None
+if os.getenv("GRACII_RESPONSE_CACHE") == "1":
+    response_cache = ResponseCache(ttl=float(os.getenv("GRACII_RESPONSE_CACHE_TTL", "600")),
+                                   path=os.getenv("GRACII_RESPONSE_CACHE_DB"))
+
+# Latency and token histograms fed by the model lifecycle events, served on /metrics.
+# GRACII_OTEL=1 also exports requests and tool calls as OpenTelemetry spans
+# (needs opentelemetry-api and a configured SDK)
+metrics.attach(llm.event_bus)
+metrics.registry.add_collector(lambda: metrics.gauges("gracii_admission", admission.stats()))
+if response_cache is not None:
+    metrics.registry.add_collector(lambda: metrics.gauges("gracii_response_cache", response_cache.stats()))
+if bedrock_regions:
+    metrics.registry.add_collector(lambda: [
+        sample for endpoint in router.stats()
+        for sample in metrics.gauges("gracii_router",
+                                     {"outstanding": endpoint["outstanding"], "open": int(endpoint["breaker"] != "closed")},
+                                     {"region": endpoint["region"], "model_id": endpoint["model_id"]})])
+if os.getenv("GRACII_OTEL") == "1":
+    metrics.OpenTelemetryExporter(llm.event_bus)
+
+# Session-keyed conversation store ("memory" or "sqlite")
+session_backend = os.getenv("GRACII_SESSION_STORE", "memory")
+session_store = create_session_store(
+    session_backend,
+    max_chat_message=llm.memory.max_chat_message,
+    max_tokens=llm.memory.max_tokens,
+    **({"path": os.getenv("GRACII_SESSION_DB", "sessions.db")} if session_backend == "sqlite" else {})
+)
 
 # System prompt or instructions to guide the LLM
 system_prompt = f"""
     - You have access to the real time. You know what time it is right now.
-    - The current real time is: {real_time()}
+    - The current real time is given in the <context> of each request.
     
     <role>
     Your name is Gracii.
@@ -82,90 +162,89 @@ example = f"""
     """
     
 
-def accumulate_response(system_prompt):
-    full_response = StringIO()  # Using StringIO to accumulate the streamed output
-    tool_input = StringIO()
-    tools = []
-    body = []
+async def accumulate_response(llm, session_id, system_prompt, cache_entry=None):
+    decoder = ClaudeStreamDecoder()  # Shared incremental parser for the Claude stream events
+    started = time.perf_counter()
+    tool_rounds = 0
 
     # The main loop for generating the response
     while True:
         
         try:
         
-            stop_reason = ""
-            # Stream and yield chunks of the response
-            result = llm.invoke(system_prompt=system_prompt, temperature=0.25, top_p=0.9, top_k=60, streaming=True)
+            decoder.reset()
+            # Stream and yield chunks of the response without blocking the event loop
+            async for event in llm.astream(system_prompt=system_prompt, temperature=0.25, top_p=0.9, top_k=60, decoder=decoder):
+                if type(event) is TextDelta:
+                    yield event.text
             
-            for event in result.get("body"):
-                
-                chunk = json.loads(event["chunk"]["bytes"])
-
-                # Debugging info
-                if chunk['type'] == 'message_delta':
-                    stop_reason = chunk['delta'].get('stop_reason', '')
-                    stop_sequence = chunk['delta'].get('stop_sequence', '')
-                    output_token = chunk['usage']['output_tokens']
-
-                # Processing streaming content
-                if chunk['type'] == 'content_block_delta':
-                    if chunk['delta']['type'] == 'text_delta':
-                        text_chunk = chunk['delta']['text']
-                        # print(colored(text_chunk, "green"), end="", flush=True)
-                        yield text_chunk
-                        full_response.write(text_chunk)
-                    elif chunk['delta']['type'] == 'input_json_delta':
-                        tool_input.write(chunk['delta']['partial_json'])
-                
-                # Record the tool need to use
-                if chunk['type'] == 'content_block_start' and chunk['index'] != 0:
-                    tool_index = chunk['index'] - 1
-                    tool_id = chunk['content_block']['id']
-                    tool_name = chunk['content_block']['name']
-
-                # End of content block
-                if chunk['type'] == 'content_block_stop':
-                    if chunk['index'] == 0:
-                        body.append({"type": "text", "text": full_response.getvalue()})
-                    else:
-                        try:
-                            tool_input_json = json.loads(tool_input.getvalue())
-                        except json.JSONDecodeError:
-                            tool_input_json = {}
-
-                        tools.append({
-                            "type": "tool_use",
-                            "id": tool_id,
-                            "name": tool_name,
-                            "input": tool_input_json
-                        })
-                        body.append(tools[-1])
-                        tool_input = StringIO()
+            logger.info(f"Usage: {decoder.usage} "
+                        f"(cache read: {decoder.cache_read_tokens}, cache write: {decoder.cache_write_tokens})")
                 
             # Check if the response requests a tool
-            if stop_reason == "tool_use":
+            if decoder.stop_reason == "tool_use":
                 
                 # Add tool results to memory and continue generating responses
-                llm.add_tool_to_memory(body)  # Add the tool request to memory
-                tool_result = llm.tool_use(tools)
+                llm.add_tool_to_memory(decoder.body)  # Add the tool request to memory
+                tool_result = await asyncio.to_thread(llm.tool_use, decoder.tools)
                 logger.info(tool_result)
                 llm.add_tool_result_to_memory(tool_result)  # Add tool result to memory
+                cache_entry = None  # Tool results are live data, never cache the answer
+                tool_rounds += 1
                 
                 # Re-invoke the LLM with the tool result added
                 continue  # Go back to the LLM for further processing with the tool results
             
             # If the response is complete (end_turn), add to memory and break
-            elif stop_reason == "end_turn":
-                llm.add_to_memory("assistant", full_response.getvalue())
+            elif decoder.stop_reason == "end_turn":
+                llm.add_to_memory("assistant", decoder.text)
+                session_store.save(session_id, llm.memory)
+                admission.on_success()
+                if cache_entry is not None:
+                    prompt, question = cache_entry
+                    response_cache.store(prompt, system_prompt, decoder.text,
+                                         latency=time.perf_counter() - started, question=question)
                 break
             
+            # Any other stop reason (max_tokens, stop_sequence, ...) ends the turn
+            break
+            
         except asyncio.CancelledError:
             logger.warning("Request cancelled by client")
-            return  # Exit the function when cancellation happens
+            raise  # Let the cancellation propagate to close the stream
         
         except Exception as ex:
+            # With a router, throttling already reached admission through its throttle listener
+            if not bedrock_regions and error_code(ex) in THROTTLING_CODES:
+                admission.on_throttle()  # Back off before Bedrock throttles everyone
             logger.error(f"Error occurred during streaming: {ex}")
             break
+    
+    metrics.TOOL_LOOP_ITERATIONS.observe(tool_rounds)
+
+
+async def replay_response(llm, session_id, text):
+    # Stream a cached answer like a live one, and keep the conversation consistent
+    for chunk in response_cache.replay(text):
+        yield chunk
+    llm.add_to_memory("assistant", text)
+    session_store.save(session_id, llm.memory)
+    logger.info(f"Answered from response cache: {response_cache.stats()}")
+
+
+def release(*holds):
+    for hold in holds:
+        if hold is not None:
+            hold.release()
+
+
+async def release_after(stream, *holds):
+    # Hold the admission slot and the session turn until the response stream ends, even if the client left
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        release(*holds)
 
 
 @app.post("/chat")
@@ -173,6 +252,7 @@ async def chat(
     request: Request,
 ):
     
+    ticket = turn = None
     try:
         logger.info(f"Received request with headers: {request.headers}")
         logger.info(f"Received request with body: {await request.body()}")
@@ -180,24 +260,66 @@ async def chat(
         # Retrieve request
         data = await request.json()
         user_message = data.get("message", "")
+        # A client without a session id starts a new conversation and gets its id back
+        session_id = data.get("session_id") or request.headers.get("X-Session-Id") or uuid.uuid4().hex
+        headers = {"X-Session-Id": session_id}
 
-        # Process the prompt
-        prompt = prompt_construct.build(user=user_message, instruction=instruction, example=example)
-        llm.add_to_memory("user", prompt)
+        # Wait for capacity, or reject quickly with 429 / 503
+        ticket = await admission.acquire(session_id)
+        # One turn at a time per conversation
+        turn = await session_store.begin_turn(session_id)
+
+        # Bind the model to the conversation of this session only
+        session_llm = llm.with_memory(session_store.load(session_id))
+
+        # Process the prompt, the current time goes to the context so the system prompt stays cacheable
+        prompt = prompt_construct.build(user=user_message, context=f"The current real time is: {real_time()}",
+                                        instruction=instruction, example=example)
+        # Only the first question of a conversation does not depend on the history.
+        # Answers are cached on the prompt without the time, time-sensitive questions are not cached
+        cache_entry = None
+        if response_cache is not None and not session_llm.memory.messages:
+            cache_entry = (prompt_construct.build(user=user_message, instruction=instruction, example=example), user_message)
+        session_llm.add_to_memory("user", prompt)
+
+        if cache_entry is not None:
+            cached = response_cache.lookup(cache_entry[0], system_prompt, question=user_message)
+            if cached is not None:
+                metrics.CHAT_REQUESTS.inc(labels=("cache_hit",))
+                return StreamingResponse(release_after(replay_response(session_llm, session_id, cached["text"]), ticket, turn),
+                                         media_type="text/markdown", headers=headers,
+                                         background=BackgroundTask(release, ticket, turn))
         
         # Create and return a StreamingResponse using the generator
-        return StreamingResponse(accumulate_response(system_prompt), media_type="text/markdown")
+        # The background task frees the slot and the turn if the stream never started
+        metrics.CHAT_REQUESTS.inc(labels=("streamed",))
+        return StreamingResponse(release_after(accumulate_response(session_llm, session_id, system_prompt, cache_entry), ticket, turn),
+                                 media_type="text/markdown", headers=headers,
+                                 background=BackgroundTask(release, ticket, turn))
+    
+    except Overloaded as e:
+        metrics.CHAT_REQUESTS.inc(labels=(f"rejected_{e.status_code}",))
+        logger.warning(f"Request rejected ({e.status_code}): {e.reason}, {admission.stats()}")
+        raise HTTPException(status_code=e.status_code, detail=e.reason,
+                            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
     
     except asyncio.CancelledError:
+        release(ticket, turn)
         logger.warning("Request cancelled by client")
-        llm.memory.messages.pop(-1)
         raise HTTPException(status_code=499, detail="Client closed request")  # Return 499 when client disconnects.
     
     except Exception as e:
+        release(ticket, turn)
+        metrics.CHAT_REQUESTS.inc(labels=("error",))
         logger.error(f"An error occurred: {e}")
-        llm.memory.messages.pop(-1)
         raise HTTPException(status_code=500, detail="Internal server Error")  # Return 500 when server is error.
 
 
+@app.get("/metrics")
+async def get_metrics():
+    # Prometheus text format: latency histograms, token counters, admission and cache gauges
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="127.0.0.1", port=8000, log_level="info")
@@ -0,0 +1,296 @@
+import asyncio
+import threading
+import time
+
+from collections import OrderedDict, deque
+from typing import Dict
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request is not admitted.
+
+    @param status_code: 429 when a rate limit is exceeded, 503 when the server is saturated.
+    @param retry_after: Seconds the client should wait before retrying.
+    @param reason: Human readable reason.
+    """
+
+    def __init__(self, status_code: int, retry_after: float, reason: str) -> None:
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate` tokens per second.
+
+    @param rate: Tokens added per second.
+    @param capacity: Maximum number of tokens (burst size).
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+    def can_acquire(self, tokens: float = 1) -> bool:
+        """
+        @return: Whether `try_acquire` would take the tokens now, without taking them.
+        """
+        with self._lock:
+            self._refill()
+            return self.tokens >= tokens
+
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """
+        @return: Whether the tokens were taken.
+        """
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+
+    def time_until(self, tokens: float = 1) -> float:
+        """
+        @return: Seconds until the given number of tokens is available.
+        """
+        with self._lock:
+            self._refill()
+            missing = tokens - self.tokens
+            return max(0.0, missing / self.rate) if self.rate > 0 else float("inf")
+
+
+class Ticket:
+    """
+    Admission of one request, holding a concurrency slot until released.
+    Releasing twice is harmless.
+    """
+    __slots__ = ("_controller", "_released")
+
+    def __init__(self, controller: "AdmissionController") -> None:
+        self._controller = controller
+        self._released = False
+
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+
+class AdmissionController:
+    """
+    Admission control and backpressure for chat requests.
+
+    A request must pass its session token bucket and the global token bucket
+    (429 otherwise), then get one of `limit` concurrency slots. When all slots are
+    busy it waits in a bounded FIFO queue, and is rejected with 503 when the queue
+    is full or its deadline passes.
+
+    The concurrency limit and the global rate adapt to Bedrock throttling (AIMD):
+    every throttling signal cuts them by `decrease_factor` (at most once per
+    `decrease_interval`), and every `increase_every` successful responses add one
+    slot back, up to the configured maximum.
+
+    Must be used from one event loop; `on_throttle` may be called from any thread.
+
+    @param max_concurrent: Maximum concurrent requests.
+    @param min_concurrent: Floor of the adaptive concurrency limit.
+    @param max_queue: Maximum number of requests waiting for a slot.
+    @param queue_timeout: Seconds a request may wait for a slot.
+    @param rate: Global requests per second.
+    @param burst: Global bucket capacity.
+    @param session_rate: Requests per second for one session.
+    @param session_burst: Session bucket capacity.
+    @param max_sessions: Number of session buckets kept (least recently used are dropped).
+    @param decrease_factor: Multiplier applied to the limits on throttling.
+    @param decrease_interval: Minimum seconds between two decreases.
+    @param increase_every: Successful responses needed to add one slot back.
+    """
+
+    def __init__(self, max_concurrent: int = 64,
+                 min_concurrent: int = 4,
+                 max_queue: int = 128,
+                 queue_timeout: float = 10,
+                 rate: float = 20,
+                 burst: float = 40,
+                 session_rate: float = 0.5,
+                 session_burst: float = 5,
+                 max_sessions: int = 10000,
+                 decrease_factor: float = 0.7,
+                 decrease_interval: float = 2,
+                 increase_every: int = 10) -> None:
+        self.max_concurrent = max_concurrent
+        self.min_concurrent = min(min_concurrent, max_concurrent)
+        self.limit = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_rate = rate
+        self.bucket = TokenBucket(rate, burst)
+        self.session_rate = session_rate
+        self.session_burst = session_burst
+        self.max_sessions = max_sessions
+        self.decrease_factor = decrease_factor
+        self.decrease_interval = decrease_interval
+        self.increase_every = increase_every
+
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.throttled = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._sessions: OrderedDict = OrderedDict()
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+
+    async def acquire(self, session_id: str = "default") -> Ticket:
+        """
+        Admit a request or raise `Overloaded`.
+
+        @param session_id: Session the request belongs to.
+        @return: Ticket to release when the response is finished.
+        @raises Overloaded: When a rate limit is exceeded, the queue is full or the deadline passed.
+        """
+        session_bucket = self._session_bucket(session_id)
+        # Check both buckets before taking from either, a rejected request costs no token
+        if not session_bucket.can_acquire():
+            self._reject(429, session_bucket.time_until(), "Too many requests for this session")
+        if not self.bucket.can_acquire():
+            self._reject(429, self.bucket.time_until(), "Too many requests")
+        session_bucket.try_acquire()
+        self.bucket.try_acquire()
+
+        if self.active < self.limit and not self._waiters:
+            return self._admit()
+        if len(self._waiters) >= self.max_queue:
+            self._reject(503, self.queue_timeout, "Server is overloaded")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()  # The slot was granted to a client that left
+            else:
+                self._forget(waiter)
+            raise
+        if not waiter.done():
+            self._forget(waiter)
+            self._reject(503, self.queue_timeout, "Timed out waiting for capacity")
+        self.admitted += 1
+        return Ticket(self)
+
+
+    def on_throttle(self, *args) -> None:
+        """
+        Signal throttling from Bedrock: decrease the concurrency limit and global rate.
+        Accepts and ignores any arguments, so it can be a `BedrockRouter` throttle listener.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.throttled += 1
+            self._successes = 0
+            if now - self._last_decrease < self.decrease_interval:
+                return
+            self._last_decrease = now
+            self.limit = max(self.min_concurrent, int(self.limit * self.decrease_factor))
+            self.bucket.rate = max(self.max_rate * self.min_concurrent / self.max_concurrent,
+                                   self.bucket.rate * self.decrease_factor)
+
+
+    def on_success(self) -> None:
+        """
+        Signal a successful response: slowly restore the limits after throttling.
+        Must be called from the event loop, freed slots are handed to waiters.
+        """
+        with self._lock:
+            if self.limit >= self.max_concurrent:
+                return
+            self._successes += 1
+            if self._successes < self.increase_every:
+                return
+            self._successes = 0
+            self.limit += 1
+            self.bucket.rate = min(self.max_rate, self.bucket.rate + self.max_rate / self.max_concurrent)
+        self._wake()
+
+
+    def stats(self) -> Dict:
+        """
+        @return: Current limits and counters.
+        """
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "rate": round(self.bucket.rate, 3),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+        }
+
+
+    def _session_bucket(self, session_id: str) -> TokenBucket:
+        bucket = self._sessions.get(session_id)
+        if bucket is None:
+            bucket = TokenBucket(self.session_rate, self.session_burst)
+            self._sessions[session_id] = bucket
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return bucket
+
+
+    def _admit(self) -> Ticket:
+        self.active += 1
+        self.admitted += 1
+        return Ticket(self)
+
+
+    def _reject(self, status_code: int, retry_after: float, reason: str) -> None:
+        self.rejected += 1
+        raise Overloaded(status_code, retry_after, reason)
+
+
+    def _forget(self, waiter: asyncio.Future) -> None:
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+
+    def _release(self) -> None:
+        self.active -= 1
+        self._wake()
+
+
+    def _wake(self) -> None:
+        """
+        Hand free slots to the oldest waiters still waiting.
+        """
+        while self._waiters and self.active < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.active += 1
+            waiter.set_result(None)
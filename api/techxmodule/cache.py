@@ -0,0 +1,266 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+_MISSING = object()
+_WHITESPACE = re.compile(r"\s+")
+
+
+class _Database:
+    """
+    One SQLite connection to a cache file, shared by every cache persisted in it.
+    The connection may be used from any thread while holding `lock`.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, "
+                "value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+
+
+_databases: Dict[str, _Database] = {}
+_databases_lock = threading.Lock()
+
+
+def _database(path: str) -> _Database:
+    """
+    @return: The shared connection of a cache file (":memory:" gets a private database).
+    """
+    if path == ":memory:":
+        return _Database(path)
+    path = os.path.abspath(path)
+    with _databases_lock:
+        database = _databases.get(path)
+        if database is None:
+            database = _databases[path] = _Database(path)
+        return database
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a time-to-live.
+
+    Optionally writes entries through to a SQLite file, so results survive restarts
+    and are shared by the workers running on the same machine. Caches persisted in
+    the same file share one connection and one table. Every `purge_interval` seconds
+    a write deletes the expired rows of the file, then the rows expiring first
+    beyond `max_rows`.
+
+    @param maxsize: Maximum number of entries kept in memory.
+    @param ttl: Seconds an entry stays valid.
+    @param path: Optional SQLite file for on-disk persistence. Values must be JSON-serializable.
+    @param max_rows: Maximum number of rows in the SQLite file (default: 4 * maxsize).
+    @param purge_interval: Seconds between two purges of the SQLite file.
+    """
+
+    def __init__(self, maxsize: int = 256,
+                 ttl: float = 300,
+                 path: Optional[str] = None,
+                 max_rows: Optional[int] = None,
+                 purge_interval: float = 60) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_rows = max_rows or 4 * maxsize
+        self.purge_interval = purge_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._database = _database(path) if path else None
+        self._next_purge = time.time() + purge_interval
+
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Return the cached value of a key.
+
+        @param key: Cache key.
+        @param default: Value returned on a miss.
+        @return: The cached value, or `default` if missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            value = self._load(key, now)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entries beyond `maxsize`.
+
+        @param key: Cache key.
+        @param value: Value to cache.
+        """
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+            if self._database is not None:
+                with self._database.lock, self._database.connection as connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(value), expires_at)
+                    )
+                if now >= self._next_purge:
+                    self.purge(now)
+
+
+    def purge(self, now: Optional[float] = None) -> int:
+        """
+        Delete the expired rows of the SQLite file, then the rows expiring first beyond `max_rows`.
+
+        @param now: Current time (default: time.time()).
+        @return: Number of deleted rows.
+        """
+        if self._database is None:
+            return 0
+        now = time.time() if now is None else now
+        self._next_purge = now + self.purge_interval
+        with self._database.lock, self._database.connection as connection:
+            deleted = connection.execute("DELETE FROM cache WHERE expires_at <= ?", (now,)).rowcount
+            overflow = connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_rows
+            if overflow > 0:
+                deleted += connection.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires_at LIMIT ?)",
+                    (overflow,)
+                ).rowcount
+        return deleted
+
+
+    def clear(self) -> None:
+        """
+        Drop every entry, on disk too.
+        """
+        with self._lock:
+            self._entries.clear()
+            if self._database is not None:
+                with self._database.lock, self._database.connection as connection:
+                    connection.execute("DELETE FROM cache")
+
+
+    def stats(self) -> dict:
+        """
+        @return: Hit/miss counters and current size of the cache.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+            "maxsize": self.maxsize
+        }
+
+
+    def _store(self, key: str, value: Any, expires_at: float) -> None:
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+    def _load(self, key: str, now: float) -> Any:
+        """
+        Look a key up on disk and promote it to memory.
+        """
+        if self._database is None:
+            return _MISSING
+        with self._database.lock:
+            row = self._database.connection.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[1] <= now:
+                with self._database.connection as connection:
+                    connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return _MISSING
+        if row is None:
+            return _MISSING
+        value = json.loads(row[0])
+        self._store(key, value, row[1])
+        return value
+
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CachePolicy:
+    """
+    Caching policy a tool can opt in to through `Tools.tool(..., cache=CachePolicy(...))`.
+
+    @param ttl: Seconds a result stays valid.
+    @param maxsize: Maximum number of results kept in memory.
+    @param path: Optional SQLite file to persist results on disk.
+    @param max_rows: Maximum number of rows in the SQLite file, shared by every tool
+                     using it (default: 4 * maxsize), see `TTLCache`.
+    @param normalize: Function applied to string arguments before building the key.
+                      Defaults to lower-casing and collapsing whitespace.
+    """
+
+    def __init__(self, ttl: float = 300,
+                 maxsize: int = 256,
+                 path: Optional[str] = None,
+                 max_rows: Optional[int] = None,
+                 normalize: Optional[Callable[[str], str]] = None) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.path = path
+        self.max_rows = max_rows
+        self.normalize = normalize or normalize_text
+
+
+    def create_cache(self) -> TTLCache:
+        return TTLCache(maxsize=self.maxsize, ttl=self.ttl, path=self.path, max_rows=self.max_rows)
+
+
+    def make_key(self, name: str, arguments: dict) -> str:
+        """
+        Build the cache key of a call from the tool name and its bound arguments.
+
+        @param name: Tool name.
+        @param arguments: Mapping of parameter name to value, defaults applied.
+        @return: A stable string key.
+        """
+        normalized = {
+            key: self.normalize(value) if isinstance(value, str) else value
+            for key, value in arguments.items()
+        }
+        return name + ":" + json.dumps(normalized, sort_keys=True, default=str)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lower-case a string and collapse its whitespace.
+
+    @param text: input text
+    @return: normalized text
+    """
+    return _WHITESPACE.sub(" ", text).strip().lower()
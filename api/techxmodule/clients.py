@@ -0,0 +1,86 @@
+import copy
+import threading
+import weakref
+
+from typing import Any, Dict
+
+
+# Defaults tuned for long Bedrock response streams shared by many sessions
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "max_pool_connections": 50,
+    "tcp_keepalive": True,
+    "connect_timeout": 10,
+    "read_timeout": 300,
+    "retries": {"mode": "adaptive", "max_attempts": 5},
+}
+
+# session -> {(region, frozen options): client}, dropped with the session
+_clients: "weakref.WeakKeyDictionary[Any, Dict[tuple, Any]]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def configure(**config) -> None:
+    """
+    Change the process-wide default client settings.
+    Only clients created afterwards are affected.
+
+    @param config: botocore `Config` options, e.g. max_pool_connections=100.
+    """
+    with _lock:
+        DEFAULT_CONFIG.update(config)
+
+
+def get_runtime_client(session: Any, region_name: str, **config) -> Any:
+    """
+    Return the shared "bedrock-runtime" client for a session, region and config.
+
+    Creating a botocore client loads the service model, resolves credentials and
+    opens its own connection pool, so clients are created once per process and
+    reused by every model object. botocore clients are thread-safe.
+
+    Clients are keyed on the session object, not on its profile name or resolved
+    keys: two sessions built with different explicit keys never share a client,
+    credentials are not looked up on every model creation, and botocore refreshes
+    rotating (STS, SSO) credentials inside the existing client. Share one session
+    to share its clients; they are released when the session is garbage collected.
+
+    @param session: boto3 Session (or a compatible object, see `stub.FakeSession`).
+    @param region_name: AWS region name.
+    @param config: botocore `Config` options overriding `DEFAULT_CONFIG`.
+    @return: The bedrock-runtime client.
+    """
+    from botocore.config import Config  # Deferred, botocore is slow to import
+
+    with _lock:
+        options = {**DEFAULT_CONFIG, **config}
+    key = (region_name, _freeze(options))
+    with _lock:
+        session_clients = _clients.get(session)
+        if session_clients is None:
+            session_clients = _clients[session] = {}
+        client = session_clients.get(key)
+        if client is None:
+            client = session.client("bedrock-runtime",
+                                    region_name=region_name,
+                                    config=Config(**copy.deepcopy(options)))
+            session_clients[key] = client
+        return client
+
+
+def clear() -> None:
+    """
+    Forget every shared client.
+    """
+    with _lock:
+        _clients.clear()
+
+
+def _freeze(value: Any) -> Any:
+    """
+    Turn nested dicts and lists into a hashable key.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
@@ -0,0 +1,164 @@
+import hashlib
+import re
+
+from typing import Dict, Iterable, List, Optional
+
+from techxmodule.extract import truncate
+from techxmodule.messages import approximate_tokens
+from techxmodule.utils import XMLWriter, iterate_through_location
+
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def shingles(text: str, size: int = 5) -> frozenset:
+    """
+    Hash the overlapping word n-grams of a text, for near-duplicate detection.
+
+    @param text: input text
+    @param size: Words per shingle.
+    @return: Set of shingle hashes.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return frozenset([hash(" ".join(words))]) if words else frozenset()
+    return frozenset(hash(" ".join(words[i:i + size])) for i in range(len(words) - size + 1))
+
+
+def jaccard(first: frozenset, second: frozenset) -> float:
+    if not first or not second:
+        return 0.0
+    if len(first) > len(second):
+        first, second = second, first
+    common = sum(1 for item in first if item in second)
+    return common / (len(first) + len(second) - common)
+
+
+class ContextPacker:
+    """
+    Select and format documents (knowledge base chunks, search results, scraped pages)
+    as the <documents> context of a prompt.
+
+    Documents below `min_relevance` are dropped, the rest are taken best score first,
+    near-duplicates of an already selected document are skipped, and documents are
+    added until the token budget is spent: a document that does not fit is shortened
+    when enough budget is left, otherwise skipped for a smaller one. The XML is written
+    piece by piece with `utils.XMLWriter`, without building a DOM.
+
+    A document is a dict with "content", and optionally "source" and "score".
+
+    @param max_tokens: Token budget of the document contents.
+    @param min_relevance: Minimum score of a document.
+    @param dedup_threshold: Jaccard similarity of word shingles above which a document
+                            is a near-duplicate (1.0 only drops exact duplicates).
+    @param min_document_tokens: Smallest budget worth filling with a shortened document.
+    """
+
+    def __init__(self, max_tokens: int = 4000,
+                 min_relevance: float = 0.0,
+                 dedup_threshold: float = 0.8,
+                 min_document_tokens: int = 100) -> None:
+        self.max_tokens = max_tokens
+        self.min_relevance = min_relevance
+        self.dedup_threshold = dedup_threshold
+        self.min_document_tokens = min_document_tokens
+
+
+    def pack(self, documents: Iterable[Dict]) -> List[Dict]:
+        """
+        Choose the documents to include, best first.
+
+        @param documents: Candidate documents, in any order.
+        @return: Selected documents, their "content" possibly shortened.
+        """
+        candidates = [document for document in documents
+                      if document.get("content") and document.get("score", 1.0) >= self.min_relevance]
+        candidates.sort(key=lambda document: document.get("score", 1.0), reverse=True)
+
+        selected, seen_hashes, seen_shingles = [], set(), []
+        budget = self.max_tokens
+        for document in candidates:
+            if budget <= 0:
+                break
+            content = document["content"]
+            tokens = approximate_tokens(content)
+            # Too little budget left to shorten it, a smaller document may still fit
+            if tokens > budget and budget < self.min_document_tokens:
+                continue
+            digest = hashlib.sha1(" ".join(content.split()).lower().encode("utf-8")).digest()
+            if digest in seen_hashes:
+                continue
+            fingerprint = shingles(content) if self.dedup_threshold < 1.0 else None
+            if fingerprint is not None and any(jaccard(fingerprint, seen) >= self.dedup_threshold
+                                               for seen in seen_shingles):
+                continue
+
+            if tokens > budget:
+                content = truncate(content, budget * 4)
+                tokens = approximate_tokens(content)
+            selected.append({**document, "content": content})
+            seen_hashes.add(digest)
+            if fingerprint is not None:
+                seen_shingles.append(fingerprint)
+            budget -= tokens
+        return selected
+
+
+    def write(self, documents: List[Dict], writer: Optional[XMLWriter] = None) -> XMLWriter:
+        """
+        Write selected documents as XML.
+
+        @param documents: Documents returned by `pack`.
+        @param writer: Writer to append to, e.g. while building a larger prompt (default: a new one).
+        @return: The writer.
+        """
+        writer = writer if writer is not None else XMLWriter()
+        if not documents:
+            return writer.raw("<documents />")
+        writer.open("documents")
+        for index, document in enumerate(documents, 1):
+            writer.open("document", {"index": index})
+            if document.get("source") is not None:
+                writer.element("source", document["source"])
+            writer.element("document_content", document["content"])
+            writer.close("document")
+        return writer.close("documents")
+
+
+    def render(self, documents: Iterable[Dict]) -> str:
+        """
+        Pack documents and return the <documents> XML.
+
+        @param documents: Candidate documents.
+        @return: XML string.
+        """
+        return self.write(self.pack(documents)).getvalue()
+
+
+    def render_retrieval(self, retrieved_data: Optional[Dict]) -> str:
+        """
+        Pack the results of a knowledge base retrieval ("retrievalResults" format).
+
+        @param retrieved_data: Response of a Bedrock Knowledge Base or `retrieval.KnowledgeBase`.
+        @return: XML string, empty if there is no data.
+        """
+        if not retrieved_data:
+            return ""
+        if retrieved_data["ResponseMetadata"]["HTTPStatusCode"] != 200:
+            return "<documents>Error retrieving data. No context provided.</documents>"
+        return self.render({
+            "source": iterate_through_location(result["location"]),
+            "content": result["content"]["text"],
+            "score": result["score"],
+        } for result in retrieved_data["retrievalResults"])
+
+
+def ranked(documents: Iterable[Dict]) -> List[Dict]:
+    """
+    Score documents by their rank (1, 1/2, 1/3, ...), for sources without scores
+    such as search engines or crawls where earlier results are more relevant.
+
+    @param documents: Documents in relevance order.
+    @return: The documents with a "score".
+    """
+    return [{**document, "score": 1.0 / rank} for rank, document in enumerate(documents, 1)]
@@ -1,5 +1,12 @@
+import importlib
+import inspect
+import threading
+
+from functools import lru_cache, wraps
 from techxmodule import utils
-from typing import List, Dict
+from techxmodule.cache import CachePolicy
+from techxmodule.schema import compile_validator, declared_schemas, function_schema
+from typing import Callable, List, Dict, Optional
 
 
 class Guardrail:
@@ -31,6 +38,15 @@ class Prompts:
         else:
             self.__prompt_type = model.name
 
+        # The prompt builder is chosen once per model
+        self.__build_prompt_fn = {
+            "claude": self.__build_claude_prompt,
+            "llama": self.__build_llama_prompt,
+        }.get(self.__prompt_type, 
+              self.__build_default_prompt)
+        # Rendered static segments per (instruction, example) of this model
+        self.__claude_static_segment = lru_cache(maxsize=64)(self.__render_claude_static_segment)
+
 
     def build(self, user: str, 
               context = "", 
@@ -56,13 +72,7 @@ class Prompts:
             str: A combined prompt as a single string.
         """
 
-        build_prompt_fn = {
-            "claude": self.__build_claude_prompt,
-            "llama": self.__build_llama_prompt,
-        }.get(self.__prompt_type, 
-              self.__build_default_prompt)
-
-        return build_prompt_fn(
+        return self.__build_prompt_fn(
             user, 
             context, 
             example, 
@@ -77,16 +87,31 @@ class Prompts:
         """
         Builds a prompt specifically for the Claude model 
         using the utility functions from the model.
+
+        Only the context and request are rendered per call; the instructions and
+        examples are rendered once and reused. The result is the same as
+        sanitize_input(combine_string([context, request, instructions, examples])).
         """
         
-        prompt = utils.combine_string([
-            self.__model.build_context_prompt(context_prompt),
-            self.__model.build_user_prompt(user_prompt),
+        context = self.__model.build_context_prompt(context_prompt)
+        request = self.__model.build_user_prompt(user_prompt)
+        static_segment = self.__claude_static_segment(instruction, example_prompt)
+        
+        # The request is never empty ("<request />" at least), so stripping the whole
+        # prompt only affects the empty context line and the trailing newlines
+        if context:
+            return f"{context}\n{request}{static_segment}"
+        return request + static_segment
+
+
+    def __render_claude_static_segment(self, instruction: str = None, example_prompt: str = "") -> str:
+        """
+        Render the part of a Claude prompt following the request.
+        """
+        return ("\n" + utils.combine_string([
             self.__model.build_cot_prompt(instruction),
             self.__model.build_example_prompt(example_prompt)
-        ])
-        
-        return utils.sanitize_input(prompt)
+        ])).rstrip()
 
     
     def __build_llama_prompt(self, 
@@ -184,26 +209,156 @@ class Tools:
 
     This class provides a decorator generator to wrap functions with additional metadata 
     about the tool's action and data type.
+
+    Decorated tools are registered by name, with a tool definition generated from their
+    signature, type hints and `@param` docstring lines, and a validator compiled from it.
+    The modules defining them are only imported the first time a tool is looked up,
+    so importing the models stays cheap, and `schemas` reads the definitions of tools
+    not imported yet from the module source.
     """
 
+    # Tool name -> decorated callable
+    _registry: Dict[str, Callable] = {}
+    # Modules defining tools, imported on the first lookup of an unknown name.
+    # A module stays listed until its import succeeded, so a failed import is retried
+    _modules: List[str] = ["tools"]
+    _module_locks: Dict[str, threading.Lock] = {}
+    # Module name -> tool definitions read from its source, see `schema.declared_schemas`
+    _declarations: Dict[str, Dict[str, Dict]] = {}
+    _lock = threading.Lock()
+
     def __init__(self) -> None:
         """
         Initializes the Tools class. Currently serves as a placeholder.
         """
         pass
 
+    @classmethod
+    def register_module(cls, module_name: str) -> None:
+        """
+        Declare a module defining tools, imported lazily by `get`.
+
+        @param module_name: Importable module name, e.g. "tools".
+        """
+        with cls._lock:
+            if module_name not in cls._modules:
+                cls._modules.append(module_name)
+
+    @classmethod
+    def get(cls, name: str) -> Callable:
+        """
+        Resolve a tool by name, importing the tool modules on first use.
+
+        @param name: Name of the tool function.
+        @return: The decorated tool.
+        @raises KeyError: If no registered module defines the tool.
+        """
+        tool = cls._registry.get(name)
+        if tool is not None:
+            return tool
+        cls._import_modules()
+        tool = cls._registry.get(name)
+        if tool is None:
+            raise KeyError(f"Unknown tool: {name}")
+        return tool
+
+    @classmethod
+    def schemas(cls, names: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Return the tool definitions to send to the model.
+
+        Named tools of modules not imported yet are described from the module source,
+        without importing it (and its dependencies) before a tool is actually called.
+
+        @param names: Tools to include, in this order (default: every registered tool,
+                      which imports the tool modules).
+        @return: List of {"name", "description", "input_schema"} dictionaries.
+        @raises KeyError: If a name is not a registered tool.
+        """
+        if names is None:
+            cls._import_modules()
+            names = list(cls._registry)
+        schemas = []
+        for name in names:
+            tool = cls._registry.get(name)
+            schema = tool.schema if tool is not None else cls._declared_schema(name)
+            schemas.append(schema if schema is not None else cls.get(name).schema)
+        return schemas
+
+    @classmethod
+    def _declared_schema(cls, name: str) -> Optional[Dict]:
+        """
+        @return: Definition of a tool read from the source of a pending module, None if not found.
+        """
+        with cls._lock:
+            modules = list(cls._modules)
+        for module_name in modules:
+            declarations = cls._declarations.get(module_name)
+            if declarations is None:
+                declarations = cls._declarations[module_name] = declared_schemas(module_name)
+            if name in declarations:
+                return declarations[name]
+        return None
+
+    @classmethod
+    def dispatch(cls, name: str, arguments: Dict) -> Dict:
+        """
+        Validate the input of a tool call from the model, then run the tool.
+        Invalid input is answered with a "parameterError" result without running the tool,
+        so the model can fix its call.
+
+        @param name: Tool name.
+        @param arguments: Input dictionary of the tool call.
+        @return: Result of the tool.
+        @raises KeyError: If the tool does not exist.
+        """
+        tool = cls.get(name)
+        error = tool.validate(arguments)
+        if error is not None:
+            return {
+                "error": f"Error using tool: invalid input for {name}: {error}",
+                "type": "parameterError",
+                "action": tool.action
+            }
+        return tool(**arguments)
+
+    @classmethod
+    def _import_modules(cls) -> None:
+        """
+        Import the pending tool modules. A thread looking up a tool while another one
+        imports its module waits for that import instead of missing the tool.
+        """
+        with cls._lock:
+            pending = [(module_name, cls._module_locks.setdefault(module_name, threading.Lock()))
+                       for module_name in cls._modules]
+        for module_name, module_lock in pending:
+            with module_lock:
+                if module_name not in cls._modules:
+                    continue
+                importlib.import_module(module_name)
+                with cls._lock:
+                    cls._modules.remove(module_name)
+
     @staticmethod
-    def tool(action: str, data_type: str):
+    def tool(action: str, data_type: str, cache: CachePolicy = None, description: str = None):
         """
         Decorator generator that adds metadata to the result of the decorated function.
 
         @param action: The action the tool performs (e.g., "fetch_data").
         @param data_type: The type of data the tool returns (e.g., "text").
+        @param cache: Optional cache policy. When given, successful results are cached
+                      by tool name and normalized arguments. The cache is exposed as
+                      `wrapper.cache` for its hit/miss counters.
+        @param description: Tool description for the model (default: the docstring text).
+                            The definition is exposed as `wrapper.schema`.
 
         @return: A decorator function that wraps the original function, adding metadata to its output.
         """
         def tool_decorator(func):
-            def wrapper(*args, **kwargs):
+            signature = inspect.signature(func)
+            result_cache = cache.create_cache() if cache else None
+            
+            def call(*args, **kwargs):
                 try:
                     result = func(*args, **kwargs)
                     return {
@@ -217,5 +372,28 @@ class Tools:
                         "type": "parameterError",
                         "action": action
                     }
+            
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if result_cache is None:
+                    return call(*args, **kwargs)
+                try:
+                    bound = signature.bind(*args, **kwargs)
+                except TypeError:
+                    return call(*args, **kwargs)
+                bound.apply_defaults()
+                key = cache.make_key(func.__name__, bound.arguments)
+                result = result_cache.get(key)
+                if result is None:
+                    result = call(*args, **kwargs)
+                    if "error" not in result:
+                        result_cache.set(key, result)
+                return result
+            
+            wrapper.cache = result_cache
+            wrapper.action = action
+            wrapper.schema = function_schema(func, description=description)
+            wrapper.validate = compile_validator(wrapper.schema["input_schema"])
+            Tools._registry[func.__name__] = wrapper
             return wrapper
         return tool_decorator
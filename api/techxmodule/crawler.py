@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlsplit, urldefrag
+
+import httpx
+
+from techxmodule.extract import create_extractor
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlService:
+    """
+    Long-lived web crawler shared by every `scrape_webpage` call.
+
+    The service owns a background thread running its own asyncio loop and a pooled
+    `httpx.AsyncClient`, so keep-alive connections are reused between calls and the
+    server's event loop is never blocked. Crawls stay on the host of the start URL.
+
+    Pages are streamed into a text extractor while they download, so only the
+    readable text of each page (within `page_chars`) is kept in memory.
+
+    @param concurrency: Maximum requests in flight across all crawls.
+    @param max_connections: Size of the HTTP connection pool.
+    @param max_keepalive: Idle keep-alive connections kept in the pool.
+    @param max_depth: Default number of link hops followed from the start page.
+    @param politeness_delay: Minimum seconds between two requests to the same domain.
+    @param timeout: Seconds allowed for a single HTTP request.
+    @param user_agent: User-Agent header sent with every request.
+    @param page_chars: Character budget of the text extracted from one page.
+    @param max_page_bytes: Maximum characters of HTML read from one page.
+    @param backend: Text extractor backend, see `extract.create_extractor`.
+    @param max_domains: Domains whose politeness state is kept, least recently used ones are forgotten.
+    """
+
+    def __init__(self, concurrency: int = 8,
+                 max_connections: int = 20,
+                 max_keepalive: int = 10,
+                 max_depth: int = 3,
+                 politeness_delay: float = 0.2,
+                 timeout: float = 15,
+                 user_agent: str = DEFAULT_USER_AGENT,
+                 page_chars: int = 4000,
+                 max_page_bytes: int = 2_000_000,
+                 backend: str = "auto",
+                 max_domains: int = 1024) -> None:
+        self.concurrency = concurrency
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.max_depth = max_depth
+        self.politeness_delay = politeness_delay
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.page_chars = page_chars
+        self.max_page_bytes = max_page_bytes
+        self.backend = backend
+        self.max_domains = max_domains
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._domain_locks: "OrderedDict[str, asyncio.Lock]" = OrderedDict()
+        self._next_slot: Dict[str, float] = {}
+        self._start_lock = threading.Lock()
+
+
+    def crawl(self, url: str,
+              max_pages: int = 5,
+              max_depth: Optional[int] = None,
+              timeout: Optional[float] = 45) -> List[Dict[str, str]]:
+        """
+        Crawl a website from a worker thread and wait for the pages.
+
+        Must not be called from a running event loop, use `acrawl` there instead.
+
+        @param url: Start URL.
+        @param max_pages: Maximum number of pages returned.
+        @param max_depth: Link hops followed from the start page (default: service setting).
+        @param timeout: Seconds allowed for the whole crawl.
+        @return: List of {"url": ..., "content": extracted text} in crawl order.
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self._crawl(url, max_pages, self.max_depth if max_depth is None else max_depth),
+            self._ensure_started())
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+
+    async def acrawl(self, url: str,
+                     max_pages: int = 5,
+                     max_depth: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        Async version of `crawl`, usable from any event loop.
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self._crawl(url, max_pages, self.max_depth if max_depth is None else max_depth),
+            self._ensure_started())
+        return await asyncio.wrap_future(future)
+
+
+    def close(self) -> None:
+        """
+        Close the connection pool and stop the background loop.
+        """
+        with self._start_lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+            self._client = None
+
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        """
+        Start the background loop and HTTP client on first use.
+        """
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="crawl-service", daemon=True)
+                thread.start()
+                asyncio.run_coroutine_threadsafe(self._setup(), loop).result()
+                self._loop = loop
+            return self._loop
+
+
+    async def _setup(self) -> None:
+        self._client = httpx.AsyncClient(
+            headers={"User-Agent": self.user_agent},
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_keepalive))
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+
+    async def _crawl(self, start_url: str, max_pages: int, max_depth: int) -> List[Dict[str, str]]:
+        """
+        Breadth-first crawl restricted to the host of the start URL.
+        """
+        host = urlsplit(start_url).netloc
+        results: List[Dict[str, str]] = []
+        seen = {start_url}
+        queue: asyncio.Queue = asyncio.Queue()
+        queue.put_nowait((start_url, 0))
+
+        async def worker():
+            while True:
+                url, depth = await queue.get()
+                try:
+                    if len(results) >= max_pages:
+                        continue
+                    page = await self._fetch(url)
+                    if page is None or len(results) >= max_pages:
+                        continue
+                    content, hrefs = page
+                    results.append({"url": url, "content": content})
+                    if depth >= max_depth:
+                        continue
+                    for link in resolve_links(hrefs, url):
+                        if len(seen) >= max_pages * 10:
+                            break
+                        if link not in seen and urlsplit(link).netloc == host:
+                            seen.add(link)
+                            queue.put_nowait((link, depth + 1))
+                except Exception as e:
+                    # Invalid URL, undecodable page, extractor failure: skip the page, keep the worker
+                    logger.warning(f"Skipping {url}: {e!r}")
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(self.concurrency, max_pages)))]
+        try:
+            await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+        return results
+
+
+    async def _fetch(self, url: str) -> Optional[tuple]:
+        """
+        Stream one HTML page into a text extractor, honouring the concurrency
+        limit and domain politeness. Reading stops once the text budget is used.
+
+        @return: (text, hrefs) of the page, or None if it failed or is not HTML.
+        """
+        async with self._semaphore:
+            await self._wait_turn(urlsplit(url).netloc)
+            extractor = create_extractor(self.page_chars, self.backend)
+            received = 0
+            try:
+                async with self._client.stream("GET", url) as response:
+                    if response.status_code != 200 or "html" not in response.headers.get("content-type", ""):
+                        return None
+                    async for chunk in response.aiter_text():
+                        extractor.feed(chunk)
+                        received += len(chunk)
+                        if extractor.done or received >= self.max_page_bytes:
+                            break
+            except httpx.HTTPError:
+                return None
+            extractor.close()
+            return extractor.text(), extractor.links
+
+
+    async def _wait_turn(self, domain: str) -> None:
+        """
+        Wait until the domain may receive another request.
+        """
+        lock = self._domain_locks.get(domain)
+        if lock is None:
+            lock = self._domain_locks[domain] = asyncio.Lock()
+            self._forget_domains()
+        else:
+            self._domain_locks.move_to_end(domain)
+        async with lock:
+            loop = asyncio.get_running_loop()
+            wait = self._next_slot.get(domain, 0.0) - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_slot[domain] = loop.time() + self.politeness_delay
+
+
+    def _forget_domains(self) -> None:
+        """
+        Drop the least recently used domains beyond `max_domains`, except those being waited on.
+        """
+        excess = len(self._domain_locks) - self.max_domains
+        for domain in list(self._domain_locks):
+            if excess <= 0:
+                break
+            if not self._domain_locks[domain].locked():
+                del self._domain_locks[domain]
+                self._next_slot.pop(domain, None)
+                excess -= 1
+
+
+def resolve_links(hrefs: List[str], base_url: str) -> List[str]:
+    """
+    Resolve the anchors of a page to absolute http(s) links.
+
+    @param hrefs: Raw href values found in the page.
+    @param base_url: URL of the page, used to resolve relative links.
+    @return: List of absolute URLs without fragments.
+    """
+    links = []
+    for href in hrefs:
+        link, _ = urldefrag(urljoin(base_url, href.strip()))
+        if link.startswith(("http://", "https://")):
+            links.append(link)
+    return links
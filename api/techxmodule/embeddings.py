@@ -0,0 +1,115 @@
+import hashlib
+import json
+import re
+
+from typing import List
+
+try:
+    import numpy as np
+except ImportError:  # optional, needed for vector lookups only
+    np = None
+
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbedder:
+    """
+    Dependency-free text embedder using the hashing trick.
+
+    Words and word bigrams are hashed into `dim` signed buckets and the vector is
+    L2-normalized, so the dot product of two embeddings is their cosine similarity.
+    It captures lexical overlap only, which is enough to match rephrasings of the
+    same short question; plug a neural embedder with the same `embed` interface for
+    real semantic matching.
+
+    @param dim: Number of dimensions.
+    """
+
+    # Cosine of a short query with a matching chunk is typically 0.15-0.45,
+    # unrelated texts stay near 0 (hash collisions aside)
+    min_relevance = 0.15
+
+    def __init__(self, dim: int = 512) -> None:
+        if np is None:
+            raise ImportError("HashingEmbedder requires numpy.")
+        self.dim = dim
+
+
+    def features(self, text: str) -> List[str]:
+        """
+        @return: Words and word bigrams of a lower-cased text.
+        """
+        words = _TOKEN.findall(text.lower())
+        return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+    def embed(self, text: str) -> "np.ndarray":
+        """
+        Embed a text.
+
+        @param text: Input text.
+        @return: float32 unit vector of shape (dim,), all zeros for a text without words.
+        """
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(text):
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dim] += 1.0 if (digest >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector
+
+
+    def embed_many(self, texts: List[str]) -> "np.ndarray":
+        """
+        @return: float32 matrix of shape (len(texts), dim).
+        """
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self.embed(text) for text in texts])
+
+
+class TitanEmbedder:
+    """
+    Embedder calling Amazon Titan Text Embeddings on Bedrock.
+
+    @param session: boto3 Session.
+    @param region_name: AWS region name.
+    @param model_id: Titan embedding model ID.
+    @param dim: Number of dimensions (256, 512 or 1024 for Titan v2).
+    """
+
+    # Minimum cosine of a relevant result, the cut-off used for Bedrock Knowledge Bases
+    min_relevance = 0.5
+
+    def __init__(self, session, region_name: str,
+                 model_id: str = "amazon.titan-embed-text-v2:0",
+                 dim: int = 512) -> None:
+        if np is None:
+            raise ImportError("TitanEmbedder requires numpy.")
+        from techxmodule import clients
+        self.runtime = clients.get_runtime_client(session, region_name)
+        self.model_id = model_id
+        self.dim = dim
+
+
+    def embed(self, text: str) -> "np.ndarray":
+        """
+        @return: float32 unit vector of shape (dim,).
+        """
+        response = self.runtime.invoke_model(
+            modelId=self.model_id,
+            accept="application/json",
+            contentType="application/json",
+            body=json.dumps({"inputText": text, "dimensions": self.dim, "normalize": True}))
+        return np.asarray(json.loads(response["body"].read())["embedding"], dtype=np.float32)
+
+
+    def embed_many(self, texts: List[str]) -> "np.ndarray":
+        """
+        @return: float32 matrix of shape (len(texts), dim).
+        """
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self.embed(text) for text in texts])
@@ -1,24 +1,383 @@
-from typing import Any
+import asyncio
+import fnmatch
+import inspect
+import itertools
+import logging
+import os
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+
+# Lifecycle topics published by the models (see LLM._invoke_with_payload, Claude.astream and Claude.tool_use)
+REQUEST_START = "request.start"
+REQUEST_RESPONSE = "request.response"
+REQUEST_FIRST_TOKEN = "request.first_token"
+# A request ends with exactly one of these, a cancelled stream publishes REQUEST_ERROR with cancelled=True
+REQUEST_COMPLETE = "request.complete"
+REQUEST_ERROR = "request.error"
+TOOL_START = "tool.start"
+# A tool call ends with exactly one of these, a timed-out tool never publishes TOOL_END
+TOOL_END = "tool.end"
+TOOL_TIMEOUT = "tool.timeout"
+
+# What a subscriber queue does when it is full
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+
+_request_ids = itertools.count(1)
+
+
+def new_request_id() -> str:
+    """
+    @return: Identifier correlating the events of one model request.
+    """
+    return f"{os.getpid()}-{next(_request_ids)}"
 
 
 class Event:
-    
-    def __init__(self, event_id: str, data: Any) -> None:
+    """
+    A published event.
+
+    @param event_id: Topic the event was published on.
+    @param data: Payload of the event.
+    @param timestamp: Wall clock time of the event (default: now).
+    """
+    __slots__ = ("id", "data", "timestamp")
+
+    def __init__(self, event_id: str, data: Any, timestamp: Optional[float] = None) -> None:
         self.id = event_id
-        self.data = Any
+        self.data = data
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+
+class Subscription:
+    """
+    A subscriber of an `EventBus` and its bounded queue of pending events.
+
+    Created by `EventBus.subscribe`, see there for the parameters.
+    """
+    __slots__ = ("pattern", "callback", "max_queue", "policy", "batch_size", "batch_timeout",
+                 "priority", "events", "inline", "delivered", "dropped", "errors",
+                 "_queue", "_lock", "_not_full", "_scheduled", "_is_async", "_active")
+
+    def __init__(self, pattern: str, callback: Callable, max_queue: int, policy: str,
+                 batch_size: int, batch_timeout: float, priority: int, events: bool,
+                 inline: bool) -> None:
+        if policy not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.pattern = pattern
+        self.callback = callback
+        self.max_queue = max_queue
+        self.policy = policy
+        self.batch_size = max(1, batch_size)
+        self.batch_timeout = batch_timeout
+        self.priority = priority
+        self.events = events
+        self.inline = inline
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._scheduled = False
+        self._is_async = inspect.iscoroutinefunction(callback)
+        self._active = True
+
+
+    def _offer(self, event: Event, block_timeout: Optional[float]) -> bool:
+        """
+        Queue an event according to the policy.
+
+        @param block_timeout: Seconds the BLOCK policy may wait for room, None to not wait.
+        @return: Whether the subscription must be scheduled for delivery.
+        """
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                if self.policy == DROP_OLDEST:
+                    self._queue.popleft()
+                    self.dropped += 1
+                elif self.policy == BLOCK and block_timeout and \
+                        self._not_full.wait_for(lambda: len(self._queue) < self.max_queue, block_timeout):
+                    pass
+                else:
+                    self.dropped += 1
+                    return False
+            self._queue.append(event)
+            if self._scheduled:
+                return False
+            self._scheduled = True
+            return True
+
+
+    def _take(self, count: int) -> List[Event]:
+        """
+        Remove up to `count` events from the queue. When it is empty, the
+        subscription is marked as idle so the next event schedules it again.
+        """
+        with self._lock:
+            queue = self._queue
+            batch = [queue.popleft() for _ in range(min(count, len(queue)))]
+            if batch:
+                self._not_full.notify_all()
+            else:
+                self._scheduled = False
+            return batch
+
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pattern": self.pattern,
+            "queued": len(self._queue),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
 
 
 class EventBus:
-    
-    def __init__(self) -> None:
-        self.subscribers = {}
-        
-    def subscribe(self, event_type: str, callback) -> None:
-        if event_type not in self.subscribers:
-            self.subscribers[event_type] = []
-        self.subscribers[event_type].append(callback)
-    
+    """
+    Asynchronous publish/subscribe bus.
+
+    `publish` only puts the event in the queue of each matching subscriber and
+    returns, callbacks run on a background event loop thread, so a slow subscriber
+    never stalls the publisher. Every subscriber has its own bounded queue and
+    delivery task: when a subscriber falls behind, its queue policy drops the oldest
+    or the newest events, or makes publishers wait (backpressure), without
+    affecting the other subscribers.
+
+    Callbacks can be coroutine functions (awaited on the bus loop) or plain functions
+    (run on a small thread pool, or on the bus loop with `inline=True` when they are
+    quick). Topics may be subscribed with wildcards ("tool.*", "*"), and events can be
+    delivered in batches.
+
+    @param block_timeout: Seconds a publisher waits for room in a BLOCK queue before
+                          the event is dropped. Publishers running an event loop (the
+                          bus thread, or e.g. the server's loop) never wait, the event
+                          is dropped and counted right away.
+    @param workers: Threads running synchronous callbacks.
+    """
+
+    def __init__(self, block_timeout: float = 1.0, workers: int = 4) -> None:
+        self.subscribers: Dict[str, List[Subscription]] = {}
+        self.block_timeout = block_timeout
+        self.workers = workers
+        self._routes: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+
+    def subscribe(self, event_type: str, callback: Callable,
+                  max_queue: int = 1024,
+                  policy: str = DROP_OLDEST,
+                  batch_size: int = 1,
+                  batch_timeout: float = 0.0,
+                  priority: int = 0,
+                  events: bool = False,
+                  inline: bool = False) -> Subscription:
+        """
+        Subscribe a callback to a topic.
+
+        @param event_type: Topic name, or a pattern with shell-style wildcards.
+        @param callback: Function or coroutine function called with the data of each event.
+        @param max_queue: Maximum number of events waiting for this subscriber.
+        @param policy: DROP_OLDEST, DROP_NEWEST or BLOCK when the queue is full.
+        @param batch_size: If more than 1, the callback receives a list of up to that many events.
+        @param batch_timeout: Seconds to wait for a batch to fill up before delivering it.
+        @param priority: Subscribers with a higher priority get each event queued first.
+                         Every subscriber is drained by its own task, so it does not
+                         order the callbacks of different subscribers.
+        @param events: Pass `Event` objects (topic, data, timestamp) instead of the data.
+        @param inline: Run a synchronous callback on the bus loop instead of the thread pool.
+        @return: The subscription, to unsubscribe or read its statistics.
+        """
+        subscription = Subscription(event_type, callback, max_queue, policy,
+                                    batch_size, batch_timeout, priority, events, inline)
+        with self._lock:
+            self.subscribers.setdefault(event_type, []).append(subscription)
+            self._routes = {}
+        return subscription
+
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Stop delivering events to a subscriber, events still queued are discarded.
+        """
+        with self._lock:
+            subscriptions = self.subscribers.get(subscription.pattern, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+                if not subscriptions:
+                    del self.subscribers[subscription.pattern]
+            self._routes = {}
+        subscription._active = False
+        with subscription._lock:
+            subscription._queue.clear()
+            subscription._not_full.notify_all()
+
+
+    def has_subscribers(self, event_type: str) -> bool:
+        """
+        @return: Whether publishing on this topic reaches anyone.
+        """
+        return bool(self._route(event_type))
+
+
     def publish(self, event_type: str, data: Any) -> None:
-        if event_type in self.subscribers:
-            for callback in self.subscribers[event_type]:
-                callback(data)
+        """
+        Queue an event for every subscriber of its topic, without waiting for them
+        (unless a BLOCK queue is full and the caller is not on an event loop).
+
+        @param event_type: Topic name.
+        @param data: Payload of the event.
+        """
+        subscriptions = self._route(event_type)
+        if not subscriptions:
+            return
+        event = Event(event_type, data)
+        loop = self._loop or self._start()
+        block_timeout = None if _on_event_loop() else self.block_timeout
+        for subscription in subscriptions:
+            if subscription._offer(event, block_timeout):
+                loop.call_soon_threadsafe(self._schedule, subscription)
+
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Wait until every queued event is delivered.
+
+        @param timeout: Maximum seconds to wait.
+        @return: Whether all events were delivered in time.
+        """
+        deadline = time.monotonic() + timeout
+        subscriptions = [subscription for subscriptions in list(self.subscribers.values())
+                         for subscription in subscriptions]
+        while any(subscription._scheduled for subscription in subscriptions):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Deliver the queued events, then stop the bus thread. Publishing afterwards starts it
+        again, and events left undelivered after `timeout` are delivered from then on.
+        """
+        self.flush(timeout)
+        with self._lock:
+            loop, thread, executor = self._loop, self._thread, self._executor
+            self._loop = self._thread = self._executor = None
+            subscriptions = [subscription for subscriptions in self.subscribers.values()
+                             for subscription in subscriptions]
+        # Their drain tasks die with the loop, the next event schedules them again
+        for subscription in subscriptions:
+            with subscription._lock:
+                subscription._scheduled = False
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout)
+            loop.close()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """
+        @return: Queue statistics of every subscriber.
+        """
+        return [subscription.stats()
+                for subscriptions in list(self.subscribers.values())
+                for subscription in subscriptions]
+
+
+    def _route(self, event_type: str) -> tuple:
+        """
+        Subscribers of a topic, highest priority first, cached until the subscriptions change.
+        """
+        routes = self._routes
+        subscriptions = routes.get(event_type)
+        if subscriptions is None:
+            with self._lock:
+                matches = [subscription
+                           for pattern, subscriptions in self.subscribers.items()
+                           if pattern == event_type or fnmatch.fnmatchcase(event_type, pattern)
+                           for subscription in subscriptions]
+                matches.sort(key=lambda subscription: -subscription.priority)
+                subscriptions = self._routes[event_type] = tuple(matches)
+        return subscriptions
+
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        """
+        Start the bus event loop thread.
+        """
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="events")
+                self._thread = threading.Thread(target=loop.run_forever, name="event-bus", daemon=True)
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+
+    def _schedule(self, subscription: Subscription) -> None:
+        asyncio.get_running_loop().create_task(self._drain(subscription))
+
+
+    async def _drain(self, subscription: Subscription) -> None:
+        """
+        Deliver the queued events of a subscriber until its queue is empty.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = subscription._take(subscription.batch_size)
+            if not batch:
+                return
+            if len(batch) < subscription.batch_size and subscription.batch_timeout > 0:
+                await asyncio.sleep(subscription.batch_timeout)
+                with subscription._lock:
+                    # Keep the subscription scheduled while the batch is completed
+                    queue = subscription._queue
+                    batch += [queue.popleft() for _ in range(min(subscription.batch_size - len(batch), len(queue)))]
+                    subscription._not_full.notify_all()
+            if not subscription._active:
+                continue
+
+            payload = batch if subscription.events else [event.data for event in batch]
+            if subscription.batch_size == 1:
+                payload = payload[0]
+            try:
+                if subscription._is_async:
+                    await subscription.callback(payload)
+                elif subscription.inline:
+                    subscription.callback(payload)
+                else:
+                    await loop.run_in_executor(self._executor, subscription.callback, payload)
+                subscription.delivered += len(batch)
+            except Exception:
+                subscription.errors += 1
+                logging.getLogger(__name__).exception(f"Event subscriber of {subscription.pattern} failed")
+
+
+def _on_event_loop() -> bool:
+    """
+    @return: Whether the calling thread is running an event loop, which must never block.
+    """
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+# Bus the models publish their lifecycle events on
+default_bus = EventBus()
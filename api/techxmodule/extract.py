@@ -0,0 +1,204 @@
+import re
+
+from html.parser import HTMLParser
+from typing import List
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # optional faster backend
+    LexborHTMLParser = None
+
+
+# Subtrees dropped as soon as they open: code, media, page boilerplate and form controls.
+# <form> and <header> are kept: ASP.NET and many CMS pages wrap the whole body in one
+# form, and article headers hold the title
+SKIP_TAGS = frozenset({
+    "script", "style", "svg", "noscript", "template", "iframe", "canvas",
+    "nav", "footer", "aside", "button", "select"
+})
+
+# Tags rendered as a line break to keep paragraphs apart
+BLOCK_TAGS = frozenset({
+    "p", "div", "br", "li", "ul", "ol", "tr", "table", "section", "article", "main",
+    "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "dd", "dt", "hr"
+})
+
+_SPACES = re.compile(r"[ \t\r\f\v]+")
+_NEWLINES = re.compile(r"\s*\n\s*")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class StreamingTextExtractor(HTMLParser):
+    """
+    Incremental HTML to plain-text extractor working in bounded memory.
+
+    Feed the page chunk by chunk as it is downloaded. Boilerplate subtrees are
+    dropped while parsing, and extraction stops once `max_chars` of text have been
+    collected, so the caller can stop reading the page (`done` is set).
+
+    A skipped subtree ends at its own closing tag, which also closes the skipped
+    tags left open inside it. An unclosed one ends at <main> (never part of
+    boilerplate) or </body>, so it cannot swallow the rest of the page.
+
+    @param max_chars: Character budget of the extracted text.
+    """
+
+    def __init__(self, max_chars: int = 4000) -> None:
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.links: List[str] = []
+        self.done = False
+        self._parts: List[str] = []
+        self._size = 0
+        self._skipping: List[str] = []
+
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag in SKIP_TAGS:
+            self._skipping.append(tag)
+            return
+        if tag == "main":
+            self._skipping.clear()
+        if self._skipping:
+            return
+        if tag == "a":
+            for name, value in attrs:
+                if name == "href" and value:
+                    self.links.append(value)
+                    break
+        elif tag in BLOCK_TAGS:
+            self._parts.append("\n")
+
+
+    def handle_startendtag(self, tag: str, attrs: list) -> None:
+        if not self._skipping and tag in BLOCK_TAGS:
+            self._parts.append("\n")
+
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in SKIP_TAGS:
+            if tag in self._skipping:
+                # Close it with the skipped tags left open inside it
+                del self._skipping[len(self._skipping) - 1 - self._skipping[::-1].index(tag):]
+        elif tag in ("body", "html"):
+            self._skipping.clear()
+        elif not self._skipping and tag in BLOCK_TAGS:
+            self._parts.append("\n")
+
+
+    def handle_data(self, data: str) -> None:
+        if self._skipping or self.done:
+            return
+        data = _SPACES.sub(" ", data)
+        if not data.strip():
+            if self._parts and self._parts[-1] != " ":
+                self._parts.append(" ")
+            return
+        remaining = self.max_chars - self._size
+        if len(data) >= remaining:
+            data = data[:remaining]
+            self.done = True
+        self._parts.append(data)
+        self._size += len(data)
+
+
+    def feed(self, data: str) -> None:
+        if not self.done:
+            super().feed(data)
+
+
+    def text(self) -> str:
+        """
+        @return: The extracted text with collapsed whitespace.
+        """
+        return _NEWLINES.sub("\n", "".join(self._parts)).strip()
+
+
+class SelectolaxTextExtractor:
+    """
+    Same interface as `StreamingTextExtractor` on top of the lexbor C parser.
+
+    Chunks are buffered up to `max_bytes` and parsed once on `close()`, which is
+    several times faster than the pure Python parser on large pages.
+
+    @param max_chars: Character budget of the extracted text.
+    @param max_bytes: Maximum characters of HTML buffered before parsing.
+    """
+
+    def __init__(self, max_chars: int = 4000, max_bytes: int = 2_000_000) -> None:
+        self.max_chars = max_chars
+        self.max_bytes = max_bytes
+        self.links: List[str] = []
+        self.done = False
+        self._chunks: List[str] = []
+        self._size = 0
+        self._text = ""
+
+
+    def feed(self, data: str) -> None:
+        if self.done:
+            return
+        data = data[:self.max_bytes - self._size]
+        self._chunks.append(data)
+        self._size += len(data)
+        if self._size >= self.max_bytes:
+            self.done = True
+
+
+    def close(self) -> None:
+        tree = LexborHTMLParser("".join(self._chunks))
+        self._chunks = []
+        tree.strip_tags(list(SKIP_TAGS))
+        self.links = [node.attributes["href"] for node in tree.css("a[href]") if node.attributes.get("href")]
+        root = tree.body or tree.root
+        text = _WHITESPACE.sub(" ", root.text(separator=" ")).strip() if root else ""
+        self._text = text[:self.max_chars]
+
+
+    def text(self) -> str:
+        return self._text
+
+
+def create_extractor(max_chars: int = 4000, backend: str = "auto"):
+    """
+    Create a page text extractor.
+
+    @param max_chars: Character budget of the extracted text.
+    @param backend: "python" for the streaming parser, "lexbor" for selectolax,
+                    "auto" to use selectolax when it is installed.
+    @return: An extractor with feed(), close(), text(), links and done.
+    """
+    if backend == "lexbor" or (backend == "auto" and LexborHTMLParser is not None):
+        if LexborHTMLParser is None:
+            raise ImportError("The lexbor backend requires the selectolax package.")
+        return SelectolaxTextExtractor(max_chars)
+    return StreamingTextExtractor(max_chars)
+
+
+def extract_text(html: str, max_chars: int = 4000, backend: str = "auto") -> str:
+    """
+    Extract the readable text of a whole HTML document.
+
+    @param html: Page content.
+    @param max_chars: Character budget of the extracted text.
+    @param backend: Parser backend, see `create_extractor`.
+    @return: Plain text of the page.
+    """
+    extractor = create_extractor(max_chars, backend)
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
+
+
+def truncate(text: str, max_chars: int, marker: str = " [...]") -> str:
+    """
+    Cut a text to a character budget, marking the cut.
+
+    @param text: input text
+    @param max_chars: Character budget.
+    @param marker: Appended when the text is cut.
+    @return: The text within budget.
+    """
+    if len(text) <= max_chars:
+        return text
+    return text[:max(0, max_chars - len(marker))] + marker
@@ -0,0 +1,265 @@
+import atexit
+import base64
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+try:
+    from PIL import Image as PILImage
+except ImportError:  # optional downscaling / recompression
+    PILImage = None
+
+
+class ImageRef:
+    """
+    Lightweight reference to an image held by an `ImageStore`.
+
+    Messages keep the reference instead of the base64 string, the data is only
+    materialized when a payload is serialized (see `serialization.join_fragments`).
+    References are counted by the store, which never deletes an image still referenced.
+    Only `ImageStore.put` creates them.
+    """
+    __slots__ = ("digest", "media_type", "store")
+
+    def __init__(self, digest: str, media_type: str, store: "ImageStore") -> None:
+        self.digest = digest
+        self.media_type = media_type
+        self.store = store
+
+
+    def __del__(self) -> None:
+        # No lock here, the collector may run while the store holds it
+        self.store._released.append(self.digest)
+
+
+    def data(self) -> str:
+        """
+        @return: The base64 data of the image.
+        """
+        return self.store.get(self.digest)
+
+
+    def encode_json(self) -> bytes:
+        """
+        @return: The base64 data as a JSON string, cached by the store.
+        """
+        return self.store.encoded(self.digest)
+
+
+    def __json__(self) -> str:
+        return self.data()
+
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ImageRef) and other.digest == self.digest
+
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+
+class ImageStore:
+    """
+    Content-addressed store of base64 images shared by every conversation.
+
+    Identical images are stored once. The most recently used images stay in memory up
+    to `max_memory_bytes`, kept as JSON string bytes since an image never changes, so
+    payloads splice them in without encoding them again. Older ones are spilled to
+    files in `spill_dir` and read back on demand. Spilled files are kept up to
+    `max_disk_bytes`, beyond it the least recently used images no longer referenced by
+    any message are deleted. Images still referenced are always kept, even over the
+    budget. A temporary spill directory is removed at exit.
+
+    @param max_memory_bytes: Budget of base64 data kept in memory.
+    @param max_disk_bytes: Budget of base64 data kept in spill files.
+    @param spill_dir: Directory for spilled images (default: a temporary directory).
+    @param max_dimension: If set and Pillow is installed, larger images are downscaled
+                          so their longest side fits.
+    @param quality: If set and Pillow is installed, JPEG/WebP images are recompressed
+                    with this quality.
+    """
+
+    def __init__(self, max_memory_bytes: int = 64 * 1024 * 1024,
+                 max_disk_bytes: int = 1024 * 1024 * 1024,
+                 spill_dir: Optional[str] = None,
+                 max_dimension: Optional[int] = None,
+                 quality: Optional[int] = None) -> None:
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.spill_dir = spill_dir
+        self.max_dimension = max_dimension
+        self.quality = quality
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self._memory: OrderedDict = OrderedDict()
+        self._aliases = {}
+        # Digest -> size of its spill file, least recently used first
+        self._spilled: OrderedDict = OrderedDict()
+        # Digest -> number of live ImageRef, decremented from `_released`
+        self._refs: Dict[str, int] = {}
+        self._released: deque = deque()
+        self._lock = threading.Lock()
+
+
+    def put(self, data: str, media_type: str) -> ImageRef:
+        """
+        Add an image to the store.
+
+        @param data: Base64 data of the image.
+        @param media_type: Media type, e.g. "image/png".
+        @return: Reference to the stored image.
+        """
+        source_digest = hashlib.sha256(data.encode("ascii")).hexdigest()
+        with self._lock:
+            digest = self._aliases.get(source_digest)
+            if digest is not None and (digest in self._memory or digest in self._spilled):
+                return self._reference(digest, media_type)
+
+        stored = self._shrink(data, media_type)
+        digest = hashlib.sha256(stored.encode("ascii")).hexdigest() if stored is not data else source_digest
+        with self._lock:
+            self._aliases[source_digest] = digest
+            if digest not in self._memory and digest not in self._spilled:
+                self._remember(digest, stored)
+            return self._reference(digest, media_type)
+
+
+    def _reference(self, digest: str, media_type: str) -> ImageRef:
+        """
+        Count a new reference to a stored image.
+        """
+        self._refs[digest] = self._refs.get(digest, 0) + 1
+        return ImageRef(digest, media_type, self)
+
+
+    def get(self, digest: str) -> str:
+        """
+        Return the base64 data of a stored image.
+
+        @param digest: Content hash of the image.
+        @return: Base64 data.
+        @raises KeyError: If the image is not in the store.
+        """
+        return self.encoded(digest)[1:-1].decode("ascii")
+
+
+    def encoded(self, digest: str) -> bytes:
+        """
+        Return the base64 data of a stored image as a JSON string, ready to be
+        spliced into a payload.
+
+        @param digest: Content hash of the image.
+        @return: UTF-8 encoded JSON string.
+        @raises KeyError: If the image is not in the store.
+        """
+        with self._lock:
+            encoded = self._memory.get(digest)
+            if encoded is not None:
+                self._memory.move_to_end(digest)
+                return encoded
+            if digest not in self._spilled:
+                raise KeyError(digest)
+            with open(self._spill_path(digest), "rb") as file:
+                data = file.read()
+            # The file is kept, spilling the image again costs no write
+            self._spilled.move_to_end(digest)
+            return self._remember(digest, data)
+
+
+    def _remember(self, digest: str, data) -> bytes:
+        """
+        Keep an image in memory, spilling the least recently used ones over budget.
+
+        @param data: Base64 data, str or ASCII bytes.
+        @return: The image as a JSON string.
+        """
+        encoded = b'"' + (data.encode("ascii") if isinstance(data, str) else data) + b'"'
+        self._memory[digest] = encoded
+        self.memory_bytes += len(encoded) - 2
+        while self.memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            old_digest, old_encoded = self._memory.popitem(last=False)
+            size = len(old_encoded) - 2
+            self.memory_bytes -= size
+            if old_digest in self._spilled:
+                self._spilled.move_to_end(old_digest)
+                continue
+            with open(self._spill_path(old_digest), "wb") as file:
+                file.write(memoryview(old_encoded)[1:-1])
+            self._spilled[old_digest] = size
+            self.disk_bytes += size
+        self._trim_disk()
+        return encoded
+
+
+    def _trim_disk(self) -> None:
+        """
+        Delete the least recently used spill files over the disk budget, skipping the
+        images still referenced. Images still in memory stay readable, they are written
+        again when spilled.
+        """
+        while self._released:
+            digest = self._released.popleft()
+            count = self._refs.get(digest, 0) - 1
+            if count > 0:
+                self._refs[digest] = count
+            else:
+                self._refs.pop(digest, None)
+        if self.disk_bytes <= self.max_disk_bytes:
+            return
+
+        forgotten = set()
+        for digest, size in list(self._spilled.items()):
+            if self.disk_bytes <= self.max_disk_bytes:
+                break
+            if digest in self._refs:
+                continue
+            del self._spilled[digest]
+            self.disk_bytes -= size
+            try:
+                os.remove(self._spill_path(digest))
+            except FileNotFoundError:
+                pass
+            if digest not in self._memory:
+                forgotten.add(digest)
+        if forgotten:
+            self._aliases = {source: digest for source, digest in self._aliases.items()
+                             if digest not in forgotten}
+
+
+    def _spill_path(self, digest: str) -> str:
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="gracii-images-")
+            atexit.register(shutil.rmtree, self.spill_dir, ignore_errors=True)
+        return os.path.join(self.spill_dir, digest)
+
+
+    def _shrink(self, data: str, media_type: str) -> str:
+        """
+        Downscale and recompress an image when configured and Pillow is available.
+        """
+        if PILImage is None or (self.max_dimension is None and self.quality is None):
+            return data
+        try:
+            image = PILImage.open(io.BytesIO(base64.b64decode(data)))
+            image_format = image.format or media_type.split("/")[-1].upper()
+            if self.max_dimension and max(image.size) > self.max_dimension:
+                image.thumbnail((self.max_dimension, self.max_dimension))
+            options = {}
+            if self.quality and image_format in ("JPEG", "WEBP"):
+                options["quality"] = self.quality
+            output = io.BytesIO()
+            image.save(output, format=image_format, **options)
+        except Exception:
+            return data
+        shrunk = base64.b64encode(output.getvalue()).decode("ascii")
+        return shrunk if len(shrunk) < len(data) else data
+
+
+# Store shared by every ChatMessage unless another one is given
+default_store = ImageStore()
@@ -1,3 +1,50 @@
+import json
+
+from collections import deque
+from techxmodule import images, utils
+from techxmodule.serialization import dumps_fragments, join_fragments
+
+
+# Rough token cost of one image in the Claude messages API
+IMAGE_TOKENS = 1600
+TRUNCATED_MARKER = " [truncated]"
+
+
+def approximate_tokens(text: str) -> int:
+    """
+    Approximate the number of tokens of a text (about 4 characters per token).
+    
+    @param text: input text
+    @return: approximate token count
+    """
+    return len(text) // 4 + 1
+
+
+def estimate_tokens(message: dict) -> int:
+    """
+    Approximate the token count of a message in the Claude messages format.
+    
+    @param message: A message dictionary with "role" and "content".
+    @return: approximate token count
+    """
+    content = message["content"]
+    if isinstance(content, str):
+        return approximate_tokens(content)
+    
+    tokens = 0
+    for block in content:
+        block_type = block.get("type")
+        if block_type == "text":
+            tokens += approximate_tokens(block["text"])
+        elif block_type == "image":
+            tokens += IMAGE_TOKENS
+        elif block_type == "tool_use":
+            tokens += approximate_tokens(json.dumps(block.get("input", {})))
+        elif block_type == "tool_result":
+            tokens += estimate_tokens(block)
+    return tokens
+
+
 class Image:
     """
     An Image object class to represent an image with type, media type, and data.
@@ -8,23 +55,362 @@ class Image:
         self.data = data
 
 
+class ContentBlock:
+    """
+    One block of a message (text, image, tool_use or tool_result).
+
+    Blocks are rendered to the Bedrock dictionary format only when a payload is
+    built (`to_dict`). Keys the model may add and this class does not know about
+    are kept in `extra`.
+    """
+    __slots__ = ("type", "text", "source", "id", "name", "input", "tool_use_id", "content", "extra")
+
+    _FIELDS = ("id", "name", "input", "tool_use_id", "text", "source")
+
+    def __init__(self, type: str, text: str = None, source: dict = None,
+                 id: str = None, name: str = None, input: dict = None,
+                 tool_use_id: str = None, content: list = None, extra: dict = None) -> None:
+        self.type = type
+        self.text = text
+        self.source = source
+        self.id = id
+        self.name = name
+        self.input = input
+        self.tool_use_id = tool_use_id
+        self.content = content
+        self.extra = extra
+
+
+    @classmethod
+    def from_dict(cls, block: dict) -> "ContentBlock":
+        """
+        @param block: Content block in the Bedrock format.
+        @return: The block, the content of a tool result converted as well.
+        """
+        block = dict(block)
+        content = block.pop("content", None)
+        if isinstance(content, list):
+            content = [cls.from_dict(item) for item in content]
+        known = {field: block.pop(field) for field in cls._FIELDS if field in block}
+        block_type = block.pop("type")
+        return cls(block_type, content=content, extra=block or None, **known)
+
+
+    def to_dict(self) -> dict:
+        """
+        @return: The block in the Bedrock format.
+        """
+        block = {"type": self.type}
+        for field in self._FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                block[field] = value
+        if self.content is not None:
+            block["content"] = self.content if isinstance(self.content, str) \
+                else [item.to_dict() for item in self.content]
+        if self.extra:
+            block.update(self.extra)
+        return block
+
+
+    def tokens(self) -> int:
+        """
+        @return: Approximate token count of the block, see `estimate_tokens`.
+        """
+        if self.type == "text":
+            return approximate_tokens(self.text)
+        if self.type == "image":
+            return IMAGE_TOKENS
+        if self.type == "tool_use":
+            return approximate_tokens(json.dumps(self.input or {}))
+        if self.type == "tool_result":
+            if isinstance(self.content, str):
+                return approximate_tokens(self.content)
+            return sum(item.tokens() for item in self.content or ())
+        return 0
+
+
+class Message:
+    """
+    A message of the chat history.
+
+    Derived forms are computed once and kept on the message: its token estimate,
+    its serialized bytes (`encode_json`), the text of its <request> tags (`purified`)
+    and whether its prompt tags were already removed (`clean_tags`). Call `changed`
+    after modifying a message in place.
+    """
+    __slots__ = ("role", "content", "tokens", "_fragments", "_purified", "_cleaned")
+
+    def __init__(self, role: str, content) -> None:
+        """
+        @param role: "user" or "assistant".
+        @param content: List of ContentBlock, or a plain string.
+        """
+        self.role = role
+        self.content = content
+        self._cleaned = False
+        self.changed()
+
+
+    @classmethod
+    def from_dict(cls, message: dict) -> "Message":
+        content = message["content"]
+        if not isinstance(content, str):
+            content = [ContentBlock.from_dict(block) for block in content]
+        return cls(message["role"], content)
+
+
+    def to_dict(self) -> dict:
+        """
+        @return: The message in the Bedrock format, built on each call.
+        """
+        if isinstance(self.content, str):
+            return {"role": self.role, "content": self.content}
+        return {"role": self.role, "content": [block.to_dict() for block in self.content]}
+
+
+    def __json__(self) -> dict:
+        return self.to_dict()
+
+
+    def changed(self) -> None:
+        """
+        Recount the tokens and drop the cached forms after an in-place edit.
+        """
+        if isinstance(self.content, str):
+            self.tokens = approximate_tokens(self.content)
+        else:
+            self.tokens = sum(block.tokens() for block in self.content)
+        self._fragments = None
+        self._purified = None
+
+
+    def encode_json(self) -> bytes:
+        """
+        Return the JSON bytes of the message.
+
+        The serialization is cached with image references left unmaterialized
+        (see `serialization.dumps_fragments`), so only the image data is read
+        again on the next payload.
+        """
+        if self._fragments is None:
+            self._fragments = dumps_fragments(self.to_dict())
+        return join_fragments(self._fragments)
+
+
+    def is_tool_result(self) -> bool:
+        """
+        @return: Whether the message carries tool results rather than a question.
+        """
+        return not isinstance(self.content, str) and bool(self.content) \
+            and self.content[0].type == "tool_result"
+
+
+    def purified(self) -> str:
+        """
+        @return: The <request> elements of the text blocks, other tags removed.
+        """
+        if self._purified is None:
+            self._purified = _retain_request_tag(self.content)
+        return self._purified
+
+
+    def clean_tags(self) -> bool:
+        """
+        Remove the <instructions>, <examples>, <context> and <documents> elements
+        of the text blocks (the question follows the image labels when there are
+        images). A message is only scanned once.
+
+        @return: Whether the text changed.
+        """
+        if self._cleaned:
+            return False
+        self._cleaned = True
+        if isinstance(self.content, str):
+            return False
+        changed = False
+        for block in self.content:
+            if block.type == "text":
+                text = utils.clean_tag(block.text)
+                if text != block.text:
+                    block.text = text
+                    changed = True
+        if changed:
+            self.changed()
+        return changed
+
+
+def _retain_request_tag(content) -> str:
+    """
+    Retains only the <request> tag in the content, removing all other tags.
+
+    @param content: List of ContentBlock of a message, or a plain string.
+    @return: A string with only the <request> tag retained.
+    """
+    if isinstance(content, str):
+        return utils.REQUEST_TAG.keep(content)
+    return "".join([utils.REQUEST_TAG.keep(block.text) for block in content if block.type == "text"])
+
+
 class ChatMessage: 
     """
     A class that can store and handle images and text messages
     
+    Messages are `Message` objects in a deque, each holding its token estimate and
+    serialized bytes, so the history can be trimmed from the front in O(1), checked
+    against a token budget without recounting every turn, and encoded into payloads
+    without re-serializing past messages. Modify `messages` through the methods of
+    this class (or call `refresh` after an in-place edit) to keep the counts right.
+    
     @param max_chat_message: maximum number of internal chat message (affect the model recall memory)
+    @param max_tokens: approximate token budget of the whole history, None for no budget
+    @param tool_result_chars: size older tool results are cut to when the history is over budget
+    @param image_store: content-addressed store holding the image data (default: the shared store).
+                        Messages only keep `ImageRef` references to it.
     """
     
-    def __init__(self, max_chat_message: int=10) -> None:
-        self.messages = []
+    def __init__(self, max_chat_message: int=10, 
+                 max_tokens: int|None=None, 
+                 tool_result_chars: int=2000,
+                 image_store: images.ImageStore|None=None) -> None:
+        self.messages = deque()
+        self.image_store = image_store or images.default_store
         self.max_chat_message = max_chat_message
+        self.max_tokens = max_tokens
+        self.tool_result_chars = tool_result_chars
+        self.total_tokens = 0
+    
+    
+    def to_dict(self) -> dict:
+        """
+        Serialize the chat history to a plain dictionary.
+        
+        @return: A JSON-compatible dictionary holding the messages and memory settings.
+        """
+        return {
+            "max_chat_message": self.max_chat_message,
+            "max_tokens": self.max_tokens,
+            "tool_result_chars": self.tool_result_chars,
+            "messages": [message.to_dict() for message in self.messages]
+        }
+    
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> "ChatMessage":
+        """
+        Rebuild a chat history from a dictionary produced by `to_dict`.
+        
+        @param data: Serialized chat history.
+        @return: A new ChatMessage holding the stored messages.
+        """
+        memory = cls(max_chat_message=data.get("max_chat_message", 10),
+                     max_tokens=data.get("max_tokens"),
+                     tool_result_chars=data.get("tool_result_chars", 2000))
+        for message in data.get("messages", []):
+            memory._push(memory._intern_images(Message.from_dict(message)))
+        return memory
+    
+    
+    def clear(self) -> None:
+        """
+        Remove every message.
+        """
+        self.messages.clear()
+        self.total_tokens = 0
+    
+    
+    def popleft(self) -> Message:
+        """
+        Remove and return the oldest message in O(1).
+        """
+        message = self.messages.popleft()
+        self.total_tokens -= message.tokens
+        return message
+    
+    
+    def refresh(self, index: int) -> None:
+        """
+        Recount the tokens of a message after it was modified in place
+        and drop its cached forms.
+        
+        @param index: Position of the message (negative indexes allowed).
+        """
+        message = self.messages[index]
+        tokens = message.tokens
+        message.changed()
+        self.total_tokens += message.tokens - tokens
+    
+    
+    def clean_tags(self, index: int) -> None:
+        """
+        Remove the prompt tags (instructions, examples, context, documents) of a
+        past question, see `Message.clean_tags`.
+        
+        @param index: Position of the message (negative indexes allowed).
+        """
+        message = self.messages[index]
+        tokens = message.tokens
+        if message.clean_tags():
+            self.total_tokens += message.tokens - tokens
+    
+    
+    def over_budget(self) -> bool:
+        """
+        @return: Whether the history exceeds its token budget.
+        """
+        return self.max_tokens is not None and self.total_tokens > self.max_tokens
+    
+    
+    def truncate_tool_results(self, keep_last: int = 1) -> None:
+        """
+        Cut the text of older tool results down to `tool_result_chars`.
+        
+        The tool_result blocks and their tool_use_id stay in place, so the
+        tool_use/tool_result pairing required by Claude is preserved.
+        
+        @param keep_last: Number of most recent messages left untouched.
+        """
+        limit = self.tool_result_chars
+        for index in range(len(self.messages) - keep_last):
+            message = self.messages[index]
+            if message.role != "user" or isinstance(message.content, str):
+                continue
+            changed = False
+            for block in message.content:
+                if block.type != "tool_result" or isinstance(block.content, str):
+                    continue
+                for item in block.content or ():
+                    text = item.text
+                    if text and len(text) > limit and not text.endswith(TRUNCATED_MARKER):
+                        item.text = text[:limit] + TRUNCATED_MARKER
+                        changed = True
+            if changed:
+                self.refresh(index)
+    
+    
+    def _intern_images(self, message: Message) -> Message:
+        """
+        Move inline base64 image data of a message into the image store.
+        """
+        if isinstance(message.content, str):
+            return message
+        for block in message.content:
+            source = block.source if block.type == "image" else None
+            if source and isinstance(source.get("data"), str):
+                source["data"] = self.image_store.put(source["data"], source["media_type"])
+        return message
+    
+    
+    def _push(self, message: Message) -> None:
+        self.messages.append(message)
+        self.total_tokens += message.tokens
     
 
     def append_message(self, role :str, text: str, images: list[Image]|None=None) -> list:
         """
         Adds a message to the chat, including optional text and images.
         
-        This method constructs a message dictionary that includes a role, text content, and optional images.
+        This method constructs a message that includes a role, text content, and optional images.
         The message is then appended to the `messages` list.
         
         @param role: A string indicating the role of the sender (e.g., 'user', 'system', 'assistant').
@@ -41,20 +427,17 @@ class ChatMessage:
         content = self._add_text(content, text)
 
         # Append the constructed message to the messages list
-        self.messages.append({
-            "role": role,
-            "content": content
-        })
+        self._push(Message(role, content))
         
         return self.messages
     
     
     def append_tool(self, tool_content) -> list:
         
-        self.messages.append({
+        self._push(Message.from_dict({
             "role": "assistant",
             "content": tool_content
-        })
+        }))
         
         return self.messages
     
@@ -69,17 +452,14 @@ class ChatMessage:
 
             content = self._add_text(content, result["content"])
             
-            container_list.append({
-                "type": "tool_result",
-                "tool_use_id": result["tool_id"],
-                "content": content
-            })
+            container_list.append(ContentBlock(
+                "tool_result",
+                tool_use_id=result["tool_id"],
+                content=content
+            ))
         
         # Append the constructed message to the messages list
-        self.messages.append({
-            "role": "user",
-            "content": container_list
-        })
+        self._push(Message("user", container_list))
         
         return self.messages
     
@@ -92,67 +472,36 @@ class ChatMessage:
         """
         
         # Iterate through the messages in reverse to find the most recent 'user' message
-        for message in reversed(self.messages):
+        for index in range(len(self.messages) - 1, -1, -1):
+            message = self.messages[index]
             
-            if message['role'] == 'user':
+            if message.role == 'user':
                 
-                purified_text = self._retain_request_tag(message['content'])
+                purified_text = message.purified()
                 
                 # Update the content with the purified text
-                
-                message['content'] = [{
-                    "type": "text",
-                    "text": purified_text
-                }]
+                message.content = [ContentBlock("text", text=purified_text)]
+                self.refresh(index)
+                # Already reduced to its <request>, nothing left to clean
+                message._purified = purified_text
+                message._cleaned = True
                 break
-
-
-    def _retain_request_tag(self, content: list) -> str:
-        """
-        Retains only the <request> tag in the content, removing all other tags.
-        
-        @param content: A list of dictionaries representing the content of a message.
-        @return: A string with only the <request> tag retained.
-        """
-        purified_text = ""
-        
-        for item in content:
-            
-            if item['type'] == 'text':
-                text = item['text']
-                
-                # Retain only <request> tags and remove everything else
-                start_tag = "<request>"
-                end_tag = "</request>"
-                
-                start_idx = text.find(start_tag)
-                end_idx = text.find(end_tag, start_idx)
-                
-                if start_idx != -1 and end_idx != -1:
-                    purified_text += text[start_idx:end_idx + len(end_tag)]
-        
-        return purified_text
         
     
     def _add_image(self, content: list, images: list[Image]|None) -> list:
         """
-        Add images to content with appropriate labels
+        Add images to content with appropriate labels.
+        The image data goes to the image store, the message holds a reference.
         """
         
         if images:
             for index, image in enumerate(images, start=1):
-                content.append({
-                    "type": "text",
-                    "text": f"Image {index}:"
-                })
-                content.append({
-                    "type": "image",
-                    "source": {
-                        "type": image.type,
-                        "media_type": image.media_type,
-                        "data": image.data,
-                    },
-                })
+                content.append(ContentBlock("text", text=f"Image {index}:"))
+                content.append(ContentBlock("image", source={
+                    "type": image.type,
+                    "media_type": image.media_type,
+                    "data": self.image_store.put(image.data, image.media_type),
+                }))
         
         return content
     
@@ -162,9 +511,6 @@ class ChatMessage:
         Add text message to content
         """
         
-        content.append({
-            "type": "text",
-            "text": text
-        })
+        content.append(ContentBlock("text", text=text))
         
-        return content
\ No newline at end of file
+        return content
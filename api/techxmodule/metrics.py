@@ -0,0 +1,382 @@
+import bisect
+import math
+import threading
+
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from techxmodule import events
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # optional tracing exporter
+    otel_trace = None
+
+
+# Bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0, 20.0, 30.0, 60.0)
+TOKEN_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0)
+TOKEN_RATE_BUCKETS = (5, 10, 20, 30, 40, 50, 75, 100, 150, 200, 300)
+ITERATION_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10)
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """
+    Monotonic counter, optionally split by label values.
+
+    @param name: Metric name.
+    @param documentation: Help text.
+    @param labelnames: Names of the labels, their values are passed to `inc` in this order.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+
+    def inc(self, amount: float = 1.0, labels: Tuple = ()) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+    def value(self, labels: Tuple = ()) -> float:
+        return self._values.get(labels, 0.0)
+
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets, optionally split by label values.
+
+    An observation is a binary search and two additions under a lock, so it is
+    cheap enough for the streaming path. Buckets are stored per bucket and made
+    cumulative when rendered.
+
+    @param name: Metric name.
+    @param documentation: Help text.
+    @param buckets: Sorted upper bounds of the buckets (+Inf is added).
+    @param labelnames: Names of the labels, their values are passed to `observe` in this order.
+    """
+
+    def __init__(self, name: str, documentation: str,
+                 buckets: Sequence[float] = LATENCY_BUCKETS,
+                 labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        # labels -> [count per bucket (+Inf last), sum, count]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+
+    def observe(self, value: float, labels: Tuple = ()) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+
+    def observe_many(self, values: Iterable[float], labels: Tuple = ()) -> None:
+        """
+        Record several observations with one lock acquisition.
+        """
+        values = list(values)
+        buckets = self.buckets
+        indexes = [bisect.bisect_left(buckets, value) for value in values]
+        if not indexes:
+            return
+        total = sum(values)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(buckets) + 1), 0.0, 0]
+            counts = series[0]
+            for index in indexes:
+                counts[index] += 1
+            series[1] += total
+            series[2] += len(indexes)
+
+
+    def count(self, labels: Tuple = ()) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+
+    def quantile(self, q: float, labels: Tuple = ()) -> Optional[float]:
+        """
+        Estimate a quantile from the buckets (upper bound of the bucket holding it).
+
+        @return: The estimate, None without observations.
+        """
+        series = self._series.get(labels)
+        if not series or not series[2]:
+            return None
+        rank = q * series[2]
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), series[0]):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return math.inf
+
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Set of metrics rendered together in the Prometheus text format.
+
+    Collectors are functions called at render time returning gauge samples, to
+    expose state kept elsewhere (admission control, caches, routing).
+    """
+
+    def __init__(self) -> None:
+        self.metrics: List = []
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, Dict, float]]]] = []
+
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+
+    def histogram(self, name: str, documentation: str,
+                  buckets: Sequence[float] = LATENCY_BUCKETS,
+                  labelnames: Sequence[str] = ()) -> Histogram:
+        metric = Histogram(name, documentation, buckets, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, Dict, float]]]) -> None:
+        """
+        @param collector: Function returning (name, help, labels, value) gauge samples.
+        """
+        self.collectors.append(collector)
+
+
+    def render(self) -> str:
+        """
+        @return: Every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        # Samples of one gauge must be listed together
+        families: Dict[str, list] = {}
+        for collector in self.collectors:
+            for name, documentation, labels, value in collector():
+                family = families.get(name)
+                if family is None:
+                    family = families[name] = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+                names = tuple(labels)
+                family.append(f"{name}{_format_labels(names, tuple(labels[key] for key in names))} {_format_value(value)}")
+        for family in families.values():
+            lines.extend(family)
+        return "\n".join(lines) + "\n"
+
+
+def gauges(prefix: str, stats: Dict, labels: Optional[Dict] = None) -> List[Tuple[str, str, Dict, float]]:
+    """
+    Turn the numeric values of a stats dictionary into gauge samples.
+
+    @param prefix: Metric name prefix, e.g. "gracii_admission".
+    @param stats: Dictionary such as `AdmissionController.stats()`.
+    @param labels: Labels of every sample.
+    @return: (name, help, labels, value) samples for `Registry.add_collector`.
+    """
+    return [(f"{prefix}_{key}", f"{key} of {prefix}", labels or {}, value)
+            for key, value in stats.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)]
+
+
+registry = Registry()
+
+TIME_TO_FIRST_TOKEN = registry.histogram(
+    "gracii_time_to_first_token_seconds", "Time from request to the first generated token.")
+INTER_TOKEN_LATENCY = registry.histogram(
+    "gracii_inter_token_latency_seconds", "Time between two streamed text chunks.", TOKEN_LATENCY_BUCKETS)
+OUTPUT_TOKEN_RATE = registry.histogram(
+    "gracii_output_tokens_per_second", "Output tokens per second after the first token.", TOKEN_RATE_BUCKETS)
+REQUEST_DURATION = registry.histogram(
+    "gracii_model_request_duration_seconds", "Duration of a model request, stream included.")
+RESPONSE_LATENCY = registry.histogram(
+    "gracii_bedrock_response_seconds", "Time for Bedrock to return a response (stream opened).")
+MODEL_REQUESTS = registry.counter(
+    "gracii_model_requests_total", "Model requests by outcome.", ("outcome",))
+TOKENS = registry.counter(
+    "gracii_tokens_total", "Tokens processed by the model.", ("direction",))
+TOOL_DURATION = registry.histogram(
+    "gracii_tool_duration_seconds", "Duration of a tool call.", labelnames=("tool",))
+TOOL_CALLS = registry.counter(
+    "gracii_tool_calls_total", "Tool calls by outcome.", ("tool", "outcome"))
+TOOL_LOOP_ITERATIONS = registry.histogram(
+    "gracii_tool_loop_iterations", "Tool rounds needed to answer a chat request.", ITERATION_BUCKETS)
+CHAT_REQUESTS = registry.counter(
+    "gracii_chat_requests_total", "Chat requests by outcome.", ("outcome",))
+
+
+def record(event: events.Event) -> None:
+    """
+    Update the metrics from a lifecycle event (see techxmodule.events).
+    """
+    data = event.data
+    topic = event.id
+    if topic == events.REQUEST_COMPLETE:
+        MODEL_REQUESTS.inc(labels=("success",))
+        REQUEST_DURATION.observe(data["latency"])
+        if data.get("ttft") is not None:
+            TIME_TO_FIRST_TOKEN.observe(data["ttft"])
+        gaps = data.get("token_gaps")
+        if gaps:
+            INTER_TOKEN_LATENCY.observe_many(gaps)
+        usage = data.get("usage") or {}
+        for direction, key in (("input", "input_tokens"), ("output", "output_tokens"),
+                               ("cache_read", "cache_read_input_tokens"),
+                               ("cache_write", "cache_creation_input_tokens")):
+            if usage.get(key):
+                TOKENS.inc(usage[key], labels=(direction,))
+        if usage.get("output_tokens") and data.get("ttft") is not None and data["latency"] > data["ttft"]:
+            OUTPUT_TOKEN_RATE.observe(usage["output_tokens"] / (data["latency"] - data["ttft"]))
+    elif topic == events.REQUEST_RESPONSE:
+        RESPONSE_LATENCY.observe(data["latency"])
+    elif topic == events.REQUEST_ERROR:
+        MODEL_REQUESTS.inc(labels=("cancelled" if data.get("cancelled") else "error",))
+    elif topic == events.TOOL_END:
+        TOOL_DURATION.observe(data["latency"], labels=(data["tool"],))
+        TOOL_CALLS.inc(labels=(data["tool"], "error" if data["error"] else "success"))
+    elif topic == events.TOOL_TIMEOUT:
+        TOOL_CALLS.inc(labels=(data["tool"], "timeout"))
+
+
+def _record_batch(batch: List[events.Event]) -> None:
+    for event in batch:
+        record(event)
+
+
+def attach(bus: events.EventBus) -> events.Subscription:
+    """
+    Feed the metrics from the lifecycle events of a bus, off the request path.
+
+    @param bus: Event bus the models publish on (usually `events.default_bus`).
+    @return: The subscription.
+    """
+    return bus.subscribe("*", _record_batch, max_queue=10_000, batch_size=256,
+                         batch_timeout=0.01, events=True, inline=True)
+
+
+def render() -> str:
+    """
+    @return: The default registry in the Prometheus text format, for a /metrics endpoint.
+    """
+    return registry.render()
+
+
+class OpenTelemetryExporter:
+    """
+    Export the lifecycle events of a bus as OpenTelemetry spans: one span per model
+    request (with a "first_token" event) and one per tool call, timed from the event
+    timestamps. Requires the opentelemetry-api package and a configured SDK.
+
+    @param bus: Event bus the models publish on.
+    @param tracer: Tracer to use (default: the "gracii" tracer of the global provider).
+    """
+
+    # Spans of requests whose stream was abandoned never get their completion event
+    MAX_OPEN_SPANS = 10_000
+
+    def __init__(self, bus: events.EventBus, tracer=None) -> None:
+        if otel_trace is None:
+            raise ImportError("OpenTelemetryExporter requires opentelemetry-api.")
+        self.tracer = tracer or otel_trace.get_tracer("gracii")
+        self._spans: Dict[str, object] = {}
+        self.subscription = bus.subscribe("*", self._export, max_queue=10_000, batch_size=64,
+                                          batch_timeout=0.05, events=True)
+
+
+    def _start(self, key: str, name: str, timestamp: int, attributes: Dict) -> None:
+        if len(self._spans) >= self.MAX_OPEN_SPANS:
+            self._spans.pop(next(iter(self._spans))).end()
+        self._spans[key] = self.tracer.start_span(name, start_time=timestamp, attributes=attributes)
+
+
+    def _export(self, batch: List[events.Event]) -> None:
+        for event in batch:
+            data = event.data
+            timestamp = int(event.timestamp * 1e9)
+            if event.id == events.REQUEST_START:
+                self._start(data["request_id"], "model.request", timestamp,
+                            {"model": data["model"], "streaming": data["streaming"]})
+            elif event.id == events.REQUEST_FIRST_TOKEN:
+                span = self._spans.get(data["request_id"])
+                if span is not None:
+                    span.add_event("first_token", {"ttft": data["ttft"]}, timestamp=timestamp)
+            elif event.id in (events.REQUEST_COMPLETE, events.REQUEST_ERROR):
+                span = self._spans.pop(data["request_id"], None)
+                if span is None:
+                    continue
+                usage = data.get("usage") or {}
+                for key in ("input_tokens", "output_tokens"):
+                    if key in usage:
+                        span.set_attribute(key, usage[key])
+                if data.get("stop_reason"):
+                    span.set_attribute("stop_reason", data["stop_reason"])
+                if event.id == events.REQUEST_ERROR:
+                    span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, data["error"]))
+                span.end(end_time=timestamp)
+            elif event.id == events.TOOL_START and data.get("tool_id"):
+                self._start(data["tool_id"], "tool.call", timestamp, {"tool": data["tool"]})
+            elif event.id in (events.TOOL_END, events.TOOL_TIMEOUT) and data.get("tool_id"):
+                span = self._spans.pop(data["tool_id"], None)
+                if span is None:
+                    continue
+                if event.id == events.TOOL_TIMEOUT or data.get("error"):
+                    span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+                span.end(end_time=timestamp)
@@ -1,7 +1,13 @@
-import json
+import asyncio
+import copy
+import threading
+import time
 
-from typing import List, Any, Dict, Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Any, Dict, Callable, AsyncIterator
+from techxmodule import clients, events
 from techxmodule.messages import ChatMessage
+from techxmodule.serialization import encode_payload
 from termcolor import cprint
 
 
@@ -11,16 +17,31 @@ class LLM():
     and tool integration.
     """
     
+    # Threads used to read blocking boto3 event streams on behalf of the event loop,
+    # one per open stream. Blocking invocations get their own threads, so slow streams
+    # never starve them
+    STREAM_READER_WORKERS = 64
+    INVOKE_WORKERS = 32
+    _stream_executor = None
+    _invoke_executor = None
+    _stream_executor_lock = threading.Lock()
+    
     
     def __init__(self, name: str, 
                  session: Any, 
                  region_name: str,
-                 max_chat_memory: int) -> None:
+                 max_chat_memory: int,
+                 max_memory_tokens: int = None) -> None:
         self.name = name
-        self.runtime = session.client("bedrock-runtime", 
-                                      region_name=region_name)
-        self.memory = ChatMessage(max_chat_message=max_chat_memory)
+        # Shared per process, region, credentials and config (see techxmodule.clients)
+        self.runtime = clients.get_runtime_client(session, region_name)
+        self.memory = ChatMessage(max_chat_message=max_chat_memory,
+                                  max_tokens=max_memory_tokens)
         self.tools: List[Any] = []
+        # Optional techxmodule.routing.BedrockRouter spreading calls over regions / models
+        self.router = None
+        # Lifecycle events (request start, first token, tools, completion) go to this bus
+        self.event_bus = events.default_bus
         self._is_streaming = False
     
     
@@ -33,6 +54,42 @@ class LLM():
         self.tools.extend(tool_list)
     
     
+    def set_router(self, router: Any) -> None:
+        """
+        Route invocations through a router instead of the single regional client
+        
+        :param router: techxmodule.routing.BedrockRouter, or None to call self.runtime directly
+        """
+        self.router = router
+    
+    
+    def _publish(self, event_type: str, **data) -> None:
+        """
+        Publish a lifecycle event, see techxmodule.events. Nothing is queued without subscribers.
+        
+        :param event_type: Topic of the event
+        :param data: Payload of the event
+        """
+        if self.event_bus.has_subscribers(event_type):
+            self.event_bus.publish(event_type, data)
+    
+    
+    def with_memory(self, memory: ChatMessage) -> "LLM":
+        """
+        Create a lightweight copy of the model bound to another conversation memory.
+        
+        The copy shares the Bedrock runtime client and the tool list with this instance,
+        so one model object can serve many sessions.
+        
+        :param memory: The conversation memory of the session
+        :return: Model instance using the given memory
+        """
+        session_llm = copy.copy(self)
+        session_llm.memory = memory
+        session_llm._is_streaming = False
+        return session_llm
+    
+    
     def _invoke_with_payload(self, modelId: str, 
                               payload: Dict, 
                               streaming: bool) -> Dict:
@@ -44,14 +101,112 @@ class LLM():
             "modelId": modelId,
             "accept": "application/json",
             "contentType": "application/json",
-            "body": json.dumps(payload)
+            "body": encode_payload(payload)
         }
 
         # Call the model based on streaming tag
         self._is_streaming = streaming
-        if self._is_streaming:
-            return self.runtime.invoke_model_with_response_stream(**invoke_kwargs)
-        return self.runtime.invoke_model(**invoke_kwargs)
+        started = time.perf_counter()
+        if self.router is not None:
+            invoke_kwargs.pop("modelId")
+            response = self.router.invoke(modelId, invoke_kwargs, streaming)
+        elif self._is_streaming:
+            response = self.runtime.invoke_model_with_response_stream(**invoke_kwargs)
+        else:
+            response = self.runtime.invoke_model(**invoke_kwargs)
+        self._publish(events.REQUEST_RESPONSE, model=modelId, streaming=streaming,
+                      latency=time.perf_counter() - started, payload_bytes=len(invoke_kwargs["body"]))
+        return response
+    
+    
+    async def _ainvoke_with_payload(self, modelId: str, 
+                                    payload: Dict, 
+                                    streaming: bool) -> Dict:
+        """
+        Async version of `_invoke_with_payload`.
+        The blocking Bedrock call runs in the invoke executor.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_invoke_executor(),
+            self._invoke_with_payload, modelId, payload, streaming)
+    
+    
+    async def _astream_response(self, model_response: Dict) -> AsyncIterator[Dict]:
+        """
+        Iterate a Bedrock event stream from async code.
+        
+        One stream reader worker drains the boto3 EventStream and hands every decoded
+        chunk to the event loop, so the caller never blocks on network reads. The worker
+        also closes the stream, on its own thread: when the caller stops early, it
+        stops at the next event it reads.
+        
+        :param model_response: Response of `invoke_model_with_response_stream`
+        :return: Async iterator of the raw `chunk.bytes` payloads
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stream = model_response.get("body")
+        cancelled = threading.Event()
+        end = object()
+        
+        def post(item):
+            if not cancelled.is_set():
+                try:
+                    loop.call_soon_threadsafe(queue.put_nowait, item)
+                except RuntimeError:  # the event loop is closed
+                    cancelled.set()
+        
+        def pump():
+            try:
+                for event in stream:
+                    if cancelled.is_set():
+                        break
+                    post(event)
+            except Exception as e:
+                post(e)
+            finally:
+                if hasattr(stream, "close"):
+                    stream.close()
+                post(end)
+        
+        loop.run_in_executor(self._get_stream_executor(), pump)
+        try:
+            while True:
+                event = await queue.get()
+                if event is end:
+                    break
+                if isinstance(event, Exception):
+                    raise event
+                yield event["chunk"]["bytes"]
+        finally:
+            cancelled.set()
+    
+    
+    @classmethod
+    def _get_stream_executor(cls) -> ThreadPoolExecutor:
+        """
+        Return the process-wide executor reading Bedrock response streams.
+        """
+        with LLM._stream_executor_lock:
+            if LLM._stream_executor is None:
+                LLM._stream_executor = ThreadPoolExecutor(
+                    max_workers=cls.STREAM_READER_WORKERS,
+                    thread_name_prefix="bedrock-stream")
+        return LLM._stream_executor
+    
+    
+    @classmethod
+    def _get_invoke_executor(cls) -> ThreadPoolExecutor:
+        """
+        Return the process-wide executor running blocking Bedrock invocations.
+        """
+        with LLM._stream_executor_lock:
+            if LLM._invoke_executor is None:
+                LLM._invoke_executor = ThreadPoolExecutor(
+                    max_workers=cls.INVOKE_WORKERS,
+                    thread_name_prefix="bedrock-invoke")
+        return LLM._invoke_executor
 
     
     def _parse_response(self, invoke_result: Any, 
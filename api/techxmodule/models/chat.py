@@ -1,12 +1,17 @@
-import tools, json
+import json, time, threading
 import xml.etree.ElementTree as ET
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 from termcolor import cprint
-from typing import List, Optional, Any, Dict, Callable
+from typing import List, Optional, Any, Dict, Callable, AsyncIterator
 from functools import wraps
-from techxmodule import utils
+from techxmodule import events, utils
+from techxmodule.context import ContextPacker
+from techxmodule.core import Tools
 from techxmodule.models.__core_skeleton__ import LLM
-from techxmodule.messages import Image
+from techxmodule.messages import Image, Message
+from techxmodule.streaming import ClaudeStreamDecoder, StreamEvent, TextDelta, ToolUse, TrackedStream
 
 
 class ChatLLM(LLM):
@@ -23,7 +28,8 @@ class ChatLLM(LLM):
     def __init__(self, name: str, 
                  max_chat_memory: int, 
                  session: Any, 
-                 region_name: str):
+                 region_name: str,
+                 max_memory_tokens: Optional[int] = None):
         """
         Initialize Chat model Instance
         
@@ -32,11 +38,13 @@ class ChatLLM(LLM):
                                 2 means 1 for user and 1 for assistant. Default is 0.
         :param session: Session object for API calls
         :param region_name: AWS region name
+        :param max_memory_tokens: Approximate token budget of the chat history, None for no budget
         """
         super().__init__(name, 
                          session, 
                          region_name, 
-                         max_chat_memory+self.MEMORY_BUFFER)
+                         max_chat_memory+self.MEMORY_BUFFER,
+                         max_memory_tokens)
     
     
     def manage_memory(func):
@@ -46,19 +54,31 @@ class ChatLLM(LLM):
         
         def clean_tag_question(self):
             if len(self.memory.messages) > 2:
-                try:
-                    clean_text = utils.clean_tag(self.memory.messages[-3]["content"][0]["text"])
-                    self.memory.messages[-3]["content"][0]["text"] = clean_text
-                except (IndexError, KeyError) as e:
-                    pass
+                self.memory.clean_tags(-3)
+        
+        def is_turn_start(self, message):
+            return message.role == self.USER_ROLE and not message.is_tool_result()
     
         def removing_old_messages(self):
-            while len(self.memory.messages) > self.memory.max_chat_message + 1:
-                self.memory.messages.pop(0)
-                if self.memory.messages and \
-                    self.memory.messages[0]["role"] == self.USER_ROLE and \
-                    self.memory.messages[0]["content"][0]["type"] != self.TOOL_RESULT:
-                    break
+            memory = self.memory
+            
+            # Shrink older tool results first, the tool_use/tool_result pairs stay intact
+            if memory.over_budget():
+                memory.truncate_tool_results()
+            
+            # Never evict the question of the turn in progress
+            current_turn = len(memory.messages) - 1
+            while current_turn > 0 and not is_turn_start(self, memory.messages[current_turn]):
+                current_turn -= 1
+            
+            # Evict whole turns from the front, the history must start with a user question
+            while current_turn > 0 and \
+                    (len(memory.messages) > memory.max_chat_message + 1 or memory.over_budget()):
+                memory.popleft()
+                current_turn -= 1
+                while current_turn > 0 and not is_turn_start(self, memory.messages[0]):
+                    memory.popleft()
+                    current_turn -= 1
         
         @wraps(func)
         def wrapper(self, *args, **kwargs):
@@ -116,8 +136,8 @@ class ChatLLM(LLM):
         if not messages:
             if not self.memory.messages:
                 raise AssertionError("Memory is empty. Please provide messages.")
-            return self.memory.messages
-        return [{"role": self.USER_ROLE, "content": messages}]
+            return list(self.memory.messages)
+        return [Message(self.USER_ROLE, messages)]
     
 
     def _invoke_chat_model(self, modelId: str, 
@@ -139,23 +159,56 @@ class ChatLLM(LLM):
         # Call the build_payload_func with parameters unpacked from the list
         payload = build_payload_func(*payload_params)
         return self._invoke_with_payload(modelId, payload, streaming)
+    
+    
+    async def _ainvoke_chat_model(self, modelId: str, 
+            build_payload_func, 
+            payload_params: list, streaming: bool = False) -> Dict:
+        """
+        Async version of `_invoke_chat_model`.
+        """
+        payload_params[0] = self.__assess_messages(payload_params[0])
+        payload = build_payload_func(*payload_params)
+        return await self._ainvoke_with_payload(modelId, payload, streaming)
 
 
 class Claude(ChatLLM):
     """
     Anthropic Claude model class that interacts with AWS Bedrock runtime service.
     """
+    
+    CACHE_CONTROL = {"type": "ephemeral"}
+    
+    # Minimum score of a knowledge base result to be used as context, and token budget of that context.
+    # None uses the "minRelevance" reported by the retrieval (scores depend on the embedder),
+    # else KB_DEFAULT_RELEVANCE, the cut-off for Bedrock Knowledge Bases
+    KB_MIN_RELEVANCE = None
+    KB_DEFAULT_RELEVANCE = 0.5
+    KB_CONTEXT_TOKENS = 6000
+    # Tool dispatch settings: tools running at once for one request and for the whole process,
+    # and seconds a single tool may run (or wait for a worker) before it is reported as failed.
+    # Tools set their own I/O deadlines below TOOL_TIMEOUT, a timed-out tool still holds its
+    # worker until it returns and is counted as hung meanwhile
+    MAX_TOOL_CONCURRENCY = 4
+    MAX_PROCESS_TOOL_CONCURRENCY = 16
+    TOOL_TIMEOUT = 60
+    _tool_executor = None
+    _tool_executor_lock = threading.Lock()
+    _hung_tools = 0
 
     def __init__(self, model_name: str, 
                  session: Any, 
                  region: str, 
-                 max_chat_memory = 0) -> None:
+                 max_chat_memory = 0,
+                 max_memory_tokens: Optional[int] = None,
+                 prompt_caching: bool = False) -> None:
         """Initialize Claude model with specified version and session.
 
         Args:
             model_name (str): 
                 Name of the Claude model to use.
-                Valid options are "3-haiku", "3-sonnet", "3-opus", or "3.5-sonnet".
+                Valid options are "3-haiku", "3-sonnet", "3-opus", "3.5-sonnet",
+                "3.5-haiku", "3.5-sonnet-v2" or "3.7-sonnet".
             session (Any): 
                 An instance of the boto3 session object for creating a Bedrock client.
             region (str): 
@@ -163,13 +216,23 @@ class Claude(ChatLLM):
             max_chat_memory (int, optional): 
                 Maximum number of chats (plus buffer) the model can remember. 
                 Defaults to 0.
+            max_memory_tokens (int, optional):
+                Approximate token budget of the chat history. Older tool results
+                are truncated, then the oldest turns evicted, to stay under it.
+                Defaults to None (no budget).
+            prompt_caching (bool, optional):
+                Mark the tools, system prompt and stable history prefix as
+                cacheable (requires a model supporting Bedrock prompt caching).
+                Defaults to False.
         """
 
         super().__init__("claude", 
                          max_chat_memory, 
                          session, 
-                         region)
+                         region,
+                         max_memory_tokens)
         self.modelId = self.__set_model_id(model_name)
+        self.prompt_caching = prompt_caching
 
 
     def invoke(self, messages: str = None, 
@@ -211,18 +274,50 @@ class Claude(ChatLLM):
 
         Returns:
             Dict: Json that contain full response output.
+            With streaming, the request ends (REQUEST_COMPLETE or REQUEST_ERROR) when
+            the "body" stream has been read to the end, failed or was closed.
         """
 
+        request_id = events.new_request_id()
+        started = time.perf_counter()
+        self._publish(events.REQUEST_START, request_id=request_id, model=self.modelId, streaming=streaming)
+
         # Invoke model through bedrock runtime service
-        return self._invoke_chat_model(self.modelId, 
-            self.__build_claude_payload, 
-            payload_params=[messages, 
-                            system_prompt, 
-                            max_token, 
-                            temperature, 
-                            top_p, 
-                            top_k], 
-            streaming=streaming)
+        try:
+            response = self._invoke_chat_model(self.modelId, 
+                self.__build_claude_payload, 
+                payload_params=[messages, 
+                                system_prompt, 
+                                max_token, 
+                                temperature, 
+                                top_p, 
+                                top_k], 
+                streaming=streaming)
+        except Exception as e:
+            self._publish(events.REQUEST_ERROR, request_id=request_id, error=str(e),
+                          latency=time.perf_counter() - started)
+            raise
+        if not streaming:
+            self._publish(events.REQUEST_COMPLETE, request_id=request_id,
+                          latency=time.perf_counter() - started)
+            return response
+
+        finished = False
+
+        def finish(error):
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            if error is None:
+                self._publish(events.REQUEST_COMPLETE, request_id=request_id,
+                              latency=time.perf_counter() - started)
+            else:
+                self._publish(events.REQUEST_ERROR, request_id=request_id, error=str(error),
+                              latency=time.perf_counter() - started)
+
+        response["body"] = TrackedStream(response["body"], finish)
+        return response
         
         # Return the parse response from the invoke result
         return self._parse_response(
@@ -234,23 +329,250 @@ class Claude(ChatLLM):
             debug=verbose)
     
 
-    def tool_use(self, tools_list: list) -> list:
+    async def ainvoke(self, messages: str = None, 
+                      system_prompt = "", 
+                      max_token = 4096,
+                      temperature = 0.15, 
+                      top_p = 0.8, 
+                      top_k = 50, 
+                      streaming = False) -> Dict[str, Any]:
+        """Async version of `invoke`, the Bedrock call does not block the event loop.
+
+        Returns:
+            Dict: Json that contain full response output.
         """
-        Invoke tools based on the provided list and process the results.
+        return await self._ainvoke_chat_model(self.modelId, 
+            self.__build_claude_payload, 
+            payload_params=[messages, 
+                            system_prompt, 
+                            max_token, 
+                            temperature, 
+                            top_p, 
+                            top_k], 
+            streaming=streaming)
+
 
-        @param tools_list: List of tools with 'name' and 'input' keys for invocation.
+    async def astream(self, messages: str = None, 
+                      system_prompt = "", 
+                      max_token = 4096,
+                      temperature = 0.15, 
+                      top_p = 0.8, 
+                      top_k = 50,
+                      decoder: ClaudeStreamDecoder = None) -> AsyncIterator[StreamEvent]:
+        """Invoke the model with streaming and iterate the stream asynchronously.
+
+        Takes the same arguments as `invoke`, plus:
+            decoder (ClaudeStreamDecoder, optional):
+                Decoder used to parse the stream. Pass one in to read the
+                assembled body, tools, stop reason and usage afterwards.
+
+        Yields:
+            StreamEvent: Typed stream event (TextDelta, ToolUse, MessageDelta, ...).
+
+        The request always ends with one terminal event: REQUEST_COMPLETE, or
+        REQUEST_ERROR when it failed or was cancelled (closed before its end).
+        """
+        decoder = decoder or ClaudeStreamDecoder()
+        request_id = events.new_request_id()
+        started = time.perf_counter()
+        first_token = last_token = None
+        token_gaps = []
+        self._publish(events.REQUEST_START, request_id=request_id, model=self.modelId, streaming=True)
+        error, cancelled = None, False
+        try:
+            response = await self.ainvoke(messages, 
+                                          system_prompt, 
+                                          max_token, 
+                                          temperature, 
+                                          top_p, 
+                                          top_k, 
+                                          streaming=True)
+            async for raw in self._astream_response(response):
+                event = decoder.feed_bytes(raw)
+                if event is not None:
+                    if type(event) is TextDelta:
+                        # Inter-token gaps are reported with the completion, not per token
+                        now = time.perf_counter()
+                        if last_token is not None:
+                            token_gaps.append(now - last_token)
+                        last_token = now
+                    if first_token is None and type(event) in (TextDelta, ToolUse):
+                        first_token = time.perf_counter() - started
+                        self._publish(events.REQUEST_FIRST_TOKEN, request_id=request_id, ttft=first_token)
+                    yield event
+        except Exception as e:
+            error = str(e)
+            raise
+        except BaseException:
+            # Cancelled, or closed by the consumer (GeneratorExit) before the end of the stream
+            error, cancelled = "cancelled", True
+            raise
+        finally:
+            if error is None:
+                self._publish(events.REQUEST_COMPLETE, request_id=request_id,
+                              latency=time.perf_counter() - started,
+                              ttft=first_token,
+                              stop_reason=decoder.stop_reason,
+                              usage=dict(decoder.usage),
+                              token_gaps=token_gaps)
+            else:
+                self._publish(events.REQUEST_ERROR, request_id=request_id, error=error,
+                              cancelled=cancelled,
+                              latency=time.perf_counter() - started)
+
+
+    def tool_use(self, tools_list: list, 
+                 max_concurrency: int = None, 
+                 timeout: float = None) -> list:
+        """
+        Invoke tools based on the provided list and process the results.
+        
+        Tools run concurrently on a process-wide thread pool, at most `max_concurrency`
+        at a time for this request. Results keep the order of `tools_list`.
+        
+        Each tool gets `timeout` seconds from the moment it starts running. A tool still
+        waiting for a pool worker after `timeout` seconds is not run. A tool that times out
+        frees its place in this request, and its worker is counted as hung until it returns;
+        when every worker is hung, tools fail immediately instead of queueing.
+
+        @param tools_list: List of tools with 'id', 'name' and 'input' keys for invocation.
+        @param max_concurrency: Maximum tools running at once for this call (default MAX_TOOL_CONCURRENCY).
+        @param timeout: Seconds each tool may take (default TOOL_TIMEOUT).
         @return: List of tool results containing tool_id and content.
         """
-        results = []
-        for tool in tools_list:
-            cprint("Analyzing...", "cyan", attrs=["blink"])
-            tool_function = getattr(tools, tool["name"])
-            result = tool_function(**tool["input"])
-            results.append({
-                "tool_id": tool['id'],
-                "content": self.__process_tool_result(result)
-            })
-        return results
+        max_concurrency = max_concurrency or self.MAX_TOOL_CONCURRENCY
+        timeout = timeout or self.TOOL_TIMEOUT
+        executor = self._get_tool_executor()
+        results = [None] * len(tools_list)
+        waiting = list(enumerate(tools_list))
+        waiting.reverse()
+        running = {}  # future -> (position, tool, submitted)
+        started = {}  # position -> time the tool started, set by the worker
+        # Each call gets one terminal event: TOOL_END from the worker or TOOL_TIMEOUT from here
+        finished, timed_out = set(), set()
+        settle_lock = threading.Lock()
+        
+        def settle(position):
+            with settle_lock:
+                if position in timed_out:
+                    return False
+                finished.add(position)
+                return True
+        
+        def run(position, tool):
+            started[position] = time.monotonic()
+            return self.__run_tool(tool, lambda: settle(position))
+        
+        while waiting or running:
+            while waiting and len(running) < max_concurrency:
+                position, tool = waiting.pop()
+                cprint("Analyzing...", "cyan", attrs=["blink"])
+                if self._tool_pool_saturated():
+                    results[position] = self.__tool_error(tool, "was not run, every tool worker is busy")
+                    continue
+                running[executor.submit(run, position, tool)] = (position, tool, time.monotonic())
+            if not running:
+                continue
+            
+            # Wait for the next tool to finish or for the next deadline
+            deadline = min(started.get(position, submitted) + timeout
+                           for position, _, submitted in running.values())
+            done, _ = wait(running, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            for future in done:
+                position, _, _ = running.pop(future)
+                results[position] = future.result()
+            
+            now = time.monotonic()
+            for future, (position, tool, submitted) in list(running.items()):
+                if position not in started:
+                    # Still queued behind other requests: give up only if it never started
+                    if now - submitted >= timeout and future.cancel():
+                        del running[future]
+                        results[position] = self.__tool_error(tool, "was not run, every tool worker is busy")
+                elif now - started[position] >= timeout:
+                    with settle_lock:
+                        if position in finished:
+                            continue  # Returned just now, collected by the next wait
+                        timed_out.add(position)
+                    del running[future]
+                    self._mark_hung(future)
+                    self._publish(events.TOOL_TIMEOUT, tool=tool["name"], tool_id=tool["id"], timeout=timeout)
+                    results[position] = self.__tool_error(tool, f"timed out after {timeout}s")
+        
+        return [{
+            "tool_id": tool['id'],
+            "content": self.__process_tool_result(result)
+        } for tool, result in zip(tools_list, results)]
+
+
+    @staticmethod
+    def __tool_error(tool: dict, reason: str) -> dict:
+        return {
+            "error": f"Error using tool: {tool['name']} {reason}",
+            "type": "toolError",
+            "action": "retrieve"
+        }
+
+
+    def __run_tool(self, tool: dict, settle: Callable[[], bool] = None) -> dict:
+        """
+        Run a single tool, turning unexpected failures into an error result.
+
+        @param tool: Tool with 'name' and 'input' keys.
+        @param settle: Called when the tool returns, TOOL_END is only published if it
+                       returns True (False once the caller reported a timeout instead).
+        @return: Result returned from the tool.
+        """
+        self._publish(events.TOOL_START, tool=tool["name"], tool_id=tool.get("id"))
+        started = time.perf_counter()
+        try:
+            # Validates the input against the tool definition, imports the tools module on first use
+            result = Tools.dispatch(tool["name"], tool["input"])
+        except Exception as e:
+            result = {
+                "error": f"Error using tool: {e}",
+                "type": "toolError",
+                "action": "retrieve"
+            }
+        if settle is None or settle():
+            self._publish(events.TOOL_END, tool=tool["name"], tool_id=tool.get("id"),
+                          latency=time.perf_counter() - started, error="error" in result)
+        return result
+
+
+    @classmethod
+    def _get_tool_executor(cls) -> ThreadPoolExecutor:
+        """
+        Return the process-wide executor shared by every tool call.
+        """
+        with Claude._tool_executor_lock:
+            if Claude._tool_executor is None:
+                Claude._tool_executor = ThreadPoolExecutor(
+                    max_workers=cls.MAX_PROCESS_TOOL_CONCURRENCY,
+                    thread_name_prefix="tool")
+        return Claude._tool_executor
+
+
+    @classmethod
+    def _mark_hung(cls, future) -> None:
+        """
+        Count the worker of a timed-out tool as hung until the tool returns.
+        """
+        with Claude._tool_executor_lock:
+            Claude._hung_tools += 1
+        
+        def release(_):
+            with Claude._tool_executor_lock:
+                Claude._hung_tools -= 1
+        future.add_done_callback(release)
+
+
+    @classmethod
+    def _tool_pool_saturated(cls) -> bool:
+        """
+        @return: Whether every worker of the tool pool is held by a hung tool.
+        """
+        return Claude._hung_tools >= cls.MAX_PROCESS_TOOL_CONCURRENCY
 
 
     def __process_tool_result(self, result: dict) -> str:
@@ -262,14 +584,17 @@ class Claude(ChatLLM):
         """
         if result["type"] == "documents":
             cprint("Analyzing data from knowledge base...", "cyan")
-            return self.__build_context_kb_prompt(result["text"])
+            min_relevance = self.KB_MIN_RELEVANCE
+            if min_relevance is None:
+                min_relevance = (result["text"] or {}).get("minRelevance", self.KB_DEFAULT_RELEVANCE)
+            return self.__build_context_kb_prompt(result["text"], min_relevance=min_relevance)
         elif result["type"] == "data":
             cprint("Retrieving data from sources...", "cyan")
             return result["text"]
         elif result["type"] == "image":
             print("Image processing not yet implemented.")
             return ""
-        elif result["type"] == "parameterError":
+        elif result["type"] in ("parameterError", "toolError"):
             cprint("Error using tool, retrying with different tools...", "red")
             return result["error"]
         return ""
@@ -280,27 +605,18 @@ class Claude(ChatLLM):
                                   debug: bool = False) -> str:
         """
         Build XML context prompt from retrieved knowledge base data.
+        Results are sorted, deduplicated and fitted into KB_CONTEXT_TOKENS (see context.ContextPacker).
 
         @param retrieved_data: JSON object with retrieval results and metadata.
         @param min_relevance: Minimum relevance score for including context.
         @param debug: Flag to enable XML structure debugging.
         @return: XML string representing the context.
         """
-        if not retrieved_data:
-            return ""
-        documents = ET.Element("documents")
-        if retrieved_data["ResponseMetadata"]["HTTPStatusCode"] != 200:
-            documents.text = "Error retrieving data. No context provided."
-        else:
-            for i, context in enumerate(retrieved_data["retrievalResults"]):
-                if context["score"] < min_relevance:
-                    break
-                document = ET.SubElement(documents, "document", {"index": str(i + 1)})
-                ET.SubElement(document, "source").text = utils.iterate_through_location(context["location"])
-                ET.SubElement(document, "document_content").text = context["content"]["text"]
+        packer = ContextPacker(max_tokens=self.KB_CONTEXT_TOKENS, min_relevance=min_relevance)
+        documents = packer.render_retrieval(retrieved_data)
         if debug:
-            ET.dump(documents)
-        return ET.tostring(documents, encoding="unicode", method="xml")
+            print(documents)
+        return documents
 
 
     def __build_claude_payload(self, messages: list, 
@@ -319,12 +635,15 @@ class Claude(ChatLLM):
         @param top_k: Number of top tokens for sampling.
         @return: JSON-encoded payload.
         """
+        tools = self.tools
+        if self.prompt_caching:
+            tools, system_prompt, messages = self.__mark_cache_points(tools, system_prompt, messages)
         return {
             "anthropic_version": "bedrock-2023-05-31",
             "max_tokens": max_token,
             "system": system_prompt,
             "messages": messages,
-            "tools": self.tools,
+            "tools": tools,
             "temperature": temperature,
             "top_p": top_p,
             "top_k": top_k,
@@ -332,6 +651,53 @@ class Claude(ChatLLM):
         }
 
 
+    def __mark_cache_points(self, tools: list, 
+                            system_prompt: str, 
+                            messages: list) -> tuple:
+        """
+        Add prompt-caching breakpoints to the stable prefix of the request.
+
+        The prefix is cached in the order tools, system, messages. One breakpoint
+        goes on the system prompt (or the last tool), one on the question that opened
+        the current turn and one on the last message, so every tool-loop round trip
+        reads the prefix written by the previous one. The memory itself is not
+        modified, marked messages are shallow copies.
+
+        @param tools: Tool schemas of the request.
+        @param system_prompt: System-level prompt for Claude.
+        @param messages: Messages to be sent to the model.
+        @return: (tools, system, messages) with cache_control markers.
+        """
+        if system_prompt:
+            system_prompt = [{"type": "text", "text": system_prompt, "cache_control": self.CACHE_CONTROL}]
+        elif tools:
+            tools = tools[:-1] + [{**tools[-1], "cache_control": self.CACHE_CONTROL}]
+
+        if not messages:
+            return tools, system_prompt, messages
+
+        marked = [len(messages) - 1]
+        for index in range(len(messages) - 2, -1, -1):
+            message = messages[index]
+            if message.role == self.USER_ROLE and \
+                    not isinstance(message.content, str) and \
+                    not message.is_tool_result():
+                marked.append(index)
+                break
+
+        messages = list(messages)
+        for index in marked:
+            message = messages[index].to_dict()
+            content = message["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            messages[index] = {
+                **message,
+                "content": content[:-1] + [{**content[-1], "cache_control": self.CACHE_CONTROL}]
+            }
+        return tools, system_prompt, messages
+
+
     def __process_streaming_claude_response(
             self, model_response: Any, 
             debug: bool = False) -> Any:
@@ -342,65 +708,23 @@ class Claude(ChatLLM):
         :param debug: Flag to enable debugging information
         :return: Full stream response with text, tool data, and stop reason
         """
-        full_response = ""
-        tool_input = ""
-        tools_used = []
-        body = []
-        stop_reason = ""
+        decoder = ClaudeStreamDecoder()
 
         for event in model_response.get("body"):
-            chunk = json.loads(event["chunk"]["bytes"])
-
-            # Debugging info
-            if chunk['type'] == 'message_delta':
-                stop_reason = chunk['delta'].get('stop_reason', '')
-                stop_sequence = chunk['delta'].get('stop_sequence', '')
-                output_token = chunk['usage']['output_tokens']
-                if debug:
-                    print(f"\nStop reason: {stop_reason}")
-                    print(f"Stop sequence: {stop_sequence}")
-                    print(f"Output tokens: {output_token}\n")
-
-            # Processing streaming content
-            if chunk['type'] == 'content_block_delta':
-                if chunk['delta']['type'] == 'text_delta':
-                    text_chunk = chunk['delta']['text']
-                    # print(colored(text_chunk, "green"), end="", flush=True)
-                    yield text_chunk
-                    full_response += text_chunk
-                elif chunk['delta']['type'] == 'input_json_delta':
-                    tool_input += chunk['delta']['partial_json']
-            
-            # Record the tool need to use
-            if chunk['type'] == 'content_block_start' and chunk['index'] != 0:
-                tool_index = chunk['index'] - 1
-                tool_id = chunk['content_block']['id']
-                tool_name = chunk['content_block']['name']
-    
-            # End of content block
-            if chunk['type'] == 'content_block_stop':
-                if chunk['index'] == 0:
-                    body.append({"type": "text", "text": full_response})
-                else:
-                    try:
-                        tool_input_json = json.loads(tool_input)
-                    except json.JSONDecodeError:
-                        tool_input_json = {}
-
-                    tools_used.append({
-                        "type": "tool_use",
-                        "id": tool_id,
-                        "name": tool_name,
-                        "input": tool_input_json
-                    })
-                    body.append(tools_used[-1])
-                    tool_input = ""
+            event = decoder.feed_bytes(event["chunk"]["bytes"])
+            if type(event) is TextDelta:
+                yield event.text
+
+        if debug:
+            print(f"\nStop reason: {decoder.stop_reason}")
+            print(f"Stop sequence: {decoder.stop_sequence}")
+            print(f"Output tokens: {decoder.usage.get('output_tokens')}\n")
 
         return {
-            "response": full_response,
-            "tool": tools_used,
-            "stop_reason": stop_reason,
-            "body": body
+            "response": decoder.text,
+            "tool": decoder.tools,
+            "stop_reason": decoder.stop_reason,
+            "body": decoder.body
         }
 
 
@@ -449,11 +773,25 @@ class Claude(ChatLLM):
         @param model_name: Name of the Claude model to use.
         @return: Model ID corresponding to the chosen model.
         """
+        return self.resolve_model_id(model_name)
+
+
+    @staticmethod
+    def resolve_model_id(model_name: str) -> str:
+        """
+        Resolve a model name to its Bedrock model ID, e.g. for router fallbacks.
+
+        @param model_name: Name of the Claude model, e.g. "3-haiku".
+        @return: Bedrock model ID.
+        """
         model_map = {
             "3-haiku": "anthropic.claude-3-haiku-20240307-v1:0",
             "3-sonnet": "anthropic.claude-3-sonnet-20240229-v1:0",
             "3-opus": "us.anthropic.claude-3-opus-20240229-v1:0",
-            "3.5-sonnet": "anthropic.claude-3-5-sonnet-20240620-v1:0"
+            "3.5-sonnet": "anthropic.claude-3-5-sonnet-20240620-v1:0",
+            "3.5-haiku": "us.anthropic.claude-3-5-haiku-20241022-v1:0",
+            "3.5-sonnet-v2": "us.anthropic.claude-3-5-sonnet-20241022-v2:0",
+            "3.7-sonnet": "us.anthropic.claude-3-7-sonnet-20250219-v1:0"
         }
         if model_name not in model_map:
             raise ValueError(f"Invalid model name: {model_name}")
@@ -472,9 +810,8 @@ class Claude(ChatLLM):
         if not prompt:
             return ""
 
-        context_element = ET.Element("context")
-        context_element.text = prompt
-        return ET.tostring(context_element, encoding="unicode", method="xml")
+        # Same output as ElementTree, without building an element per request
+        return f"<context>{utils.escape_xml(prompt)}</context>"
 
 
     def build_cot_prompt(self, prompt: str = None) -> str:
@@ -524,7 +861,8 @@ class Claude(ChatLLM):
 
         @return: A string containing the XML representation of the user prompt.
         """
-        request_element = ET.Element("request")
-        request_element.text = prompt
-        return ET.tostring(request_element, encoding="unicode", method="xml")
+        # Same output as ElementTree, without building an element per request
+        if not prompt:
+            return "<request />"
+        return f"<request>{utils.escape_xml(prompt)}</request>"
     
@@ -0,0 +1,150 @@
+import hashlib
+import re
+
+from typing import Dict, Iterator, Optional
+
+from techxmodule.cache import TTLCache, normalize_text
+
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+# Words that do not change what a question asks for, ignored by `content_terms`
+STOPWORDS = frozenset("""
+    a an the is are was were be been am do does did can could would will should shall may
+    what whats who whom which when where why how i me my we our you your it its this that
+    these those there here of in on at to for from with by about and or but so please tell
+    let us s
+""".split())
+# Words of questions whose answer depends on when they are asked, see `time_sensitive`
+TIME_WORDS = frozenset("""
+    time times date today tonight tomorrow yesterday now current currently latest recent
+    recently news weather forecast day days week weekend month year hour hours minute clock
+    live score scores price prices
+""".split())
+
+
+def content_terms(text: str) -> tuple:
+    """
+    @return: The words of a text that carry its meaning (stopwords removed), in order.
+    """
+    return tuple(word for word in _WORD.findall(text.lower()) if word not in STOPWORDS)
+
+
+def time_sensitive(text: str) -> bool:
+    """
+    @return: Whether a question asks about the time, the date or something changing
+             with them ("what time is it", "news today"), so its answer must not be reused.
+    """
+    return any(word in TIME_WORDS for word in _WORD.findall(text.lower()))
+
+
+class ResponseCache:
+    """
+    Cache of final answers to repeated questions, checked before invoking the model.
+
+    Answers are keyed on the normalized prompt and a hash of the system prompt. The
+    question part of the prompt is reduced to its content words, in order, so that
+    rephrasings differing in stopwords, case or punctuation share an answer ("What is
+    the capital of France?" / "whats the capital of france"), while questions with
+    other content words ("... of Spain") or in another order ("is paris bigger than
+    london" / "is london bigger than paris") do not. Embedding similarity cannot tell
+    those apart from rephrasings, a question swapping one entity embeds almost alike.
+
+    Time-sensitive questions are never cached (`time_sensitive`). Only cache answers
+    that do not depend on the conversation history or on live data.
+
+    @param ttl: Seconds an answer stays valid.
+    @param maxsize: Maximum number of answers.
+    @param path: Optional SQLite file to persist answers on disk.
+    @param chunk_size: Characters per chunk when replaying an answer.
+    """
+
+    def __init__(self, ttl: float = 600,
+                 maxsize: int = 1024,
+                 path: Optional[str] = None,
+                 chunk_size: int = 32) -> None:
+        self.maxsize = maxsize
+        self.chunk_size = chunk_size
+        self.skipped = 0
+        self.latency_saved = 0.0
+        self._answers = TTLCache(maxsize=maxsize, ttl=ttl, path=path)
+
+
+    @staticmethod
+    def system_hash(system_prompt: str) -> str:
+        return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+    def make_key(self, prompt: str, system_prompt: str, question: Optional[str] = None) -> str:
+        """
+        @param prompt: Prompt as built by `Prompts.build`.
+        @param system_prompt: System prompt of the request.
+        @param question: Raw user message inside the prompt, reduced to its content words.
+        @return: Cache key of a prompt under a system prompt.
+        """
+        text = normalize_text(prompt)
+        if question:
+            terms = content_terms(question)
+            question = normalize_text(question)
+            if terms and question in text:
+                text = text.replace(question, " ".join(terms))
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.system_hash(system_prompt)}:{digest}"
+
+
+    def cacheable(self, prompt: str, question: Optional[str] = None) -> bool:
+        """
+        @return: Whether the answer of a prompt may be cached (see `time_sensitive`).
+        """
+        return not time_sensitive(question or prompt)
+
+
+    def lookup(self, prompt: str, system_prompt: str, question: Optional[str] = None) -> Optional[Dict]:
+        """
+        Find the cached answer of a prompt.
+
+        @param prompt: Prompt as built by `Prompts.build`.
+        @param system_prompt: System prompt of the request.
+        @param question: Raw user message inside the prompt (default: the prompt is only normalized).
+        @return: {"text": answer, "latency": seconds it took to generate}, or None.
+        """
+        if not self.cacheable(prompt, question):
+            self.skipped += 1
+            return None
+        answer = self._answers.get(self.make_key(prompt, system_prompt, question))
+        if answer is not None:
+            self.latency_saved += answer.get("latency", 0.0)
+        return answer
+
+
+    def store(self, prompt: str, system_prompt: str, text: str,
+              latency: float = 0.0,
+              question: Optional[str] = None) -> None:
+        """
+        Cache the answer of a prompt, unless it is time-sensitive.
+
+        @param prompt: Prompt as built by `Prompts.build`.
+        @param system_prompt: System prompt of the request.
+        @param text: Final answer text.
+        @param latency: Seconds the model took to produce it, reported as saved on hits.
+        @param question: Raw user message inside the prompt.
+        """
+        if self.cacheable(prompt, question):
+            self._answers.set(self.make_key(prompt, system_prompt, question), {"text": text, "latency": latency})
+
+
+    def replay(self, text: str) -> Iterator[str]:
+        """
+        Split a cached answer into chunks, to stream it like a live response.
+        """
+        for start in range(0, len(text), self.chunk_size):
+            yield text[start:start + self.chunk_size]
+
+
+    def stats(self) -> Dict:
+        """
+        @return: Hit rate, time-sensitive questions skipped and total generation time saved.
+        """
+        stats = self._answers.stats()
+        stats["skipped"] = self.skipped
+        stats["latency_saved"] = round(self.latency_saved, 3)
+        return stats
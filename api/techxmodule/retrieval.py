@@ -0,0 +1,482 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+import threading
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+from techxmodule.embeddings import HashingEmbedder
+from techxmodule.extract import extract_text
+
+
+_PARAGRAPH = re.compile(r"\n\s*\n")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+TEXT_EXTENSIONS = (".txt", ".md", ".rst", ".csv", ".json")
+HTML_EXTENSIONS = (".html", ".htm")
+
+
+def chunk_text(text: str, chunk_chars: int = 1200, overlap: int = 200) -> List[str]:
+    """
+    Split a text into chunks of about `chunk_chars` characters.
+
+    Paragraphs are packed together while they fit; longer paragraphs are split on
+    sentence boundaries, and a sentence longer than a chunk is cut hard. Consecutive
+    chunks share up to `overlap` trailing characters, so a fact on a boundary stays
+    retrievable.
+
+    @param text: input text
+    @param chunk_chars: Target size of a chunk.
+    @param overlap: Characters repeated from the end of the previous chunk.
+    @return: List of chunks.
+    """
+    pieces = []
+    for paragraph in _PARAGRAPH.split(text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if len(paragraph) <= chunk_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE.split(paragraph):
+            while len(sentence) > chunk_chars:
+                pieces.append(sentence[:chunk_chars])
+                sentence = sentence[chunk_chars:]
+            if sentence:
+                pieces.append(sentence)
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > chunk_chars:
+            chunks.append(current)
+            tail = current[-overlap:] if overlap else ""
+            # Start the overlap on a word boundary
+            current = tail[tail.find(" ") + 1:] if " " in tail else ""
+        current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _matches(metadata: Dict, where: Union[Dict, Callable[[Dict], bool], None]) -> bool:
+    """
+    Test chunk metadata against a filter: a callable, or a dict of required values
+    where a list or tuple value means "any of".
+    """
+    if where is None:
+        return True
+    if callable(where):
+        return where(metadata)
+    for key, expected in where.items():
+        value = metadata.get(key)
+        if isinstance(expected, (list, tuple, set, frozenset)):
+            if value not in expected:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+class _RecordFile:
+    """
+    Read-only list of the records of a saved index, parsed on access.
+    The file is memory-mapped and only the line offsets are kept in memory, so opening
+    a large index stays fast and its records page in on demand.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        ends = np.flatnonzero(np.frombuffer(self._data, dtype=np.uint8) == ord("\n"))
+        self._starts = np.concatenate(([0], ends[:-1] + 1)) if len(ends) else np.zeros(0, np.int64)
+        self._ends = ends
+
+
+    def __len__(self) -> int:
+        return len(self._ends)
+
+
+    def __getitem__(self, row: int) -> Dict:
+        return json.loads(self._data[self._starts[row]:self._ends[row]])
+
+
+    def __iter__(self) -> Iterator[Dict]:
+        for row in range(len(self)):
+            yield self[row]
+
+
+class VectorIndex:
+    """
+    Vector index of unit-normalized embeddings with their chunk records.
+
+    Vectors saved with `save` are memory-mapped by `load`, so even a large index opens
+    instantly and pages in on demand. Vectors added afterwards go to an in-memory
+    delta searched exhaustively, until the next `save` merges them. Removed chunks are
+    tombstoned and dropped on save.
+
+    Search is either exact (brute-force matrix product) or approximate with an IVF
+    index: the base vectors are clustered with k-means and only the `nprobe` lists
+    closest to the query are scored.
+
+    @param dim: Number of dimensions.
+    """
+
+    # "auto" search stays exact below this size, where a full scan is cheap and exact
+    ANN_MIN_VECTORS = 50_000
+    VECTORS_FILE = "vectors.npy"
+    RECORDS_FILE = "records.jsonl"
+    IVF_FILE = "ivf.npz"
+    META_FILE = "index.json"
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+        self.base = np.zeros((0, dim), dtype=np.float32)
+        self.records: List[Dict] = []
+        self.deleted: set = set()
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[np.ndarray] = []
+        self._delta: List[np.ndarray] = []
+        self._delta_matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+
+    def __len__(self) -> int:
+        return len(self.records) - len(self.deleted)
+
+
+    def add(self, vectors: np.ndarray, records: List[Dict]) -> None:
+        """
+        Add vectors with their records ({"text", "source", "metadata"}).
+
+        @param vectors: float32 matrix of shape (len(records), dim), rows of unit norm.
+        @param records: One record per vector.
+        """
+        if len(vectors) != len(records):
+            raise ValueError("One record is needed per vector.")
+        with self._lock:
+            if isinstance(self.records, _RecordFile):
+                self.records = list(self.records)
+            self._delta.extend(np.asarray(vectors, dtype=np.float32))
+            self._delta_matrix = None
+            self.records.extend(records)
+
+
+    def remove(self, where: Union[Dict, Callable[[Dict], bool]]) -> int:
+        """
+        Tombstone the chunks whose record matches a filter, e.g. {"source": path}.
+
+        @param where: Filter on the record fields.
+        @return: Number of chunks removed.
+        """
+        with self._lock:
+            removed = [row for row, record in enumerate(self.records)
+                       if row not in self.deleted and _matches(record, where)]
+            self.deleted.update(removed)
+        return len(removed)
+
+
+    def build_ivf(self, nlist: Optional[int] = None, iterations: int = 10, seed: int = 0) -> None:
+        """
+        Cluster the base vectors (spherical k-means) for approximate search.
+
+        @param nlist: Number of clusters (default: about sqrt of the number of vectors).
+        @param iterations: k-means iterations.
+        @param seed: Random seed of the initialization.
+        """
+        count = len(self.base)
+        if count == 0:
+            self.centroids, self.lists = None, []
+            return
+        nlist = max(1, min(nlist or int(np.sqrt(count)), count))
+        rng = np.random.default_rng(seed)
+        sample_size = min(count, nlist * 64)
+        sample = np.asarray(self.base[np.sort(rng.choice(count, sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            sums[empty] = centroids[empty]
+            norms[empty] = 1.0
+            centroids = sums / norms
+
+        assignment = np.empty(count, dtype=np.int32)
+        for start in range(0, count, 65536):
+            block = np.asarray(self.base[start:start + 65536])
+            assignment[start:start + 65536] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        bounds = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        self.centroids = centroids.astype(np.float32)
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+
+
+    def search(self, query: np.ndarray, k: int = 5,
+               where: Union[Dict, Callable[[Dict], bool], None] = None,
+               mode: str = "auto",
+               nprobe: int = 16) -> List[tuple]:
+        """
+        Find the chunks most similar to a query vector.
+
+        @param query: Unit vector of shape (dim,).
+        @param k: Number of results.
+        @param where: Optional metadata filter, a dict of required values (a list value
+                      means "any of") or a callable taking the metadata.
+        @param mode: "exact", "ann" (requires `build_ivf`) or "auto" (ann when built
+                     and the index holds at least ANN_MIN_VECTORS vectors).
+        @param nprobe: Number of IVF lists scored in ann mode.
+        @return: List of (score, record), best first.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            if self._delta_matrix is None:
+                self._delta_matrix = np.stack(self._delta) if self._delta else np.zeros((0, self.dim), np.float32)
+            delta = self._delta_matrix
+        base_count = len(self.base)
+        use_ann = mode == "ann" or (mode == "auto" and self.centroids is not None
+                                    and base_count >= self.ANN_MIN_VECTORS)
+        if use_ann and self.centroids is None:
+            raise ValueError("No IVF index, call build_ivf() first.")
+
+        if use_ann:
+            probes = np.argsort(-(self.centroids @ query))[:nprobe]
+            rows = np.concatenate([self.lists[probe] for probe in probes] + [np.zeros(0, np.int64)])
+            scores = np.asarray(self.base[np.sort(rows)] @ query) if len(rows) else np.zeros(0, np.float32)
+            rows = np.sort(rows)
+        else:
+            rows = np.arange(base_count)
+            scores = np.asarray(self.base @ query) if base_count else np.zeros(0, np.float32)
+        if len(delta):
+            rows = np.concatenate((rows, np.arange(base_count, base_count + len(delta))))
+            scores = np.concatenate((scores, delta @ query))
+
+        results = []
+        # Take candidates best first, widening the window until k pass the filters
+        window = k if where is None and not self.deleted else 4 * k
+        while True:
+            top = np.argpartition(-scores, min(window, len(scores)) - 1)[:window] if len(scores) > window \
+                else np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for position in top:
+                row = int(rows[position])
+                if row in self.deleted:
+                    continue
+                record = self.records[row]
+                if not _matches(record.get("metadata", {}), where):
+                    continue
+                results.append((float(scores[position]), record))
+                if len(results) == k:
+                    return results
+            if window >= len(scores):
+                return results
+            window *= 4
+
+
+    def save(self, path: str, build_ivf: bool = True, **meta) -> None:
+        """
+        Write the index to a directory, merging the delta and dropping removed chunks.
+
+        @param path: Directory of the index.
+        @param build_ivf: Rebuild the IVF index of the merged vectors.
+        @param meta: Extra information stored in index.json (e.g. the embedder name).
+        """
+        with self._lock:
+            keep = [row for row in range(len(self.records)) if row not in self.deleted]
+            merged = np.concatenate([np.asarray(self.base)] + ([np.stack(self._delta)] if self._delta else []))
+            self.base = np.ascontiguousarray(merged[keep]) if len(merged) else merged
+            self.records = [self.records[row] for row in keep]
+            self.deleted, self._delta, self._delta_matrix = set(), [], None
+
+        os.makedirs(path, exist_ok=True)
+        if build_ivf:
+            self.build_ivf()
+        # Files are replaced, not rewritten in place: a loaded index may still map the old ones
+        vectors_path = os.path.join(path, self.VECTORS_FILE)
+        with open(vectors_path + ".tmp", "wb") as file:
+            np.save(file, self.base)
+        os.replace(vectors_path + ".tmp", vectors_path)
+        records_path = os.path.join(path, self.RECORDS_FILE)
+        with open(records_path + ".tmp", "w", encoding="utf-8") as file:
+            for record in self.records:
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(records_path + ".tmp", records_path)
+        if self.centroids is not None:
+            np.savez(os.path.join(path, self.IVF_FILE),
+                     centroids=self.centroids,
+                     rows=np.concatenate(self.lists),
+                     sizes=np.array([len(rows) for rows in self.lists]))
+        elif os.path.exists(os.path.join(path, self.IVF_FILE)):
+            os.remove(os.path.join(path, self.IVF_FILE))
+        with open(os.path.join(path, self.META_FILE), "w", encoding="utf-8") as file:
+            json.dump({"dim": self.dim, "count": len(self.records), **meta}, file)
+
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "VectorIndex":
+        """
+        Open an index written by `save`.
+
+        @param path: Directory of the index.
+        @param mmap: Memory-map the vectors instead of reading them.
+        @return: The index.
+        """
+        with open(os.path.join(path, cls.META_FILE), encoding="utf-8") as file:
+            meta = json.load(file)
+        index = cls(meta["dim"])
+        index.meta = meta
+        index.base = np.load(os.path.join(path, cls.VECTORS_FILE), mmap_mode="r" if mmap else None)
+        index.records = _RecordFile(os.path.join(path, cls.RECORDS_FILE))
+        ivf_path = os.path.join(path, cls.IVF_FILE)
+        if os.path.exists(ivf_path):
+            ivf = np.load(ivf_path)
+            index.centroids = ivf["centroids"]
+            index.lists = np.split(ivf["rows"], np.cumsum(ivf["sizes"])[:-1])
+        return index
+
+
+class KnowledgeBase:
+    """
+    Local knowledge base: ingests files into a `VectorIndex` and answers queries in the
+    Bedrock Knowledge Bases `retrieve` format, which `Claude` turns into <documents> context.
+
+    Ingestion is incremental: a file whose content hash did not change is skipped, a
+    changed file replaces its old chunks.
+
+    @param path: Directory of the persisted index (None keeps it in memory only).
+    @param embedder: Object with `embed`/`embed_many` and `dim` (default: HashingEmbedder).
+    @param chunk_chars: Target chunk size, see `chunk_text`.
+    @param overlap: Characters shared by consecutive chunks.
+    @param min_relevance: Minimum score of a useful result, reported with every retrieval
+                          (default: the one saved with the index, else the embedder's).
+    """
+
+    def __init__(self, path: Optional[str] = None,
+                 embedder: Any = None,
+                 chunk_chars: int = 1200,
+                 overlap: int = 200,
+                 min_relevance: Optional[float] = None) -> None:
+        self.path = path
+        self.embedder = embedder or HashingEmbedder()
+        self.chunk_chars = chunk_chars
+        self.overlap = overlap
+        embedder_name = type(self.embedder).__name__
+        if path and os.path.exists(os.path.join(path, VectorIndex.META_FILE)):
+            self.index = VectorIndex.load(path)
+            if self.index.dim != self.embedder.dim or self.index.meta.get("embedder") != embedder_name:
+                raise ValueError(f"Index at {path} was built with {self.index.meta.get('embedder')} "
+                                 f"({self.index.dim} dims), not {embedder_name} ({self.embedder.dim} dims).")
+            self.hashes = dict(self.index.meta.get("hashes", {}))
+        else:
+            self.index = VectorIndex(self.embedder.dim)
+            self.hashes: Dict[str, str] = {}
+        if min_relevance is None:
+            min_relevance = getattr(self.index, "meta", {}).get("min_relevance",
+                                                                getattr(self.embedder, "min_relevance", 0.0))
+        self.min_relevance = min_relevance
+
+
+    def ingest_text(self, text: str, source: str, metadata: Optional[Dict] = None) -> int:
+        """
+        Chunk, embed and index a text, replacing the previous chunks of the same source.
+
+        @param text: Document text.
+        @param source: URI of the document, reported as its location.
+        @param metadata: Metadata attached to every chunk, usable in filters.
+        @return: Number of chunks indexed, 0 if the content did not change.
+        """
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if self.hashes.get(source) == digest:
+            return 0
+        self.index.remove({"source": source})
+        chunks = chunk_text(text, self.chunk_chars, self.overlap)
+        metadata = {**(metadata or {}), "source": source}
+        records = [{"text": chunk, "source": source, "metadata": {**metadata, "chunk": position}}
+                   for position, chunk in enumerate(chunks)]
+        if records:
+            self.index.add(self.embedder.embed_many(chunks), records)
+        self.hashes[source] = digest
+        return len(records)
+
+
+    def ingest_path(self, path: str, metadata: Optional[Dict] = None) -> int:
+        """
+        Ingest a file, or every text / HTML file under a directory.
+
+        @param path: File or directory.
+        @param metadata: Metadata attached to every chunk (the file extension is added as "type").
+        @return: Number of chunks indexed.
+        """
+        count = 0
+        for file_path in self._walk(path):
+            with open(file_path, encoding="utf-8", errors="replace") as file:
+                content = file.read()
+            extension = os.path.splitext(file_path)[1].lower()
+            if extension in HTML_EXTENSIONS:
+                content = extract_text(content, max_chars=len(content))
+            count += self.ingest_text(content, "file://" + os.path.abspath(file_path),
+                                      {**(metadata or {}), "type": extension.lstrip(".")})
+        return count
+
+
+    def save(self) -> None:
+        """
+        Persist the index to `path`, merging the incremental updates.
+        """
+        if not self.path:
+            raise ValueError("This knowledge base has no path.")
+        self.index.save(self.path, embedder=type(self.embedder).__name__, hashes=self.hashes,
+                        min_relevance=self.min_relevance)
+
+
+    def retrieve(self, query: str, max_results: int = 5,
+                 where: Union[Dict, Callable[[Dict], bool], None] = None,
+                 mode: str = "auto") -> Dict:
+        """
+        Search the knowledge base.
+
+        @param query: Question or keywords.
+        @param max_results: Number of chunks returned.
+        @param where: Optional metadata filter, see `VectorIndex.search`.
+        @param mode: "exact", "ann" or "auto".
+        @return: {"ResponseMetadata": {...}, "retrievalResults": [{"content": {"text"},
+                  "location": {...}, "score", "metadata"}], "minRelevance"}, best first.
+                  Scores depend on the embedder, "minRelevance" is the matching cut-off.
+        """
+        results = self.index.search(self.embedder.embed(query), max_results, where=where, mode=mode)
+        return {
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+            "minRelevance": self.min_relevance,
+            "retrievalResults": [{
+                "content": {"text": record["text"]},
+                "location": {"type": "CUSTOM", "customDocumentLocation": {"uri": record["source"]}},
+                "score": score,
+                "metadata": record.get("metadata", {}),
+            } for score, record in results]
+        }
+
+
+    @staticmethod
+    def _walk(path: str) -> Iterator[str]:
+        if os.path.isfile(path):
+            yield path
+            return
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.lower().endswith(TEXT_EXTENSIONS + HTML_EXTENSIONS):
+                    yield os.path.join(root, name)
+
+
+if __name__ == "__main__":
+    # Build or update a knowledge base: python -m techxmodule.retrieval ingest <file or dir> <index dir>
+    if len(sys.argv) != 4 or sys.argv[1] != "ingest":
+        sys.exit("usage: python -m techxmodule.retrieval ingest <file or dir> <index dir>")
+    knowledge_base = KnowledgeBase(sys.argv[3])
+    print(f"Indexed {knowledge_base.ingest_path(sys.argv[2])} new chunks")
+    knowledge_base.save()
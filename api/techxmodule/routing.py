@@ -0,0 +1,306 @@
+import random
+import threading
+import time
+
+from typing import Any, Dict, List, Optional
+
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, ReadTimeoutError
+
+from techxmodule import clients
+from techxmodule.streaming import TrackedStream
+
+
+# Errors worth retrying on another region or model
+RETRYABLE_CODES = frozenset({
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ServiceQuotaExceededException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+    "InternalServerException",
+})
+THROTTLING_CODES = frozenset({"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException"})
+
+
+def error_code(error: Exception) -> Optional[str]:
+    """
+    @return: The AWS error code of a botocore ClientError, None for other errors.
+             Errors raised inside an event stream ("throttlingException") are
+             reported with the code of the matching API error ("ThrottlingException").
+    """
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code")
+        return code[:1].upper() + code[1:] if code else code
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    @return: Whether the request may succeed on another endpoint.
+    """
+    return error_code(error) in RETRYABLE_CODES or isinstance(error, (BotoConnectionError, ReadTimeoutError))
+
+
+class CircuitBreaker:
+    """
+    Stops sending traffic to an endpoint after repeated failures.
+
+    After `failure_threshold` consecutive failures the breaker opens for `cooldown`
+    seconds. Then a single trial request is let through (half-open): success closes
+    the breaker, failure opens it again, and a trial ending without a verdict
+    (`abandon`) lets the next request try instead.
+
+    @param failure_threshold: Consecutive failures that open the breaker.
+    @param cooldown: Seconds the breaker stays open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30) -> None:
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+
+    def available(self) -> bool:
+        """
+        @return: Whether `allow` would let a request through now, without changing the state.
+        """
+        with self._lock:
+            return self.state == self.CLOSED or \
+                (self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown)
+
+
+    def allow(self) -> bool:
+        """
+        Claim the right to send a request, the half-open trial when the cooldown is over.
+        Every allowed request must end with `record_success`, `record_failure` or `abandon`.
+
+        @return: Whether a request may be sent now.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+    def abandon(self) -> None:
+        """
+        End a request that says nothing about the endpoint's health (e.g. an invalid
+        request). A half-open trial goes back to open with its cooldown already over.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+
+class Endpoint:
+    """
+    One region / model target of the router.
+
+    @param region: AWS region name.
+    @param model_id: Model or inference profile ID. None uses the model requested by the caller.
+    @param weight: Relative share of traffic within the tier.
+    @param tier: Failover order, tier 0 is used first, higher tiers (e.g. smaller models)
+                 only when every endpoint of the lower tiers is unavailable.
+    @param session: boto3 Session used for this endpoint (default: the router session).
+    @param breaker: Circuit breaker of the endpoint (default: a new CircuitBreaker).
+    """
+
+    def __init__(self, region: str,
+                 model_id: Optional[str] = None,
+                 weight: float = 1.0,
+                 tier: int = 0,
+                 session: Any = None,
+                 breaker: Optional[CircuitBreaker] = None) -> None:
+        self.region = region
+        self.model_id = model_id
+        self.weight = weight
+        self.tier = tier
+        self.session = session
+        self.breaker = breaker or CircuitBreaker()
+        self.outstanding = 0
+        self.runtime = None
+
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.region!r}, {self.model_id!r}, tier={self.tier}, outstanding={self.outstanding})"
+
+
+class BedrockRouter:
+    """
+    Spreads Bedrock invocations across regions and models, with failover.
+
+    Within the lowest available tier, the endpoint with the fewest outstanding
+    requests per unit of weight is chosen (ties broken at random by weight).
+    Retryable errors, throttling above all, count against the endpoint's circuit
+    breaker and the request is retried on the next best endpoint, falling back to
+    higher tiers when a whole tier is unavailable. A stream is judged when it ends,
+    so an error in the middle of a stream counts too (it is not retried).
+
+    @param endpoints: Endpoints to route to.
+    @param session: Default boto3 Session for endpoints without their own.
+    @param client_config: botocore options for the endpoint clients. Retries are kept
+                          low by default, failing over is faster than retrying in place.
+    """
+
+    def __init__(self, endpoints: List[Endpoint],
+                 session: Any = None,
+                 client_config: Optional[Dict] = None) -> None:
+        if not endpoints:
+            raise ValueError("The router needs at least one endpoint.")
+        self.endpoints = endpoints
+        self.session = session
+        self.client_config = client_config or {"retries": {"mode": "adaptive", "max_attempts": 2}}
+        self.throttle_listeners: List = []
+        self._lock = threading.Lock()
+
+
+    def invoke(self, modelId: str, invoke_kwargs: Dict, streaming: bool) -> Dict:
+        """
+        Invoke the model on the best available endpoint.
+
+        @param modelId: Model requested by the caller.
+        @param invoke_kwargs: Arguments of invoke_model without modelId.
+        @param streaming: Whether to use invoke_model_with_response_stream.
+        @return: The Bedrock response.
+        @raises: The last error when every endpoint failed or is unavailable.
+        """
+        tried = set()
+        last_error: Optional[Exception] = None
+        while True:
+            endpoint = self.select(exclude=tried)
+            if endpoint is None:
+                if last_error is not None:
+                    raise last_error
+                raise RuntimeError("No Bedrock endpoint available, every circuit breaker is open.")
+            tried.add(id(endpoint))
+            try:
+                return self._invoke_endpoint(endpoint, modelId, invoke_kwargs, streaming)
+            except Exception as e:
+                self._record_outcome(endpoint, e)
+                if not is_retryable(e):
+                    raise
+                last_error = e
+            except BaseException:
+                endpoint.breaker.abandon()
+                raise
+
+
+    def select(self, exclude: set = frozenset()) -> Optional[Endpoint]:
+        """
+        Choose the endpoint for the next request.
+
+        Breakers are only checked while comparing endpoints; the chosen one is then
+        claimed with `allow`, which the caller must settle (see `_record_outcome`).
+
+        @param exclude: ids of endpoints already tried for this request.
+        @return: The chosen endpoint, or None if none is available.
+        """
+        candidates = [endpoint for endpoint in self.endpoints if id(endpoint) not in exclude]
+        for tier in sorted({endpoint.tier for endpoint in candidates}):
+            while True:
+                available = [endpoint for endpoint in candidates
+                             if endpoint.tier == tier and endpoint.breaker.available()]
+                if not available:
+                    break
+                with self._lock:
+                    load = min(endpoint.outstanding / endpoint.weight for endpoint in available)
+                    least_loaded = [endpoint for endpoint in available
+                                    if endpoint.outstanding / endpoint.weight == load]
+                endpoint = random.choices(least_loaded, weights=[endpoint.weight for endpoint in least_loaded])[0]
+                if endpoint.breaker.allow():
+                    return endpoint
+                # Another request took the half-open trial in the meantime
+                candidates.remove(endpoint)
+        return None
+
+
+    def _record_outcome(self, endpoint: Endpoint, error: Optional[Exception]) -> None:
+        """
+        Settle the breaker claimed by `select`: success, failure for retryable errors,
+        abandon for errors unrelated to the endpoint's health.
+        """
+        if error is None:
+            endpoint.breaker.record_success()
+        elif is_retryable(error):
+            endpoint.breaker.record_failure()
+            if error_code(error) in THROTTLING_CODES:
+                for listener in self.throttle_listeners:
+                    listener(endpoint)
+        else:
+            endpoint.breaker.abandon()
+
+
+    def _invoke_endpoint(self, endpoint: Endpoint, modelId: str, invoke_kwargs: Dict, streaming: bool) -> Dict:
+        if endpoint.runtime is None:
+            endpoint.runtime = clients.get_runtime_client(endpoint.session or self.session,
+                                                          endpoint.region,
+                                                          **self.client_config)
+        kwargs = {**invoke_kwargs, "modelId": endpoint.model_id or modelId}
+
+        with self._lock:
+            endpoint.outstanding += 1
+        released = False
+
+        def release():
+            nonlocal released
+            with self._lock:
+                if released:
+                    return False
+                released = True
+                endpoint.outstanding -= 1
+                return True
+
+        def finish(error):
+            if release():
+                self._record_outcome(endpoint, error)
+
+        try:
+            if streaming:
+                response = endpoint.runtime.invoke_model_with_response_stream(**kwargs)
+                response["body"] = TrackedStream(response["body"], finish)
+                return response
+            response = endpoint.runtime.invoke_model(**kwargs)
+        except BaseException:
+            # The caller settles the breaker, depending on the error
+            release()
+            raise
+        finish(None)
+        return response
+
+
+    def stats(self) -> List[Dict]:
+        """
+        @return: State of every endpoint (region, model, tier, outstanding, breaker).
+        """
+        return [{
+            "region": endpoint.region,
+            "model_id": endpoint.model_id,
+            "tier": endpoint.tier,
+            "outstanding": endpoint.outstanding,
+            "breaker": endpoint.breaker.state,
+        } for endpoint in self.endpoints]
@@ -0,0 +1,268 @@
+import ast
+import builtins
+import importlib.util
+import inspect
+import re
+import types
+import typing
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+_PARAM_DOC = re.compile(r"^\s*@param\s+(\w+)\s*:\s*(.*)$")
+_JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    tuple: "array",
+    dict: "object",
+}
+_PYTHON_TYPES = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "array": (list, tuple),
+    "object": (dict,),
+}
+
+
+def parse_docstring(doc: Optional[str]) -> Tuple[str, Dict[str, str]]:
+    """
+    Split a docstring into its description and its `@param` descriptions.
+    Continuation lines of a `@param` are joined to it, other `@` tags end it.
+
+    @param doc: Docstring of a function.
+    @return: (description, {parameter name: description}).
+    """
+    description, params = [], {}
+    current = None
+    for line in inspect.cleandoc(doc or "").splitlines():
+        match = _PARAM_DOC.match(line)
+        if match:
+            current = match.group(1)
+            params[current] = match.group(2).strip()
+        elif line.strip().startswith("@"):
+            current = None
+        elif current is not None and line.strip():
+            params[current] += " " + line.strip()
+        elif current is None:
+            description.append(line.strip())
+    return " ".join(part for part in description if part), params
+
+
+def json_type(annotation: Any) -> Tuple[Dict, bool]:
+    """
+    Map a type hint to a JSON schema.
+
+    @param annotation: Type hint, e.g. `str`, `int | None` or `List[str]`.
+    @return: (schema, whether None is allowed).
+    """
+    if annotation is inspect.Parameter.empty or annotation is Any:
+        return {}, False
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union or origin is types.UnionType:
+        members = [member for member in typing.get_args(annotation) if member is not type(None)]
+        nullable = len(members) < len(typing.get_args(annotation))
+        schema, _ = json_type(members[0]) if len(members) == 1 else ({}, False)
+        return schema, nullable
+    if origin is typing.Literal:
+        values = list(typing.get_args(annotation))
+        schema, _ = json_type(type(values[0]))
+        return {**schema, "enum": values}, False
+    if origin in (list, tuple):
+        schema = {"type": "array"}
+        arguments = typing.get_args(annotation)
+        if arguments and arguments[0] is not Ellipsis:
+            items, _ = json_type(arguments[0])
+            if items:
+                schema["items"] = items
+        return schema, False
+    if origin is dict:
+        return {"type": "object"}, False
+    if annotation in _JSON_TYPES:
+        return {"type": _JSON_TYPES[annotation]}, False
+    return {}, False
+
+
+def function_schema(func: Callable,
+                    name: Optional[str] = None,
+                    description: Optional[str] = None) -> Dict:
+    """
+    Generate the tool definition of a function from its signature, type hints and docstring.
+
+    Parameters without a default are required; parameters defaulting to None are optional.
+    Parameter descriptions come from the `@param name: ...` lines of the docstring.
+
+    @param func: The tool function.
+    @param name: Tool name (default: the function name).
+    @param description: Tool description (default: the docstring text before the tags).
+    @return: {"name", "description", "input_schema"} in the format of the Claude tools API.
+    """
+    try:
+        hints = typing.get_type_hints(func)
+    except Exception:
+        hints = {}
+    return signature_schema(name or func.__name__, inspect.signature(func), func.__doc__, hints, description)
+
+
+def signature_schema(name: str,
+                     signature: inspect.Signature,
+                     doc: Optional[str],
+                     hints: Optional[Dict[str, Any]] = None,
+                     description: Optional[str] = None) -> Dict:
+    """
+    Generate a tool definition from a signature and a docstring, see `function_schema`.
+
+    @param name: Tool name.
+    @param signature: Signature of the tool function.
+    @param doc: Docstring of the tool function.
+    @param hints: Resolved type hints by parameter name (default: the signature annotations).
+    @param description: Tool description (default: the docstring text before the tags).
+    @return: {"name", "description", "input_schema"} in the format of the Claude tools API.
+    """
+    doc_description, param_docs = parse_docstring(doc)
+    hints = hints or {}
+
+    properties, required = {}, []
+    for parameter in signature.parameters.values():
+        if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+            continue
+        schema, _ = json_type(hints.get(parameter.name, parameter.annotation))
+        schema = dict(schema)
+        if parameter.name in param_docs:
+            schema["description"] = param_docs[parameter.name]
+        if parameter.default is parameter.empty:
+            required.append(parameter.name)
+        elif parameter.default is not None:
+            schema["default"] = parameter.default
+        properties[parameter.name] = schema
+
+    return {
+        "name": name,
+        "description": description or doc_description or name,
+        "input_schema": {
+            "type": "object",
+            "properties": properties,
+            "required": required,
+        },
+    }
+
+
+def declared_schemas(module_name: str) -> Dict[str, Dict]:
+    """
+    Generate the tool definitions of a module from its source, without importing it.
+
+    Functions decorated with a `<...>.tool(...)` call (see `core.Tools.tool`) are read
+    with `ast`: annotations are evaluated against the builtins and `typing` names only,
+    and a constant `description=` argument is honored. Functions with a default that is
+    not a literal are left out, their definition needs the imported function.
+
+    @param module_name: Importable module name, e.g. "tools".
+    @return: {tool name: definition}, the same as the `schema` of the imported tools.
+    """
+    spec = importlib.util.find_spec(module_name)
+    if spec is None or not spec.origin or not spec.origin.endswith(".py"):
+        return {}
+    with open(spec.origin, "rb") as source:
+        tree = ast.parse(source.read(), spec.origin)
+    namespace = {"__builtins__": builtins, **{name: getattr(typing, name) for name in typing.__all__}}
+
+    schemas = {}
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        decorator = next((decorator for decorator in node.decorator_list
+                          if isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Attribute)
+                          and decorator.func.attr == "tool"), None)
+        if decorator is None:
+            continue
+        try:
+            signature = _ast_signature(node.args, namespace)
+        except ValueError:
+            continue
+        description = next((keyword.value.value for keyword in decorator.keywords
+                            if keyword.arg == "description" and isinstance(keyword.value, ast.Constant)), None)
+        schemas[node.name] = signature_schema(node.name, signature, ast.get_docstring(node, clean=False),
+                                              description=description)
+    return schemas
+
+
+def _ast_signature(arguments: ast.arguments, namespace: Dict) -> inspect.Signature:
+    """
+    Rebuild a signature from its syntax tree.
+
+    @raises ValueError: If a default value is not a literal.
+    """
+    def annotation(node):
+        if node is None:
+            return inspect.Parameter.empty
+        try:
+            return eval(compile(ast.Expression(node), "<annotation>", "eval"), namespace)
+        except Exception:
+            return inspect.Parameter.empty
+
+    positional = arguments.posonlyargs + arguments.args
+    defaults = [inspect.Parameter.empty] * (len(positional) - len(arguments.defaults)) + arguments.defaults
+    kinds = [inspect.Parameter.POSITIONAL_ONLY] * len(arguments.posonlyargs) \
+        + [inspect.Parameter.POSITIONAL_OR_KEYWORD] * len(arguments.args)
+    declared = list(zip(positional, defaults, kinds))
+    if arguments.vararg:
+        declared.append((arguments.vararg, inspect.Parameter.empty, inspect.Parameter.VAR_POSITIONAL))
+    declared += [(argument, default or inspect.Parameter.empty, inspect.Parameter.KEYWORD_ONLY)
+                 for argument, default in zip(arguments.kwonlyargs, arguments.kw_defaults)]
+    if arguments.kwarg:
+        declared.append((arguments.kwarg, inspect.Parameter.empty, inspect.Parameter.VAR_KEYWORD))
+
+    parameters = []
+    for argument, default, kind in declared:
+        if default is not inspect.Parameter.empty:
+            default = ast.literal_eval(default)
+        parameters.append(inspect.Parameter(argument.arg, kind, default=default,
+                                            annotation=annotation(argument.annotation)))
+    return inspect.Signature(parameters)
+
+
+def compile_validator(input_schema: Dict) -> Callable[[Dict], Optional[str]]:
+    """
+    Build a fast validator for tool inputs from a JSON schema.
+
+    Checks are precomputed once: required names, allowed names, and the Python types
+    accepted for every property (None is accepted for optional properties).
+
+    @param input_schema: The "input_schema" of a tool definition.
+    @return: Function taking the input dictionary and returning an error message, or None if valid.
+    """
+    properties = input_schema.get("properties", {})
+    required = tuple(input_schema.get("required", ()))
+    checks: List[Tuple[str, tuple, Optional[List], bool]] = []
+    for name, schema in properties.items():
+        accepted = _PYTHON_TYPES.get(schema.get("type"))
+        checks.append((name, accepted, schema.get("enum"), name in required))
+    allowed = frozenset(properties)
+
+    def validate(arguments: Dict) -> Optional[str]:
+        if not isinstance(arguments, dict):
+            return f"input must be an object, got {type(arguments).__name__}"
+        missing = [name for name in required if name not in arguments]
+        if missing:
+            return f"missing required parameter(s): {', '.join(missing)}"
+        unknown = [name for name in arguments if name not in allowed]
+        if unknown:
+            return f"unknown parameter(s): {', '.join(unknown)}; expected: {', '.join(properties)}"
+        for name, accepted, enum, is_required in checks:
+            if name not in arguments:
+                continue
+            value = arguments[name]
+            if value is None and not is_required:
+                continue
+            if accepted is not None and (not isinstance(value, accepted)
+                                         or (isinstance(value, bool) and bool not in accepted)):
+                return f"parameter '{name}' must be of type {properties[name]['type']}, got {type(value).__name__}"
+            if enum is not None and value not in enum:
+                return f"parameter '{name}' must be one of {enum}"
+        return None
+
+    return validate
@@ -0,0 +1,109 @@
+import json
+import uuid
+
+from typing import Any, Dict, List
+
+try:
+    import orjson
+except ImportError:  # optional faster JSON backend
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """
+    Serialize objects exposing `__json__`, such as image references and messages.
+    """
+    if hasattr(obj, "__json__"):
+        return obj.__json__()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serialize an object to compact JSON bytes, with orjson when it is installed.
+    Objects with a `__json__` method (e.g. `images.ImageRef`) are materialized here.
+
+    @param obj: JSON-compatible object.
+    @return: UTF-8 encoded JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default).encode("utf-8")
+
+
+# Marks where a lazily materialized object sits inside cached message bytes
+_PLACEHOLDER = "__json_ref_" + uuid.uuid4().hex + "__"
+_QUOTED_PLACEHOLDER = b'"' + _PLACEHOLDER.encode("ascii") + b'"'
+
+
+def dumps_fragments(obj: Any) -> List:
+    """
+    Serialize an object, leaving objects with `__json__` unmaterialized.
+
+    @param obj: JSON-compatible object, possibly holding e.g. image references.
+    @return: Alternating list [bytes, ref, bytes, ref, ..., bytes].
+    """
+    refs = []
+
+    def placeholder(value: Any) -> Any:
+        if hasattr(value, "__json__"):
+            refs.append(value)
+            return _PLACEHOLDER
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    if orjson is not None:
+        encoded = orjson.dumps(obj, default=placeholder)
+    else:
+        encoded = json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=placeholder).encode("utf-8")
+    if not refs:
+        return [encoded]
+
+    fragments = []
+    for part, ref in zip(encoded.split(_QUOTED_PLACEHOLDER), refs + [None]):
+        fragments.append(part)
+        if ref is not None:
+            fragments.append(ref)
+    return fragments
+
+
+def join_fragments(fragments: List) -> bytes:
+    """
+    Materialize the references of `dumps_fragments` output into JSON bytes.
+    References exposing `encode_json` (`images.ImageRef`) return cached bytes,
+    so an image is not encoded again on every payload.
+
+    @param fragments: Alternating list [bytes, ref, bytes, ..., bytes].
+    @return: UTF-8 encoded JSON.
+    """
+    if len(fragments) == 1:
+        return fragments[0]
+    return b"".join([
+        fragment if type(fragment) is bytes
+        else fragment.encode_json() if hasattr(fragment, "encode_json")
+        else dumps(fragment.__json__())
+        for fragment in fragments
+    ])
+
+
+def encode_payload(payload: Dict) -> bytes:
+    """
+    Serialize a request payload, reusing the cached bytes of past messages.
+
+    Messages exposing `encode_json` (`messages.Message`) return their cached
+    serialization, so only the small request envelope and the messages not seen
+    before are encoded; plain dictionaries are encoded every time.
+
+    @param payload: Request body dictionary, optionally holding a "messages" list.
+    @return: UTF-8 encoded JSON body.
+    """
+    messages = payload.get("messages")
+    if not messages:
+        return dumps(payload)
+
+    envelope = dumps({key: value for key, value in payload.items() if key != "messages"})
+    history = b",".join([
+        message.encode_json() if hasattr(message, "encode_json") else dumps(message)
+        for message in messages
+    ])
+    separator = b"," if len(envelope) > 2 else b""
+    return b"".join((envelope[:-1], separator, b'"messages":[', history, b"]}"))
@@ -0,0 +1,274 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from techxmodule.messages import ChatMessage
+from techxmodule.serialization import dumps
+
+
+class Turn:
+    """
+    Exclusive use of one conversation by a request, see `SessionStore.begin_turn`.
+    Releasing twice is harmless.
+    """
+    __slots__ = ("_store", "_session_id", "_entry", "_released")
+
+    def __init__(self, store: "SessionStore", session_id: str, entry: List) -> None:
+        self._store = store
+        self._session_id = session_id
+        self._entry = entry
+        self._released = False
+
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._entry[0].release()
+            self._store._leave_turn(self._session_id, self._entry)
+
+
+class SessionStore(ABC):
+    """
+    Base class for session-keyed conversation stores.
+
+    A store maps a session id to the `ChatMessage` of that conversation, so every
+    request only loads and saves its own history. Requests of the same session must
+    run their turns one after the other (`begin_turn`), otherwise two turns would
+    append to one history concurrently and the last save would win.
+    """
+
+    def __init__(self, max_chat_message: int = 10, max_tokens: Optional[int] = None) -> None:
+        """
+        @param max_chat_message: Memory size used when a new conversation is created.
+        @param max_tokens: Token budget used when a new conversation is created.
+        """
+        self.max_chat_message = max_chat_message
+        self.max_tokens = max_tokens
+        # session id -> [asyncio.Lock, number of requests holding or waiting for it]
+        self._turns: Dict[str, List] = {}
+
+
+    async def begin_turn(self, session_id: str) -> Turn:
+        """
+        Wait until no other request of the session is running a turn.
+
+        Call it before `load`, and release the turn after `save`. Must be used from
+        one event loop; turns are serialized within this process only.
+
+        @param session_id: Identifier of the conversation.
+        @return: The turn, to release when the response is complete.
+        """
+        entry = self._turns.get(session_id)
+        if entry is None:
+            entry = self._turns[session_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            await entry[0].acquire()
+        except BaseException:
+            self._leave_turn(session_id, entry)
+            raise
+        return Turn(self, session_id, entry)
+
+
+    def _leave_turn(self, session_id: str, entry: List) -> None:
+        entry[1] -= 1
+        if not entry[1] and self._turns.get(session_id) is entry:
+            del self._turns[session_id]
+
+
+    def load(self, session_id: str) -> ChatMessage:
+        """
+        Load the conversation of a session, creating an empty one if it does not exist.
+
+        @param session_id: Identifier of the conversation.
+        @return: The ChatMessage of the session.
+        """
+        memory = self._get(session_id)
+        if memory is None:
+            memory = ChatMessage(max_chat_message=self.max_chat_message, max_tokens=self.max_tokens)
+        return memory
+
+
+    @abstractmethod
+    def save(self, session_id: str, memory: ChatMessage) -> None:
+        """
+        Persist the conversation of a session.
+
+        @param session_id: Identifier of the conversation.
+        @param memory: The ChatMessage to store.
+        """
+
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """
+        Remove the conversation of a session.
+
+        @param session_id: Identifier of the conversation.
+        """
+
+
+    @abstractmethod
+    def _get(self, session_id: str) -> Optional[ChatMessage]:
+        """
+        @return: The stored conversation of a session, None if it does not exist or expired.
+        """
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process session store with LRU eviction and idle expiry.
+
+    @param max_sessions: Maximum number of conversations kept, least recently used are evicted first.
+    @param ttl: Seconds a conversation may stay idle before it expires. None disables expiry.
+    @param max_chat_message: Memory size used when a new conversation is created.
+    @param max_tokens: Token budget used when a new conversation is created.
+    """
+
+    def __init__(self, max_sessions: int = 1024,
+                 ttl: Optional[float] = 3600,
+                 max_chat_message: int = 10,
+                 max_tokens: Optional[int] = None) -> None:
+        super().__init__(max_chat_message, max_tokens)
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def _get(self, session_id: str) -> Optional[ChatMessage]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            memory, last_access = entry
+            if self.ttl is not None and time.monotonic() - last_access > self.ttl:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return memory
+
+
+    def save(self, session_id: str, memory: ChatMessage) -> None:
+        with self._lock:
+            self._sessions[session_id] = (memory, time.monotonic())
+            self._sessions.move_to_end(session_id)
+            self._evict()
+
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+    def _evict(self) -> None:
+        """
+        Drop expired conversations from the cold end, then enforce the size bound.
+        """
+        if self.ttl is not None:
+            now = time.monotonic()
+            while self._sessions:
+                session_id, (_, last_access) = next(iter(self._sessions.items()))
+                if now - last_access <= self.ttl:
+                    break
+                del self._sessions[session_id]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Local persistent session store backed by SQLite.
+
+    @param path: Path of the database file. Use ":memory:" for a throwaway store.
+    @param ttl: Seconds a conversation may stay idle before it expires. None disables expiry.
+    @param max_chat_message: Memory size used when a new conversation is created.
+    @param max_tokens: Token budget used when a new conversation is created.
+    """
+
+    def __init__(self, path: str = "sessions.db",
+                 ttl: Optional[float] = None,
+                 max_chat_message: int = 10,
+                 max_tokens: Optional[int] = None) -> None:
+        super().__init__(max_chat_message, max_tokens)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, "
+                "memory TEXT NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+
+
+    def _get(self, session_id: str) -> Optional[ChatMessage]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT memory, updated_at FROM sessions WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        if self.ttl is not None and time.time() - row[1] > self.ttl:
+            self.delete(session_id)
+            return None
+        return ChatMessage.from_dict(json.loads(row[0]))
+
+
+    def save(self, session_id: str, memory: ChatMessage) -> None:
+        data = dumps(memory.to_dict()).decode("utf-8")
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, memory, updated_at) VALUES (?, ?, ?)",
+                (session_id, data, time.time())
+            )
+
+
+    def delete(self, session_id: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+
+    def purge_expired(self) -> int:
+        """
+        Delete every conversation idle for longer than the TTL.
+
+        @return: Number of deleted conversations.
+        """
+        if self.ttl is None:
+            return 0
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "DELETE FROM sessions WHERE updated_at < ?",
+                (time.time() - self.ttl,)
+            )
+        return cursor.rowcount
+
+
+def create_session_store(backend: str = "memory", **kwargs) -> SessionStore:
+    """
+    Create a session store by backend name.
+
+    @param backend: "memory" or "sqlite".
+    @param kwargs: Extra arguments for the store constructor.
+    @return: The session store instance.
+    """
+    stores = {
+        "memory": MemorySessionStore,
+        "sqlite": SQLiteSessionStore,
+    }
+    if backend not in stores:
+        raise ValueError(f"Invalid session store backend: {backend}")
+    return stores[backend](**kwargs)
@@ -0,0 +1,249 @@
+import json
+
+from typing import Any, Dict, List, Optional
+
+
+class StreamEvent:
+    """
+    Base class of the typed events emitted by `ClaudeStreamDecoder`.
+    """
+    __slots__ = ()
+
+
+class MessageStart(StreamEvent):
+    """
+    Start of a message, carries the input token usage.
+    """
+    __slots__ = ("usage",)
+
+    def __init__(self, usage: Dict) -> None:
+        self.usage = usage
+
+
+class TextDelta(StreamEvent):
+    """
+    A piece of generated text for the content block at `index`.
+    """
+    __slots__ = ("index", "text")
+
+    def __init__(self, index: int, text: str) -> None:
+        self.index = index
+        self.text = text
+
+
+class ToolUse(StreamEvent):
+    """
+    A complete tool-use block, emitted when the block is closed and its input is parsed.
+    """
+    __slots__ = ("index", "id", "name", "input")
+
+    def __init__(self, index: int, id: str, name: str, input: Dict) -> None:
+        self.index = index
+        self.id = id
+        self.name = name
+        self.input = input
+
+
+class MessageDelta(StreamEvent):
+    """
+    End-of-message metadata: stop reason, stop sequence and output token usage.
+    """
+    __slots__ = ("stop_reason", "stop_sequence", "usage")
+
+    def __init__(self, stop_reason: str, stop_sequence: Optional[str], usage: Dict) -> None:
+        self.stop_reason = stop_reason
+        self.stop_sequence = stop_sequence
+        self.usage = usage
+
+
+class ClaudeStreamDecoder:
+    """
+    Incremental decoder for Claude stream events from Bedrock.
+
+    Content blocks are tracked by their index, so text and any number of tool-use
+    blocks may interleave. Text deltas take the fast path: they are appended to a
+    per-block list of parts and only joined once, when the block is read.
+
+    Usage:
+        decoder = ClaudeStreamDecoder()
+        for event in response["body"]:
+            event = decoder.feed_bytes(event["chunk"]["bytes"])
+            if type(event) is TextDelta:
+                print(event.text, end="")
+        decoder.body, decoder.tools, decoder.stop_reason, decoder.usage
+    """
+
+    __slots__ = ("_blocks", "stop_reason", "stop_sequence", "usage")
+
+    def __init__(self) -> None:
+        self.reset()
+
+
+    def reset(self) -> None:
+        """
+        Clear the decoder state to parse a new message.
+        """
+        # index -> [type, parts, id, name, parsed input]
+        self._blocks: Dict[int, list] = {}
+        self.stop_reason = ""
+        self.stop_sequence = None
+        self.usage: Dict[str, int] = {}
+
+
+    def feed_bytes(self, raw: bytes) -> Optional[StreamEvent]:
+        """
+        Decode one raw stream chunk.
+
+        @param raw: The `chunk.bytes` payload of a Bedrock stream event.
+        @return: The typed event, or None for events carrying no information.
+        """
+        return self.feed(json.loads(raw))
+
+
+    def feed(self, chunk: Dict[str, Any]) -> Optional[StreamEvent]:
+        """
+        Process one decoded stream chunk.
+
+        @param chunk: A decoded Claude stream event.
+        @return: The typed event, or None for events carrying no information.
+        """
+        chunk_type = chunk["type"]
+
+        if chunk_type == "content_block_delta":
+            delta = chunk["delta"]
+            block = self._blocks[chunk["index"]]
+            if delta["type"] == "text_delta":
+                text = delta["text"]
+                block[1].append(text)
+                return TextDelta(chunk["index"], text)
+            if delta["type"] == "input_json_delta":
+                block[1].append(delta["partial_json"])
+            return None
+
+        if chunk_type == "content_block_start":
+            content_block = chunk["content_block"]
+            if content_block["type"] == "tool_use":
+                self._blocks[chunk["index"]] = ["tool_use", [], content_block["id"], content_block["name"], None]
+            else:
+                parts = [content_block["text"]] if content_block.get("text") else []
+                self._blocks[chunk["index"]] = [content_block["type"], parts, None, None, None]
+            return None
+
+        if chunk_type == "content_block_stop":
+            index = chunk["index"]
+            block = self._blocks[index]
+            if block[0] != "tool_use":
+                return None
+            try:
+                block[4] = json.loads("".join(block[1])) if block[1] else {}
+            except json.JSONDecodeError:
+                block[4] = {}
+            return ToolUse(index, block[2], block[3], block[4])
+
+        if chunk_type == "message_delta":
+            delta = chunk["delta"]
+            self.stop_reason = delta.get("stop_reason") or ""
+            self.stop_sequence = delta.get("stop_sequence")
+            self.usage.update(chunk.get("usage", {}))
+            return MessageDelta(self.stop_reason, self.stop_sequence, self.usage)
+
+        if chunk_type == "message_start":
+            self.usage.update(chunk["message"].get("usage", {}))
+            return MessageStart(self.usage)
+
+        return None
+
+
+    @property
+    def cache_read_tokens(self) -> int:
+        """
+        Input tokens served from the prompt cache.
+        """
+        return self.usage.get("cache_read_input_tokens", 0)
+
+
+    @property
+    def cache_write_tokens(self) -> int:
+        """
+        Input tokens written to the prompt cache.
+        """
+        return self.usage.get("cache_creation_input_tokens", 0)
+
+
+    @property
+    def text(self) -> str:
+        """
+        All generated text of the message.
+        """
+        return "".join(
+            "".join(block[1]) for _, block in sorted(self._blocks.items())
+            if block[0] == "text")
+
+
+    @property
+    def body(self) -> List[Dict]:
+        """
+        The content blocks of the message in index order, in the Claude messages format.
+        Empty text blocks are left out since the API rejects them in the history.
+        """
+        body = []
+        for _, block in sorted(self._blocks.items()):
+            if block[0] == "tool_use":
+                body.append(self._tool_dict(block))
+            elif block[0] == "text":
+                text = "".join(block[1])
+                if text:
+                    body.append({"type": "text", "text": text})
+        return body
+
+
+    @property
+    def tools(self) -> List[Dict]:
+        """
+        The tool-use blocks of the message in index order.
+        """
+        return [self._tool_dict(block)
+                for _, block in sorted(self._blocks.items())
+                if block[0] == "tool_use"]
+
+
+    @staticmethod
+    def _tool_dict(block: list) -> Dict:
+        return {
+            "type": "tool_use",
+            "id": block[2],
+            "name": block[3],
+            "input": block[4] if block[4] is not None else {}
+        }
+
+
+class TrackedStream:
+    """
+    Wraps a response event stream to report its outcome when the stream ends:
+    `finish(None)` when it ran to the end or was closed, `finish(error)` when reading failed.
+    `finish` may be called twice (closing a stream that ran to the end) and must ignore the second call.
+    """
+
+    def __init__(self, stream: Any, finish) -> None:
+        self._stream = stream
+        self._finish = finish
+
+
+    def __iter__(self):
+        error = None
+        try:
+            for event in self._stream:
+                yield event
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._finish(error)
+
+
+    def close(self) -> None:
+        try:
+            if hasattr(self._stream, "close"):
+                self._stream.close()
+        finally:
+            self._finish(None)
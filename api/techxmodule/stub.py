@@ -0,0 +1,206 @@
+import io
+import json
+import random
+import time
+
+from typing import Any, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+
+class FakeEventStream:
+    """
+    Iterable mimicking the boto3 EventStream returned by `invoke_model_with_response_stream`.
+    Each item is {"chunk": {"bytes": b"..."}} carrying one Claude stream event.
+    """
+
+    def __init__(self, events: List[Dict],
+                 first_token_delay: float = 0.0,
+                 token_delay: float = 0.0) -> None:
+        self._events = events
+        self._first_token_delay = first_token_delay
+        self._token_delay = token_delay
+        self._closed = False
+
+
+    def __iter__(self):
+        for index, event in enumerate(self._events):
+            if self._closed:
+                return
+            delay = self._first_token_delay if index == 1 else self._token_delay
+            if delay:
+                time.sleep(delay)
+            yield {"chunk": {"bytes": json.dumps(event).encode("utf-8")}}
+
+
+    def close(self) -> None:
+        self._closed = True
+
+
+class FakeBedrockRuntime:
+    """
+    Offline stand-in for the "bedrock-runtime" client speaking the Claude messages format.
+
+    The reply text is streamed in small chunks with optional latency, so the server can be
+    load-tested without AWS credentials.
+
+    @param reply: Text answered on every turn.
+    @param tool_calls: Optional list of {"name": ..., "input": {...}} the model asks for
+                       before answering. They are only requested when the last message
+                       is not already a tool result, so the tool loop always terminates.
+    @param chunk_size: Number of characters per text delta.
+    @param first_token_delay: Seconds before the first event (time to first token).
+    @param token_delay: Seconds between two events.
+    @param error_rate: Probability of failing an invocation with `error_code`.
+    @param error_code: AWS error code of the injected failures, e.g. "ThrottlingException".
+    @param region_name: Region of the client, for inspecting routing decisions.
+    """
+
+    def __init__(self, reply: str = "<answer>Hello, I am Gracii.</answer>",
+                 tool_calls: Optional[List[Dict]] = None,
+                 chunk_size: int = 8,
+                 first_token_delay: float = 0.0,
+                 token_delay: float = 0.0,
+                 error_rate: float = 0.0,
+                 error_code: str = "ThrottlingException",
+                 region_name: Optional[str] = None) -> None:
+        self.reply = reply
+        self.tool_calls = tool_calls or []
+        self.chunk_size = chunk_size
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.region_name = region_name
+        self.invocations = 0
+        self.failures = 0
+        self.models: Dict[str, int] = {}
+
+
+    def invoke_model_with_response_stream(self, modelId: str, body: Any, **kwargs) -> Dict:
+        self._call("InvokeModelWithResponseStream", modelId)
+        events = self._build_events(json.loads(body))
+        return {
+            "body": FakeEventStream(events, self.first_token_delay, self.token_delay),
+            "contentType": "application/json"
+        }
+
+
+    def invoke_model(self, modelId: str, body: Any, **kwargs) -> Dict:
+        self._call("InvokeModel", modelId)
+        if self.first_token_delay:
+            time.sleep(self.first_token_delay)
+        content, stop_reason = self._build_content(json.loads(body))
+        response = {
+            "id": f"msg_fake_{self.invocations}",
+            "type": "message",
+            "role": "assistant",
+            "model": modelId,
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {"input_tokens": len(body) // 4, "output_tokens": len(self.reply) // 4}
+        }
+        return {
+            "body": io.BytesIO(json.dumps(response).encode("utf-8")),
+            "contentType": "application/json"
+        }
+
+
+    def _call(self, operation: str, modelId: str) -> None:
+        """
+        Count an invocation and inject a failure according to `error_rate`.
+        """
+        self.invocations += 1
+        if self.error_rate and random.random() < self.error_rate:
+            self.failures += 1
+            raise ClientError({"Error": {"Code": self.error_code, "Message": "Injected by FakeBedrockRuntime"},
+                               "ResponseMetadata": {"HTTPStatusCode": 429 if "Throttl" in self.error_code else 503}},
+                              operation)
+        self.models[modelId] = self.models.get(modelId, 0) + 1
+
+
+    def _build_content(self, payload: Dict) -> tuple:
+        content = [{"type": "text", "text": self.reply}]
+        if not self.tool_calls or self._is_tool_result(payload):
+            return content, "end_turn"
+        for index, tool in enumerate(self.tool_calls):
+            content.append({
+                "type": "tool_use",
+                "id": f"toolu_fake_{self.invocations}_{index}",
+                "name": tool["name"],
+                "input": tool.get("input", {})
+            })
+        return content, "tool_use"
+
+
+    def _build_events(self, payload: Dict) -> List[Dict]:
+        content, stop_reason = self._build_content(payload)
+        events = [{
+            "type": "message_start",
+            "message": {
+                "id": f"msg_fake_{self.invocations}",
+                "type": "message",
+                "role": "assistant",
+                "content": [],
+                "usage": {"input_tokens": len(json.dumps(payload)) // 4, "output_tokens": 1}
+            }
+        }]
+        for index, block in enumerate(content):
+            if block["type"] == "text":
+                events.append({"type": "content_block_start", "index": index,
+                               "content_block": {"type": "text", "text": ""}})
+                text = block["text"]
+                for start in range(0, len(text), self.chunk_size):
+                    events.append({"type": "content_block_delta", "index": index,
+                                   "delta": {"type": "text_delta",
+                                             "text": text[start:start + self.chunk_size]}})
+            else:
+                events.append({"type": "content_block_start", "index": index,
+                               "content_block": {"type": "tool_use", "id": block["id"],
+                                                 "name": block["name"], "input": {}}})
+                events.append({"type": "content_block_delta", "index": index,
+                               "delta": {"type": "input_json_delta",
+                                         "partial_json": json.dumps(block["input"])}})
+            events.append({"type": "content_block_stop", "index": index})
+        events.append({
+            "type": "message_delta",
+            "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+            "usage": {"output_tokens": len(self.reply) // 4}
+        })
+        events.append({"type": "message_stop"})
+        return events
+
+
+    @staticmethod
+    def _is_tool_result(payload: Dict) -> bool:
+        messages = payload.get("messages") or []
+        if not messages:
+            return False
+        content = messages[-1].get("content")
+        return isinstance(content, list) and bool(content) \
+            and isinstance(content[0], dict) and content[0].get("type") == "tool_result"
+
+
+class FakeSession:
+    """
+    Drop-in replacement for `boto3.Session` that hands out `FakeBedrockRuntime` clients.
+
+    @param regions: Optional per-region arguments overriding `runtime_kwargs`,
+                    e.g. {"us-west-2": {"error_rate": 1.0}} to simulate a throttled region.
+    @param runtime_kwargs: Arguments forwarded to every FakeBedrockRuntime.
+    """
+
+    def __init__(self, regions: Optional[Dict[str, Dict]] = None, **runtime_kwargs) -> None:
+        self.regions = regions or {}
+        self.runtime_kwargs = runtime_kwargs
+        self.runtimes: Dict[str, FakeBedrockRuntime] = {}
+
+
+    def client(self, service_name: str, region_name: str = None, **kwargs) -> FakeBedrockRuntime:
+        if service_name != "bedrock-runtime":
+            raise ValueError(f"Fake session only provides bedrock-runtime, got: {service_name}")
+        runtime = FakeBedrockRuntime(region_name=region_name,
+                                     **{**self.runtime_kwargs, **self.regions.get(region_name, {})})
+        self.runtimes[region_name] = runtime
+        return runtime
@@ -1,11 +1,14 @@
+import functools
 import json
 import re
-import pytz
 
-import platform,socket,re,uuid,json,psutil,logging # type: ignore
+import logging
 from datetime import datetime
-import geocoder, geopy      # type: ignore
+from typing import List, Tuple
 from termcolor import cprint # type: ignore
+
+# pytz, psutil, geocoder and geopy are imported by the functions using them:
+# geocoder alone pulls in requests and takes longer to import than the whole server.
     
     
 def combine_string(list_of_string: list) -> str:
@@ -17,10 +20,9 @@ def combine_string(list_of_string: list) -> str:
     @return: A single string formed by joining the input strings with newline characters.
     """
     
-    result = ""
-    for s in list_of_string:
-        result = result + s + "\n"
-    return result
+    if not list_of_string:
+        return ""
+    return "\n".join(list_of_string) + "\n"
         
 
 def iterate_through_location(location: json):
@@ -68,14 +70,102 @@ def sanitize_input(text: str) -> str:
     return text
         
         
+class TagScanner:
+    """
+    Single-pass scanner for the elements of a fixed set of tags in prompt text.
+
+    One precompiled pattern finds the opening, closing and self-closing tags of the
+    set, and elements are matched left to right: an element runs from its opening tag
+    to the first closing tag of the same name, across lines, and whatever it contains
+    is part of it. An opening tag that is never closed is left as plain text. Each
+    character is looked at once, so the scan is linear in the text size, even with
+    many unclosed tags.
+
+    @param tags: Tag names to scan for.
+    """
+
+    __slots__ = ("tags", "_pattern")
+
+    def __init__(self, tags) -> None:
+        self.tags = frozenset(tags)
+        names = "|".join(re.escape(tag) for tag in sorted(self.tags, key=len, reverse=True))
+        self._pattern = re.compile(rf"<(/?)({names})(?:\s[^<>]*?)?(/?)>")
+
+
+    def elements(self, text: str):
+        """
+        Iterate over the elements of a text.
+
+        @param text: Text to scan.
+        @return: Iterator of (start, end, tag, content start, content end) positions.
+        """
+        if "<" not in text:
+            return
+        matches = list(self._pattern.finditer(text))
+        # Start of the last closing tag of each name, matched by the same pattern as the
+        # opening tags so that `</tag >` closes an element too
+        last_close = {match.group(2): match.start() for match in matches if match.group(1)}
+        open_tag = None
+        for match in matches:
+            closing, tag, self_closing = match.groups()
+            if open_tag is None:
+                if closing:
+                    continue
+                if self_closing:
+                    yield match.start(), match.end(), tag, match.end(), match.end()
+                    continue
+                if last_close.get(tag, -1) < match.end():
+                    continue
+                open_tag, start, content_start = tag, match.start(), match.end()
+            elif closing and tag == open_tag:
+                yield start, match.end(), tag, content_start, match.start()
+                open_tag = None
+
+
+    def strip(self, text: str) -> str:
+        """
+        @return: The text without the elements.
+        """
+        parts, position = [], 0
+        for start, end, _, _, _ in self.elements(text):
+            parts.append(text[position:start])
+            position = end
+        if not parts:
+            return text
+        parts.append(text[position:])
+        return "".join(parts)
+
+
+    def keep(self, text: str) -> str:
+        """
+        @return: The elements, tags included, without the text around them.
+        """
+        return "".join([text[start:end] for start, end, _, _, _ in self.elements(text)])
+
+
+    def extract(self, text: str) -> List[Tuple[str, str]]:
+        """
+        @return: (tag, content) of each element.
+        """
+        return [(tag, text[content_start:content_end])
+                for _, _, tag, content_start, content_end in self.elements(text)]
+
+
+# Prompt sections that are only relevant to the turn they were sent with
+PROMPT_TAGS = TagScanner(("instructions", "examples", "context", "documents"))
+REQUEST_TAG = TagScanner(("request",))
+
+
 def clean_tag(string: str) -> str:
     """
     Function to remove text between specified tag from a string
+    (the <instructions>, <examples>, <context> and <documents> elements, see `TagScanner`)
     """
-    return re.sub(r"<(instructions|examples|context|documents)>.*?</\1>", "", string)
+    return PROMPT_TAGS.strip(string)
 
 
 def system() -> str:
+    import platform, socket, uuid, psutil  # type: ignore
     try:
         info={}
         info['platform']=platform.system()
@@ -93,33 +183,187 @@ def system() -> str:
         
     
 def location():
+    import geocoder, geopy.geocoders  # type: ignore
     return geopy.geocoders.Nominatim(user_agent="GetLoc").reverse(geocoder.ip('me').latlng)
 
 
 def real_time():
+    import pytz
     return datetime.now(tz = pytz.timezone("Asia/Bangkok")).strftime('%Y-%m-%d %H:%M:%S %Z')
 
 
 
+_INVALID_TAG_CHARS = re.compile(r"[^\w.-]", re.UNICODE)
+
+
+@functools.lru_cache(maxsize=1024)
+def xml_tag(name) -> str:
+    """
+    Turn a key into a valid XML tag name (invalid characters become "_").
+
+    @param name: Dictionary key.
+    @return: Tag name.
+    """
+    tag = _INVALID_TAG_CHARS.sub("_", str(name))
+    if not tag or not (tag[0].isalpha() or tag[0] == "_"):
+        tag = "_" + tag
+    return tag
+
+
+def escape_xml(value) -> str:
+    """
+    Escape a value for XML text content.
+
+    @param value: Any value, converted with str().
+    @return: Text with &, < and > escaped.
+    """
+    text = value if isinstance(value, str) else str(value)
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def escape_attribute(value) -> str:
+    """
+    Escape a value for a double-quoted XML attribute.
+    """
+    return escape_xml(value).replace('"', "&quot;")
+
+
+class XMLWriter:
+    """
+    Streaming writer for prompts and XML.
+
+    Fragments are appended to a list and joined once by `getvalue`, so building a
+    document is linear in its size, and text is escaped as it is written.
+    """
+
+    __slots__ = ("_parts",)
+
+    def __init__(self) -> None:
+        self._parts = []
+
+
+    def raw(self, fragment: str) -> "XMLWriter":
+        """
+        Append a fragment as is (already valid XML or plain prompt text).
+        """
+        self._parts.append(fragment)
+        return self
+
+
+    def line(self, fragment: str = "") -> "XMLWriter":
+        """
+        Append a fragment followed by a newline, as is.
+        """
+        self._parts.append(fragment)
+        self._parts.append("\n")
+        return self
+
+
+    def text(self, value) -> "XMLWriter":
+        """
+        Append escaped text.
+        """
+        self._parts.append(escape_xml(value))
+        return self
+
+
+    def open(self, tag: str, attributes: dict = None) -> "XMLWriter":
+        if attributes:
+            self._parts.append(f"<{tag}" + "".join(
+                f' {name}="{escape_attribute(value)}"' for name, value in attributes.items()) + ">")
+        else:
+            self._parts.append(f"<{tag}>")
+        return self
+
+
+    def close(self, tag: str) -> "XMLWriter":
+        self._parts.append(f"</{tag}>")
+        return self
+
+
+    def element(self, tag: str, value, attributes: dict = None) -> "XMLWriter":
+        """
+        Append <tag>escaped value</tag>.
+        """
+        self.open(tag, attributes)
+        self._parts.append(escape_xml(value))
+        self._parts.append(f"</{tag}>")
+        return self
+
+
+    def json(self, obj) -> "XMLWriter":
+        """
+        Append a JSON-like object as XML: dict keys become tags, list items are wrapped in
+        the singular of their key ("results" -> "result"), other values become escaped text.
+        A top-level list is written as a sequence of <result> elements.
+
+        Nesting is handled with an explicit stack, so depth is not limited by recursion.
+        """
+        parts = self._parts
+        tags = {}
+
+        def tag_of(key):
+            tag = tags.get(key)
+            if tag is None:
+                tag = tags[key] = xml_tag(key)
+            return tag
+
+        # Frames: (iterator, tag of list items or None for a dict, closing tag)
+        if isinstance(obj, list):
+            stack = [(iter(obj), "result", None)]
+        else:
+            stack = [(iter(obj.items()), None, None)]
+        while stack:
+            iterator, item_tag, _ = frame = stack[-1]
+            for entry in iterator:
+                if item_tag is None:
+                    key, value = entry
+                    tag = tag_of(key)
+                else:
+                    key, value, tag = item_tag, entry, item_tag
+                if isinstance(value, dict):
+                    parts.append(f"<{tag}>")
+                    stack.append((iter(value.items()), None, tag))
+                    break
+                if isinstance(value, list):
+                    singular = key[:-1] if isinstance(key, str) and key.endswith("s") else key
+                    parts.append(f"<{tag}>")
+                    stack.append((iter(value), tag_of(singular), tag))
+                    break
+                if type(value) is not str:
+                    value = str(value)
+                if "&" in value or "<" in value or ">" in value:
+                    value = value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+                parts.append(f"<{tag}>{value}</{tag}>")
+            else:
+                stack.pop()
+                if frame[2] is not None:
+                    parts.append(f"</{frame[2]}>")
+        return self
+
+
+    def getvalue(self) -> str:
+        """
+        @return: The written document.
+        """
+        return "".join(self._parts)
+
+
 def json_to_xml(json_obj):
-    def parse_value(key, value):
-        """Helper function to handle different types of values"""
-        if isinstance(value, dict):  # If value is a dictionary, recursively convert it
-            return f"<{key}>{dict_to_xml(value)}</{key}>"
-        elif isinstance(value, list):  # If value is a list, process each item and wrap in the key
-            return f"<{key}>" + "".join([parse_value(key[:-1] if key.endswith('s') else key, item) for item in value]) + f"</{key}>"
-        else:  # For other data types, simply wrap the value in XML tags
-            return f"<{key}>{value}</{key}>"
-    
-    def dict_to_xml(d):
-        """Recursive function to convert dictionary to XML format"""
-        xml = ""
-        for key, value in d.items():
-            xml += parse_value(key, value)
-        return xml
+    """
+    Convert a JSON object (or JSON string) to XML, see `XMLWriter.json`.
 
+    @param json_obj: Dictionary, list or JSON string.
+    @return: XML string with escaped values.
+    """
     # If the input is a JSON string, parse it first
     if isinstance(json_obj, str):
         json_obj = json.loads(json_obj)
 
-    return dict_to_xml(json_obj)
\ No newline at end of file
+    return XMLWriter().json(json_obj).getvalue()
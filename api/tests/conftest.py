@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The api directory is the import root of techxmodule, main and tools
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+
+from techxmodule.admission import AdmissionController, Overloaded
+
+
+def test_globally_rejected_request_keeps_its_session_tokens():
+    async def scenario():
+        admission = AdmissionController(rate=0.001, burst=1, session_rate=0.001, session_burst=2)
+        (await admission.acquire("first")).release()
+        with pytest.raises(Overloaded) as rejected:
+            await admission.acquire("second")
+        assert rejected.value.reason == "Too many requests"
+        assert admission._sessions["second"].tokens == pytest.approx(2, abs=0.01)
+
+    asyncio.run(scenario())
+
+
+def test_session_rejection_keeps_the_global_tokens():
+    async def scenario():
+        admission = AdmissionController(rate=0.001, burst=5, session_rate=0.001, session_burst=1)
+        (await admission.acquire("chatty")).release()
+        with pytest.raises(Overloaded) as rejected:
+            await admission.acquire("chatty")
+        assert rejected.value.status_code == 429
+        assert admission.bucket.tokens == pytest.approx(4, abs=0.01)
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from techxmodule.models.__core_skeleton__ import LLM
+from techxmodule.models.chat import Claude
+from techxmodule.stub import FakeSession
+
+
+class BlockingStream:
+    """
+    Event stream yielding one event, then blocking until released, recording who closes it.
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.closed_by = []
+
+    def __iter__(self):
+        yield {"chunk": {"bytes": json.dumps({"type": "message_start", "message": {}}).encode()}}
+        self.release.wait(5)
+        yield {"chunk": {"bytes": json.dumps({"type": "message_stop"}).encode()}}
+
+    def close(self):
+        self.closed_by.append(threading.current_thread())
+
+
+@pytest.fixture
+def small_pools(monkeypatch):
+    monkeypatch.setattr(LLM, "STREAM_READER_WORKERS", 2)
+    monkeypatch.setattr(LLM, "INVOKE_WORKERS", 2)
+    monkeypatch.setattr(LLM, "_stream_executor", None)
+    monkeypatch.setattr(LLM, "_invoke_executor", None)
+    yield
+    for executor in (LLM._stream_executor, LLM._invoke_executor):
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def test_open_streams_do_not_starve_invocations(small_pools):
+    llm = Claude("3.5-sonnet", FakeSession(), "us-east-1")
+    streams = [BlockingStream() for _ in range(LLM.STREAM_READER_WORKERS)]
+
+    async def main():
+        readers = [llm._astream_response({"body": stream}) for stream in streams]
+        for reader in readers:
+            await reader.__anext__()
+        # Every stream reader is busy, a blocking invocation must still go through
+        response = await asyncio.wait_for(llm._ainvoke_with_payload(
+            llm.modelId, {"messages": [{"role": "user", "content": "hi"}]}, streaming=False), timeout=2)
+        for stream in streams:
+            stream.release.set()
+        for reader in readers:
+            assert [raw async for raw in reader] != []
+        return response
+
+    assert json.loads(asyncio.run(main())["body"].read())["stop_reason"] == "end_turn"
+
+
+def test_stream_is_closed_by_its_reader_thread(small_pools):
+    llm = Claude("3.5-sonnet", FakeSession(), "us-east-1")
+    stream = BlockingStream()
+
+    async def main():
+        reader = llm._astream_response({"body": stream})
+        await reader.__anext__()
+        await reader.aclose()  # the client went away while the stream was blocked
+        assert stream.closed_by == []
+        stream.release.set()
+        for _ in range(100):
+            if stream.closed_by:
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert len(stream.closed_by) == 1
+    assert stream.closed_by[0] is not threading.main_thread()
+    assert stream.closed_by[0].name.startswith("bedrock-stream")
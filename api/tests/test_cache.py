@@ -0,0 +1,86 @@
+import sqlite3
+import types
+
+import pytest
+
+from techxmodule import cache
+from techxmodule.cache import CachePolicy, TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(time=clock))
+    return clock
+
+
+def rows(path):
+    with sqlite3.connect(path) as connection:
+        return sorted(key for key, in connection.execute("SELECT key FROM cache"))
+
+
+def test_entries_expire_after_their_ttl(clock):
+    results = TTLCache(ttl=60)
+    results.set("a", 1)
+    clock.now += 59
+    assert results.get("a") == 1
+    clock.now += 2
+    assert results.get("a") is None
+    assert (results.hits, results.misses, len(results)) == (1, 1, 0)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    results = TTLCache(maxsize=2)
+    results.set("a", 1)
+    results.set("b", 2)
+    results.get("a")
+    results.set("c", 3)
+    assert (results.get("a"), results.get("b"), results.get("c")) == (1, None, 3)
+
+
+def test_persisted_entries_survive_a_restart_until_they_expire(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    TTLCache(ttl=60, path=path).set("a", {"text": "result"})
+    assert TTLCache(ttl=60, path=path).get("a") == {"text": "result"}
+    clock.now += 61
+    assert TTLCache(ttl=60, path=path).get("a") is None
+    assert rows(path) == []
+
+
+def test_purge_deletes_expired_rows_never_read_again(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    results = TTLCache(ttl=60, path=path, purge_interval=30)
+    results.set("old", 1)
+    clock.now += 45
+    results.set("new", 2)  # the first purge is due
+    assert rows(path) == ["new", "old"]
+    clock.now += 30
+    results.set("newer", 3)
+    assert rows(path) == ["new", "newer"]
+
+
+def test_row_cap_keeps_the_rows_expiring_last(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    results = TTLCache(maxsize=2, ttl=60, path=path, max_rows=3, purge_interval=0)
+    for key in "abcde":
+        clock.now += 1
+        results.set(key, key)
+    assert rows(path) == ["c", "d", "e"]
+
+
+def test_caches_of_one_file_share_a_connection(tmp_path):
+    policy = CachePolicy(path=str(tmp_path / "cache.db"))
+    first, second = policy.create_cache(), policy.create_cache()
+    assert first._database is second._database
+    first.set("web:a", 1)
+    second.set("map:a", 2)
+    assert rows(policy.path) == ["map:a", "web:a"]
+    assert TTLCache(path=":memory:")._database is not TTLCache(path=":memory:")._database
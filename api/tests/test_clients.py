@@ -0,0 +1,53 @@
+from techxmodule import clients
+
+
+class CountingSession:
+
+    profile_name = "default"
+
+    def __init__(self):
+        self.credential_lookups = 0
+        self.created = 0
+
+    def get_credentials(self):
+        self.credential_lookups += 1
+        return None
+
+    def client(self, service_name, region_name=None, config=None):
+        self.created += 1
+        return object()
+
+
+def test_clients_are_shared_without_resolving_credentials():
+    clients.clear()
+    session = CountingSession()
+    first = clients.get_runtime_client(session, "us-east-1")
+    assert clients.get_runtime_client(session, "us-east-1") is first
+    assert clients.get_runtime_client(session, "us-west-2") is not first
+    assert clients.get_runtime_client(session, "us-east-1", read_timeout=5) is not first
+    assert session.created == 3
+    assert session.credential_lookups == 0
+    clients.clear()
+
+
+def test_sessions_with_distinct_explicit_keys_get_their_own_client():
+    import boto3
+    clients.clear()
+    first = boto3.Session(aws_access_key_id="AKIAFIRST", aws_secret_access_key="first", region_name="us-east-1")
+    second = boto3.Session(aws_access_key_id="AKIASECOND", aws_secret_access_key="second", region_name="us-east-1")
+    assert first.profile_name == second.profile_name
+    first_client = clients.get_runtime_client(first, "us-east-1")
+    second_client = clients.get_runtime_client(second, "us-east-1")
+    assert first_client is not second_client
+    assert first_client._request_signer._credentials.access_key == "AKIAFIRST"
+    assert second_client._request_signer._credentials.access_key == "AKIASECOND"
+    assert clients.get_runtime_client(first, "us-east-1") is first_client
+    clients.clear()
+
+
+def test_clients_are_released_with_their_session():
+    import gc
+    clients.clear()
+    clients.get_runtime_client(CountingSession(), "us-east-1")
+    gc.collect()
+    assert len(clients._clients) == 0
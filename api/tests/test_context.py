@@ -0,0 +1,48 @@
+from techxmodule.context import ContextPacker, ranked
+from techxmodule.messages import approximate_tokens
+
+
+def words(prefix, count):
+    return " ".join(f"{prefix}{index}" for index in range(count))
+
+
+def test_best_documents_first_within_the_budget():
+    documents = [{"content": words("low", 50), "score": 0.2},
+                 {"content": words("high", 50), "score": 0.9},
+                 {"content": words("weak", 50), "score": 0.05},
+                 {"content": "", "score": 1.0}]
+    packed = ContextPacker(max_tokens=4000, min_relevance=0.1).pack(documents)
+    assert [document["score"] for document in packed] == [0.9, 0.2]
+
+
+def test_near_duplicates_are_skipped():
+    base = words("w", 200)
+    documents = [{"content": base, "score": 0.9},
+                 {"content": base.upper().replace(" ", "  "), "score": 0.8},
+                 {"content": base + " one more sentence", "score": 0.7},
+                 {"content": words("other", 200), "score": 0.6}]
+    packed = ContextPacker().pack(documents)
+    assert [document["score"] for document in packed] == [0.9, 0.6]
+    assert len(ContextPacker(dedup_threshold=1.0).pack(documents)) == 3
+
+
+def test_document_over_the_budget_is_shortened_or_skipped():
+    packer = ContextPacker(max_tokens=300, min_document_tokens=100)
+    first, second = packer.pack([{"content": words("a", 100), "score": 0.9},
+                                 {"content": words("b", 400), "score": 0.8}])
+    assert first["content"] == words("a", 100)
+    assert approximate_tokens(second["content"]) <= 300 - approximate_tokens(first["content"]) + 1
+
+    packed = packer.pack([{"content": words("a", 220), "score": 0.9},
+                          {"content": words("b", 400), "score": 0.8},
+                          {"content": "short", "score": 0.1}])
+    assert [document["score"] for document in packed] == [0.9, 0.1]
+
+
+def test_xml_is_escaped_and_numbered():
+    xml = ContextPacker().render(ranked([{"content": "a < b & c", "source": "x\"y"},
+                                         {"content": "second"}]))
+    assert xml == ('<documents><document index="1"><source>x"y</source>'
+                   '<document_content>a &lt; b &amp; c</document_content></document>'
+                   '<document index="2"><document_content>second</document_content></document></documents>')
+    assert ContextPacker().render([]) == "<documents />"
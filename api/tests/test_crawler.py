@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from techxmodule.crawler import CrawlService
+
+
+@pytest.fixture
+def service():
+    service = CrawlService(politeness_delay=0)
+    yield service
+    service.close()
+
+
+def test_failing_pages_are_skipped(service, monkeypatch):
+    async def fetch(url):
+        if "/broken" in url:
+            raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+        if url.endswith("/"):
+            return "home", ["/broken-1", "/broken-2", "/about"]
+        return url, []
+
+    # Two workers: both would die on the broken pages and leave /about queued forever
+    monkeypatch.setattr(service, "_fetch", fetch)
+    pages = service.crawl("https://example.com/", max_pages=2, timeout=3)
+    assert [page["url"] for page in pages] == ["https://example.com/", "https://example.com/about"]
+
+
+def test_domain_state_is_bounded(service):
+    service.max_domains = 3
+
+    async def visit():
+        for index in range(10):
+            await service._wait_turn(f"host-{index}.example")
+
+    asyncio.run_coroutine_threadsafe(visit(), service._ensure_started()).result(5)
+    assert list(service._domain_locks) == ["host-7.example", "host-8.example", "host-9.example"]
+    assert set(service._next_slot) == set(service._domain_locks)
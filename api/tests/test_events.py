@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+from techxmodule import events
+
+
+def test_publish_from_an_event_loop_never_blocks():
+    bus = events.EventBus(block_timeout=2)
+    release = threading.Event()
+    subscription = bus.subscribe("topic", lambda data: release.wait(5), max_queue=1, policy=events.BLOCK)
+
+    async def publish_many():
+        started = time.monotonic()
+        for index in range(5):
+            bus.publish("topic", index)
+        return time.monotonic() - started
+
+    try:
+        assert asyncio.run(publish_many()) < 0.5
+        assert subscription.dropped >= 3
+    finally:
+        release.set()
+        bus.close()
+
+
+def test_publish_from_a_thread_waits_for_room():
+    bus = events.EventBus(block_timeout=2)
+    subscription = bus.subscribe("topic", lambda data: time.sleep(0.05), max_queue=1, policy=events.BLOCK)
+    for index in range(5):
+        bus.publish("topic", index)
+    assert bus.flush(2)
+    assert subscription.dropped == 0 and subscription.delivered == 5
+    bus.close()
+
+
+def test_events_left_by_close_are_delivered_after_restart():
+    bus = events.EventBus()
+    received = []
+    release = threading.Event()
+
+    def slow(data):
+        release.wait(5)
+        received.append(data)
+
+    bus.subscribe("topic", slow)
+    bus.publish("topic", 1)
+    bus.publish("topic", 2)
+    bus.close(timeout=0.05)
+    release.set()
+
+    bus.publish("topic", 3)
+    assert bus.flush(2)
+    assert 3 in received and 2 in received
+    bus.close()
+
+
+def test_slow_subscriber_does_not_hold_back_a_batched_one():
+    bus = events.EventBus()
+    received = []
+
+    async def collect(batch):
+        received.extend(batch)
+
+    slow = bus.subscribe("request.*", lambda data: time.sleep(0.01), max_queue=10)
+    bus.subscribe("*", collect, batch_size=64, batch_timeout=0.005, max_queue=10_000)
+    started = time.monotonic()
+    for index in range(2000):
+        bus.publish(events.REQUEST_FIRST_TOKEN if index % 2 else events.TOOL_END, {"index": index})
+    assert time.monotonic() - started < 1
+
+    assert bus.flush(5)
+    assert [data["index"] for data in received] == list(range(2000))
+    assert slow.dropped > 0 and slow.delivered + slow.dropped == 1000
+    bus.close()
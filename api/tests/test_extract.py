@@ -0,0 +1,33 @@
+from techxmodule.extract import extract_text
+
+
+def text(html):
+    return extract_text(html, max_chars=10_000, backend="python")
+
+
+def test_boilerplate_is_dropped():
+    assert text("<body><nav><a href='/'>Home</a></nav><p>Content</p><script>x()</script></body>") == "Content"
+
+
+def test_unclosed_tag_inside_a_skipped_subtree_is_closed_with_it():
+    assert text("<body><nav><button>Menu</nav><p>Content</p></body>") == "Content"
+
+
+def test_unclosed_skip_tag_ends_at_main():
+    assert text("<body><nav><a href='/'>Home</a><main><p>Content</p></main></body>") == "Content"
+
+
+def test_unclosed_skip_tag_ends_at_body():
+    html = "<body><aside>Related</body><p>Trailing content</p>"
+    assert text(html) == "Trailing content"
+
+
+def test_page_wrapped_in_a_form_keeps_its_content():
+    html = ("<html><body><form method='post' action='./Default.aspx' id='form1'>"
+            "<input type='hidden' name='__VIEWSTATE' value='x'/><nav>Home</nav>"
+            "<p>Content</p><p>More content</p><button>Send</button></form></body></html>")
+    assert text(html) == "Content\nMore content"
+
+
+def test_article_header_keeps_the_title():
+    assert text("<body><article><header><h1>Title</h1></header><p>Content</p></article></body>") == "Title\nContent"
@@ -0,0 +1,70 @@
+import base64
+import json
+import os
+
+import pytest
+
+from techxmodule.images import ImageStore
+from techxmodule.messages import ChatMessage, Image
+
+
+def image(index, size=100):
+    return (f"{index:04d}" * size)[:size]
+
+
+def test_disk_budget_deletes_least_recently_used_files(tmp_path):
+    store = ImageStore(max_memory_bytes=100, max_disk_bytes=250, spill_dir=str(tmp_path))
+    digests = [store.put(image(index), "image/png").digest for index in range(5)]
+    assert store.memory_bytes == 100
+    assert store.disk_bytes <= 250
+    assert sorted(os.listdir(tmp_path)) == sorted(digests[2:4])
+
+    assert store.get(digests[4]) == image(4)
+    assert store.get(digests[3]) == image(3)
+    with pytest.raises(KeyError):
+        store.get(digests[0])
+
+
+def test_referenced_images_are_never_deleted(tmp_path):
+    store = ImageStore(max_memory_bytes=100, max_disk_bytes=100, spill_dir=str(tmp_path))
+    refs = [store.put(image(index), "image/png") for index in range(4)]
+    assert store.disk_bytes == 300
+    assert [ref.data() for ref in refs] == [image(index) for index in range(4)]
+
+    # Once the messages holding them are gone, the next image trims the disk
+    del refs
+    store.put(image(4), "image/png")
+    assert store.disk_bytes <= 100
+
+
+def test_forgotten_image_can_be_stored_again(tmp_path):
+    store = ImageStore(max_memory_bytes=100, max_disk_bytes=100, spill_dir=str(tmp_path))
+    digest = store.put(image(0), "image/png").digest
+    for index in range(1, 4):
+        store.put(image(index), "image/png")
+    with pytest.raises(KeyError):
+        store.get(digest)
+    assert store.put(image(0), "image/png").data() == image(0)
+
+
+def test_reading_back_does_not_grow_the_disk(tmp_path):
+    store = ImageStore(max_memory_bytes=100, spill_dir=str(tmp_path))
+    refs = [store.put(image(index), "image/png") for index in range(2)]
+    for _ in range(5):
+        for ref in refs:
+            ref.data()
+    assert store.disk_bytes == 200
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_payloads_reuse_the_encoded_image(tmp_path):
+    data = base64.b64encode(b"\x89PNG fake image bytes" * 10).decode("ascii")
+    memory = ChatMessage(image_store=ImageStore(spill_dir=str(tmp_path)))
+    memory.append_message("user", "What is on this picture?", [Image("base64", "image/png", data)])
+    message = memory.messages[-1]
+    ref = next(block.source["data"] for block in message.content if block.type == "image")
+
+    assert ref.encode_json() is ref.encode_json()
+    expected = json.dumps(message.to_dict(), default=lambda obj: obj.__json__())
+    assert json.loads(message.encode_json()) == json.loads(expected)
+    assert ref.data() == data
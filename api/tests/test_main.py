@@ -0,0 +1,41 @@
+import asyncio
+import importlib
+import os
+
+import httpx
+import pytest
+
+
+@pytest.fixture(scope="module")
+def main():
+    os.environ["GRACII_FAKE_BEDROCK"] = "1"
+    os.environ["GRACII_FAKE_TOKEN_DELAY"] = "0.002"
+    try:
+        return importlib.import_module("main")
+    finally:
+        del os.environ["GRACII_FAKE_BEDROCK"], os.environ["GRACII_FAKE_TOKEN_DELAY"]
+
+
+def post(main, *messages, headers=None):
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*[client.post("/chat", json={"message": message}, headers=headers)
+                                          for message in messages])
+    return asyncio.run(run())
+
+
+def test_requests_without_a_session_id_get_their_own_conversation(main):
+    first, second = post(main, "Hello", "Hi")
+    assert first.status_code == second.status_code == 200
+    assert first.headers["X-Session-Id"] != second.headers["X-Session-Id"]
+    for response in (first, second):
+        memory = main.session_store.load(response.headers["X-Session-Id"])
+        assert [message.role for message in memory.messages] == ["user", "assistant"]
+
+
+def test_concurrent_requests_of_a_session_take_turns(main):
+    responses = post(main, "Hello", "Hi", headers={"X-Session-Id": "shared"})
+    assert [response.headers["X-Session-Id"] for response in responses] == ["shared", "shared"]
+    memory = main.session_store.load("shared")
+    assert [message.role for message in memory.messages] == ["user", "assistant", "user", "assistant"]
@@ -0,0 +1,89 @@
+import pytest
+
+from techxmodule.messages import TRUNCATED_MARKER, ChatMessage, Message, estimate_tokens
+from techxmodule.models.chat import Claude
+from techxmodule.stub import FakeSession
+
+
+def tool_turn(memory, position, result):
+    memory.append_message("user", f"<request>Question {position}</request>")
+    memory.append_tool([{"type": "tool_use", "id": f"tool-{position}", "name": "search", "input": {}}])
+    memory.append_tool_result([{"tool_id": f"tool-{position}", "content": result}])
+    memory.append_message("assistant", f"Answer {position}")
+
+
+@pytest.fixture
+def claude():
+    return Claude("3.5-sonnet", FakeSession(), "us-east-1", max_chat_memory=100, max_memory_tokens=500)
+
+
+def test_total_tokens_follow_every_change():
+    memory = ChatMessage(max_chat_message=10)
+    tool_turn(memory, 0, "x" * 4000)
+    memory.append_message("user", "<instructions>Be brief</instructions><request>Next</request>")
+    memory.clean_tags(-1)
+    memory.truncate_tool_results()
+    memory.popleft()
+    assert memory.total_tokens == sum(estimate_tokens(message.to_dict()) for message in memory.messages)
+
+
+def test_truncated_tool_results_keep_their_pairing():
+    memory = ChatMessage(max_chat_message=10, tool_result_chars=100)
+    tool_turn(memory, 0, "x" * 4000)
+    tool_turn(memory, 1, "y" * 4000)
+    memory.truncate_tool_results(keep_last=2)
+
+    old, recent = memory.messages[2].to_dict(), memory.messages[6].to_dict()
+    assert old["content"][0]["tool_use_id"] == "tool-0"
+    assert old["content"][0]["content"][0]["text"] == "x" * 100 + TRUNCATED_MARKER
+    assert recent["content"][0]["content"][0]["text"] == "y" * 4000
+
+
+def test_over_budget_history_evicts_whole_turns(claude):
+    for position in range(6):
+        claude.add_to_memory("user", f"<request>Question {position} {'z' * 400}</request>")
+        claude.add_to_memory("assistant", f"Answer {position} {'z' * 400}")
+
+    memory = claude.memory
+    assert not memory.over_budget()
+    assert memory.messages[0].role == "user"
+    assert memory.messages[-1].to_dict()["content"][0]["text"].startswith("Answer 5")
+
+
+def test_question_in_progress_is_never_evicted(claude):
+    claude.add_to_memory("user", f"<request>{'z' * 4000}</request>")
+    assert len(claude.memory.messages) == 1
+    assert claude.memory.over_budget()
+
+
+def test_eviction_never_splits_a_tool_turn(claude):
+    for position in range(4):
+        claude.add_to_memory("user", f"<request>Question {position}</request>")
+        claude.add_tool_to_memory([{"type": "tool_use", "id": f"tool-{position}", "name": "search", "input": {}}])
+        claude.add_tool_result_to_memory([{"tool_id": f"tool-{position}", "content": "r" * 800}])
+        claude.add_to_memory("assistant", f"Answer {position}")
+
+    first = claude.memory.messages[0]
+    assert first.role == "user" and not first.is_tool_result()
+    assert not claude.memory.over_budget()
+
+
+def test_blocks_round_trip_with_unknown_keys():
+    message = {"role": "user", "content": [
+        {"type": "text", "text": "Hi", "citations": [{"cited_text": "x"}]},
+        {"type": "tool_result", "tool_use_id": "tool-0", "is_error": True,
+         "content": [{"type": "text", "text": "failed"}]},
+    ]}
+    assert Message.from_dict(message).to_dict() == message
+    assert Message.from_dict({"role": "assistant", "content": "plain"}).to_dict() == \
+        {"role": "assistant", "content": "plain"}
+    assert not hasattr(Message("user", "plain"), "__dict__")
+
+
+def test_purified_question_keeps_only_the_request():
+    memory = ChatMessage()
+    memory.append_message("user", "<context>Paris</context><request>Weather?</request><instructions>x</instructions>")
+    memory.append_message("assistant", "Sunny")
+    memory._purify_recent_question()
+    assert memory.messages[0].to_dict()["content"] == [{"type": "text", "text": "<request>Weather?</request>"}]
+    assert memory.total_tokens == sum(estimate_tokens(message.to_dict()) for message in memory.messages)
@@ -0,0 +1,62 @@
+from techxmodule import events, metrics
+
+
+def test_histogram_buckets_quantiles_and_rendering():
+    histogram = metrics.Histogram("test_seconds", "Test.", (0.1, 1.0), ("tool",))
+    for value in (0.05, 0.1, 0.5):
+        histogram.observe(value, labels=('say "hi"',))
+    histogram.observe_many([2.0, 0.5], labels=('say "hi"',))
+
+    assert histogram.count(('say "hi"',)) == 5
+    assert histogram.quantile(0.4, ('say "hi"',)) == 0.1
+    assert histogram.quantile(0.8, ('say "hi"',)) == 1.0
+    assert histogram.quantile(1.0, ('say "hi"',)) == float("inf")
+    assert histogram.quantile(0.5, ("other",)) is None
+    assert histogram.render() == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{tool="say \\"hi\\"",le="0.1"} 2',
+        'test_seconds_bucket{tool="say \\"hi\\"",le="1"} 4',
+        'test_seconds_bucket{tool="say \\"hi\\"",le="+Inf"} 5',
+        'test_seconds_sum{tool="say \\"hi\\""} 3.15',
+        'test_seconds_count{tool="say \\"hi\\""} 5',
+    ]
+
+
+def test_registry_groups_collected_gauges():
+    registry = metrics.Registry()
+    registry.counter("test_total", "Test.", ("outcome",)).inc(labels=("success",))
+    registry.add_collector(lambda: metrics.gauges("test_pool", {"active": 2, "enabled": True}, {"region": "a"}))
+    registry.add_collector(lambda: metrics.gauges("test_pool", {"active": 3}, {"region": "b"}))
+    assert registry.render().splitlines() == [
+        "# HELP test_total Test.",
+        "# TYPE test_total counter",
+        'test_total{outcome="success"} 1',
+        "# HELP test_pool_active active of test_pool",
+        "# TYPE test_pool_active gauge",
+        'test_pool_active{region="a"} 2',
+        'test_pool_active{region="b"} 3',
+    ]
+
+
+def test_lifecycle_events_feed_the_metrics():
+    # Requests of earlier tests may still be on their way to the shared metrics
+    events.default_bus.flush(2)
+    bus = events.EventBus()
+    metrics.attach(bus)
+    before = (metrics.MODEL_REQUESTS.value(("success",)), metrics.MODEL_REQUESTS.value(("cancelled",)),
+              metrics.TIME_TO_FIRST_TOKEN.count(), metrics.TOKENS.value(("cache_read",)),
+              metrics.TOOL_CALLS.value(("test_tool", "timeout")))
+
+    bus.publish(events.REQUEST_COMPLETE, {"latency": 2.0, "ttft": 0.5, "token_gaps": [0.01, 0.02],
+                                          "usage": {"output_tokens": 30, "cache_read_input_tokens": 100}})
+    bus.publish(events.REQUEST_ERROR, {"cancelled": True})
+    bus.publish(events.TOOL_TIMEOUT, {"tool": "test_tool"})
+    assert bus.flush(2)
+    bus.close()
+
+    after = (metrics.MODEL_REQUESTS.value(("success",)), metrics.MODEL_REQUESTS.value(("cancelled",)),
+             metrics.TIME_TO_FIRST_TOKEN.count(), metrics.TOKENS.value(("cache_read",)),
+             metrics.TOOL_CALLS.value(("test_tool", "timeout")))
+    assert [now - then for now, then in zip(after, before)] == [1, 1, 1, 100, 1]
+    assert "gracii_output_tokens_per_second_count" in metrics.render()
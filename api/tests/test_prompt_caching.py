@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from techxmodule.models.chat import Claude
+from techxmodule.streaming import ClaudeStreamDecoder
+from techxmodule.stub import FakeBedrockRuntime, FakeSession
+
+
+CACHED = {"type": "ephemeral"}
+
+
+@pytest.fixture
+def payloads(monkeypatch):
+    sent = []
+    invoke_model = FakeBedrockRuntime.invoke_model
+
+    def recording(self, modelId, body, **kwargs):
+        sent.append(json.loads(body))
+        return invoke_model(self, modelId, body, **kwargs)
+
+    monkeypatch.setattr(FakeBedrockRuntime, "invoke_model", recording)
+    return sent
+
+
+def claude_in_tool_loop():
+    claude = Claude("3.7-sonnet", FakeSession(), "us-east-1", max_chat_memory=10, prompt_caching=True)
+    claude.add_to_memory("user", "<request>First question</request>")
+    claude.add_to_memory("assistant", "First answer")
+    claude.add_to_memory("user", "<request>Search the news</request>")
+    claude.add_tool_to_memory([{"type": "tool_use", "id": "tool-0", "name": "search", "input": {}}])
+    claude.add_tool_result_to_memory([{"tool_id": "tool-0", "content": "Results"}])
+    return claude
+
+
+def marked(message):
+    return [block.get("cache_control") for block in message["content"]]
+
+
+def test_breakpoints_on_system_turn_question_and_last_message(payloads):
+    claude = claude_in_tool_loop()
+    claude.invoke(system_prompt="You are Gracii.")
+
+    payload = payloads[-1]
+    assert payload["system"] == [{"type": "text", "text": "You are Gracii.", "cache_control": CACHED}]
+    messages = payload["messages"]
+    assert [index for index, message in enumerate(messages) if CACHED in marked(message)] == [2, 4]
+    assert marked(messages[4])[-1] == CACHED and messages[4]["content"][-1]["type"] == "tool_result"
+
+
+def test_tools_are_marked_without_a_system_prompt(payloads):
+    claude = claude_in_tool_loop()
+    claude.tools = [{"name": "search", "input_schema": {"type": "object"}},
+                    {"name": "weather", "input_schema": {"type": "object"}}]
+    claude.invoke()
+    assert [tool.get("cache_control") for tool in payloads[-1]["tools"]] == [None, CACHED]
+
+
+def test_memory_is_left_unmarked(payloads):
+    claude = claude_in_tool_loop()
+    claude.invoke(system_prompt="You are Gracii.")
+    assert b"cache_control" not in b"".join(message.encode_json() for message in claude.memory.messages)
+
+
+def test_caching_is_off_by_default(payloads):
+    claude = Claude("3.5-sonnet", FakeSession(), "us-east-1")
+    claude.add_to_memory("user", "<request>Question</request>")
+    claude.invoke(system_prompt="You are Gracii.")
+    assert "cache_control" not in json.dumps(payloads[-1])
+
+
+def test_decoder_reports_cache_usage():
+    decoder = ClaudeStreamDecoder()
+    decoder.feed({"type": "message_start", "message": {"usage": {
+        "input_tokens": 10, "cache_read_input_tokens": 1200, "cache_creation_input_tokens": 300}}})
+    assert (decoder.cache_read_tokens, decoder.cache_write_tokens) == (1200, 300)
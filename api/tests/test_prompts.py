@@ -0,0 +1,48 @@
+import random
+import xml.etree.ElementTree as ET
+
+from techxmodule import utils
+from techxmodule.core import Prompts
+from techxmodule.models.chat import Claude
+
+
+model = Claude.__new__(Claude)
+model.name = "claude"
+
+
+def element(tag, text):
+    node = ET.Element(tag)
+    node.text = text
+    return ET.tostring(node, encoding="unicode", method="xml")
+
+
+def legacy_build(user, context="", example="", instruction=None):
+    # Per-request rendering the compiled Claude template replaced
+    return utils.sanitize_input(utils.combine_string([
+        element("context", context) if context else "",
+        element("request", user),
+        model.build_cot_prompt(instruction),
+        element("examples", example) if example else "",
+    ]))
+
+
+def test_claude_prompt_matches_the_per_request_rendering():
+    prompts = Prompts(model)
+    rng = random.Random(0)
+    alphabet = ["a", "b", " ", "\n", "\t", "&", "<", ">", '"', "é", "<request>"]
+
+    def sample():
+        return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+
+    for _ in range(20_000):
+        arguments = (sample() or "x", sample(), sample(), sample() or None)
+        assert prompts.build(*arguments) == legacy_build(*arguments), arguments
+
+
+def test_static_segment_is_rendered_once_per_instruction_and_example():
+    prompts = Prompts(model)
+    for user in ("first", "second", "third"):
+        arguments = (user, "", "An example", "Think first")
+        assert prompts.build(*arguments) == legacy_build(*arguments)
+    info = prompts._Prompts__claude_static_segment.cache_info()
+    assert (info.misses, info.hits) == (1, 2)
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from techxmodule import events
+from techxmodule.models.chat import Claude
+from techxmodule.stub import FakeSession
+
+
+@pytest.fixture
+def recorded():
+    bus = events.EventBus()
+    received = []
+    bus.subscribe("request.*", received.append, events=True, inline=True)
+    llm = Claude("3.5-sonnet", FakeSession(token_delay=0.005), "us-east-1")
+    llm.event_bus = bus
+
+    def topics():
+        assert bus.flush(2)
+        return [(event.id, event.data.get("cancelled")) for event in received
+                if event.id != events.REQUEST_RESPONSE]
+
+    yield llm, topics
+    bus.close()
+
+
+def test_sync_stream_completes_when_read(recorded):
+    llm, topics = recorded
+    response = llm.invoke("Hello", streaming=True)
+    assert topics() == [(events.REQUEST_START, None)]
+    assert list(response["body"])
+    response["body"].close()
+    assert topics() == [(events.REQUEST_START, None), (events.REQUEST_COMPLETE, None)]
+
+
+def test_async_stream_completes(recorded):
+    llm, topics = recorded
+
+    async def consume():
+        return [event async for event in llm.astream("Hello")]
+
+    assert asyncio.run(consume())
+    assert topics() == [(events.REQUEST_START, None), (events.REQUEST_FIRST_TOKEN, None),
+                        (events.REQUEST_COMPLETE, None)]
+
+
+def test_async_stream_closed_by_the_client_ends_the_request(recorded):
+    llm, topics = recorded
+
+    async def disconnect():
+        stream = llm.astream("Hello")
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(disconnect())
+    assert topics()[-1] == (events.REQUEST_ERROR, True)
+
+
+def test_cancelled_async_stream_ends_the_request(recorded):
+    llm, topics = recorded
+
+    async def cancel():
+        async def consume():
+            async for _ in llm.astream("Hello"):
+                await asyncio.sleep(1)
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+    assert topics()[-1] == (events.REQUEST_ERROR, True)
+    assert [topic for topic, _ in topics()].count(events.REQUEST_ERROR) == 1
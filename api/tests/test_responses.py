@@ -0,0 +1,53 @@
+from techxmodule.responses import ResponseCache
+
+
+SYSTEM = "You are Gracii."
+
+
+def cache_with(question, answer):
+    cache = ResponseCache()
+    cache.store(f"<question>{question}</question>", SYSTEM, answer, question=question)
+    return cache
+
+
+def lookup(cache, question):
+    answer = cache.lookup(f"<question>{question}</question>", SYSTEM, question=question)
+    return answer and answer["text"]
+
+
+def test_rephrasing_hits():
+    cache = cache_with("What is the capital of France?", "Paris")
+    assert lookup(cache, "whats the capital of france") == "Paris"
+    assert lookup(cache, "What is the capital of France?") == "Paris"
+    assert lookup(cache, "Tell me: what's the capital of France") == "Paris"
+    assert cache.stats()["hits"] == 3
+
+
+def test_question_about_another_entity_misses():
+    words = ("please give me a short summary of the history economy culture and main "
+             "tourist attractions of the city of {} in southern europe").split()
+    cache = cache_with(" ".join(words).format("Barcelona"), "Barcelona answer")
+    assert lookup(cache, " ".join(words).format("Valencia")) is None
+    assert lookup(cache_with("capital of france", "Paris"), "capital of spain") is None
+    assert lookup(cache_with("is paris bigger than london", "No"), "is london bigger than paris") is None
+    assert lookup(cache_with("what is 12 + 30", "42"), "what is 12 + 31") is None
+
+
+def test_questions_without_content_words_only_hit_exactly():
+    cache = cache_with("who are you", "Gracii")
+    assert lookup(cache, "what are you") is None
+    assert lookup(cache, "who are you") == "Gracii"
+
+
+def test_time_sensitive_questions_are_never_cached():
+    for question in ("What time is it?", "what's the date today", "latest news about Bedrock"):
+        cache = cache_with(question, "stale answer")
+        assert lookup(cache, question) is None
+        assert cache.stats()["size"] == 0
+    assert cache.stats()["skipped"] == 1
+
+
+def test_other_system_prompt_misses():
+    cache = cache_with("What is the capital of France?", "Paris")
+    assert cache.lookup("<question>whats the capital of france</question>", "Another system",
+                        question="whats the capital of france") is None
@@ -0,0 +1,94 @@
+import mmap
+
+import numpy as np
+
+from techxmodule.context import ContextPacker
+from techxmodule.embeddings import HashingEmbedder
+from techxmodule.retrieval import KnowledgeBase, VectorIndex
+
+
+DOCUMENTS = {
+    "gracii": "Gracii is an assistant created by Phicks. It speaks English, French and Vietnamese.",
+    "boeing": "The Boeing 777 is a wide-body airliner developed by Boeing Commercial Airplanes.",
+}
+
+
+def knowledge_base(path=None):
+    knowledge_base = KnowledgeBase(path)
+    for source, text in DOCUMENTS.items():
+        knowledge_base.ingest_text(text, source)
+    return knowledge_base
+
+
+def test_matching_query_survives_the_default_cut_off():
+    retrieved = knowledge_base().retrieve("Who created Gracii?")
+    assert retrieved["minRelevance"] == HashingEmbedder.min_relevance
+
+    documents = ContextPacker(min_relevance=retrieved["minRelevance"]).render_retrieval(retrieved)
+    assert "created by Phicks" in documents
+    assert "Boeing" not in documents
+
+
+def test_unrelated_query_returns_no_context():
+    retrieved = knowledge_base().retrieve("weather forecast in Paris tomorrow")
+    documents = ContextPacker(min_relevance=retrieved["minRelevance"]).render_retrieval(retrieved)
+    assert documents == "<documents />"
+
+
+def test_cut_off_is_saved_with_the_index(tmp_path):
+    saved = knowledge_base(str(tmp_path))
+    saved.min_relevance = 0.2
+    saved.save()
+    assert KnowledgeBase(str(tmp_path)).min_relevance == 0.2
+    assert KnowledgeBase(str(tmp_path), min_relevance=0.3).retrieve("Boeing")["minRelevance"] == 0.3
+
+
+def test_loaded_records_are_memory_mapped(tmp_path):
+    knowledge_base(str(tmp_path)).save()
+    index = VectorIndex.load(str(tmp_path))
+    assert isinstance(index.records._data, mmap.mmap)
+    assert sorted(record["source"] for record in index.records) == sorted(DOCUMENTS)
+
+    # Saving over a loaded index leaves the files it maps intact
+    saved = knowledge_base(str(tmp_path))
+    saved.ingest_text("The Airbus A380 is a double-deck airliner.", "airbus")
+    saved.save()
+    assert sorted(record["source"] for record in index.records) == sorted(DOCUMENTS)
+    assert len(VectorIndex.load(str(tmp_path)).records) == len(DOCUMENTS) + 1
+
+
+def clustered_index(count=2000, dim=16):
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((20, dim))
+    vectors = (centers[rng.integers(0, 20, count)] + 0.1 * rng.standard_normal((count, dim))).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = VectorIndex(dim)
+    index.add(vectors, [{"text": str(row), "source": f"file-{row % 4}", "metadata": {"shard": row % 4}}
+                        for row in range(count)])
+    return index, vectors
+
+
+def test_ann_search_probing_every_list_is_exact(tmp_path):
+    index, vectors = clustered_index()
+    index.save(str(tmp_path))
+    for query in vectors[:20]:
+        exact = [record["text"] for _, record in index.search(query, 5, mode="exact")]
+        assert [record["text"] for _, record in index.search(query, 5, mode="ann", nprobe=len(index.lists))] == exact
+        assert index.search(query, 1, mode="ann", nprobe=2)[0][1]["text"] == exact[0]
+
+
+def test_removed_and_filtered_chunks_are_skipped(tmp_path):
+    index, vectors = clustered_index()
+    index.save(str(tmp_path))
+    assert index.remove({"source": "file-0"}) == 500
+    index.add(vectors[:1], [{"text": "delta", "source": "file-5", "metadata": {"shard": 5}}])
+    assert len(index) == 1501
+
+    for mode in ("exact", "ann"):
+        results = index.search(vectors[0], 10, mode=mode, where={"shard": [1, 5]})
+        assert len(results) == 10
+        assert {record["metadata"]["shard"] for _, record in results} <= {1, 5}
+        assert results[0][1]["text"] == "delta"
+
+    index.save(str(tmp_path))
+    assert len(VectorIndex.load(str(tmp_path)).records) == 1501
@@ -0,0 +1,94 @@
+import pytest
+
+from botocore.exceptions import ClientError, EventStreamError
+
+from techxmodule.routing import BedrockRouter, CircuitBreaker, Endpoint
+
+
+def client_error(code, error_class=ClientError):
+    return error_class({"Error": {"Code": code, "Message": code}}, "InvokeModel")
+
+
+class FakeRuntime:
+
+    def __init__(self, error=None, stream=()):
+        self.error = error
+        self.stream = stream
+        self.calls = 0
+
+    def invoke_model(self, **kwargs):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return {"body": b"{}"}
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return {"body": self.stream}
+
+
+def expired_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    breaker.record_failure()
+    return breaker
+
+
+def router(*runtimes):
+    endpoints = [Endpoint(f"region-{position}", "model", breaker=expired_breaker())
+                 for position in range(len(runtimes))]
+    for endpoint, runtime in zip(endpoints, runtimes):
+        endpoint.runtime = runtime
+    return BedrockRouter(endpoints)
+
+
+def test_select_claims_only_the_chosen_endpoint():
+    bedrock = router(FakeRuntime(), FakeRuntime())
+    chosen = bedrock.select()
+    assert chosen.breaker.state == CircuitBreaker.HALF_OPEN
+    other, = [endpoint for endpoint in bedrock.endpoints if endpoint is not chosen]
+    assert other.breaker.state == CircuitBreaker.OPEN
+    assert bedrock.select() is other
+
+
+def test_invalid_request_during_trial_frees_the_breaker():
+    bedrock = router(FakeRuntime(error=client_error("ValidationException")))
+    with pytest.raises(ClientError):
+        bedrock.invoke("model", {}, streaming=False)
+    breaker = bedrock.endpoints[0].breaker
+    assert breaker.state == CircuitBreaker.OPEN and breaker.available()
+    assert bedrock.endpoints[0].outstanding == 0
+
+
+def test_successful_trial_closes_the_breaker():
+    bedrock = router(FakeRuntime())
+    bedrock.invoke("model", {}, streaming=False)
+    assert bedrock.endpoints[0].breaker.state == CircuitBreaker.CLOSED
+
+
+def test_error_in_the_middle_of_a_stream_counts_as_a_failure():
+    def stream():
+        yield {"chunk": {"bytes": b"{}"}}
+        raise client_error("throttlingException", EventStreamError)
+
+    throttled = []
+    bedrock = router(FakeRuntime(stream=stream()))
+    bedrock.throttle_listeners.append(throttled.append)
+    response = bedrock.invoke("model", {}, streaming=True)
+    endpoint = bedrock.endpoints[0]
+    assert endpoint.breaker.state == CircuitBreaker.HALF_OPEN
+
+    with pytest.raises(EventStreamError):
+        list(response["body"])
+    assert endpoint.breaker.state == CircuitBreaker.OPEN
+    assert throttled == [endpoint]
+    assert endpoint.outstanding == 0
+
+
+def test_closed_stream_closes_the_breaker():
+    bedrock = router(FakeRuntime(stream=iter([{"chunk": {"bytes": b"{}"}}])))
+    response = bedrock.invoke("model", {}, streaming=True)
+    response["body"].close()
+    assert bedrock.endpoints[0].breaker.state == CircuitBreaker.CLOSED
+    assert bedrock.endpoints[0].outstanding == 0
@@ -0,0 +1,64 @@
+from typing import List, Literal, Optional
+
+from techxmodule.core import Tools
+from techxmodule.schema import compile_validator, function_schema
+
+
+calls = []
+
+
+@Tools.tool("retrieve", "data")
+def forecast_tool(city: str, days: int = 3, unit: Literal["C", "F"] = "C",
+                  hours: Optional[List[int]] = None, *args, **kwargs):
+    """
+    Weather forecast of a city.
+
+    @param city: Name of the city,
+                 in English.
+    @param days: Number of days.
+    @return: The forecast.
+    """
+    calls.append(city)
+    return {"city": city, "days": days}
+
+
+def test_schema_from_signature_and_docstring():
+    assert function_schema(forecast_tool.__wrapped__) == {
+        "name": "forecast_tool",
+        "description": "Weather forecast of a city.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "city": {"type": "string", "description": "Name of the city, in English."},
+                "days": {"type": "integer", "description": "Number of days.", "default": 3},
+                "unit": {"type": "string", "enum": ["C", "F"], "default": "C"},
+                "hours": {"type": "array", "items": {"type": "integer"}},
+            },
+            "required": ["city"],
+        },
+    }
+    assert forecast_tool.schema == function_schema(forecast_tool.__wrapped__)
+
+
+def test_validator_reports_the_first_problem():
+    validate = compile_validator(forecast_tool.schema["input_schema"])
+    assert validate({"city": "Hanoi"}) is None
+    assert validate({"city": "Hanoi", "days": 2, "unit": "F", "hours": None}) is None
+    assert validate([]) == "input must be an object, got list"
+    assert validate({"days": 2}) == "missing required parameter(s): city"
+    assert validate({"city": "Hanoi", "country": "VN"}).startswith("unknown parameter(s): country")
+    assert validate({"city": "Hanoi", "days": "2"}) == "parameter 'days' must be of type integer, got str"
+    assert validate({"city": "Hanoi", "days": True}) == "parameter 'days' must be of type integer, got bool"
+    assert validate({"city": "Hanoi", "unit": "K"}) == "parameter 'unit' must be one of ['C', 'F']"
+    assert validate({"city": None}).startswith("parameter 'city' must be of type string")
+
+
+def test_invalid_call_is_answered_without_running_the_tool():
+    calls.clear()
+    result = Tools.dispatch("forecast_tool", {"city": 42})
+    assert result["type"] == "parameterError"
+    assert "invalid input for forecast_tool" in result["error"]
+    assert calls == []
+
+    assert Tools.dispatch("forecast_tool", {"city": "Hanoi"})["text"] == {"city": "Hanoi", "days": 3}
+    assert calls == ["Hanoi"]
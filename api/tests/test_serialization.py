@@ -0,0 +1,46 @@
+import base64
+import json
+
+from techxmodule.images import ImageStore
+from techxmodule.messages import ChatMessage, Image
+from techxmodule.serialization import dumps_fragments, encode_payload, join_fragments
+
+
+def chat(tmp_path):
+    data = base64.b64encode(b"\x89PNG fake image bytes").decode("ascii")
+    memory = ChatMessage(image_store=ImageStore(spill_dir=str(tmp_path)))
+    memory.append_message("user", "What is on this picture? éè \"quoted\"", [Image("base64", "image/png", data)])
+    memory.append_tool([{"type": "tool_use", "id": "tool-0", "name": "search", "input": {"q": "x"}}])
+    memory.append_tool_result([{"tool_id": "tool-0", "content": "Result"}])
+    return memory
+
+
+def plain(payload):
+    return json.loads(json.dumps(payload, default=lambda obj: obj.__json__()))
+
+
+def test_payload_matches_a_full_encoding(tmp_path):
+    memory = chat(tmp_path)
+    payload = {"anthropic_version": "bedrock-2023-05-31", "system": "You are Gracii.",
+               "messages": list(memory.messages)}
+    assert json.loads(encode_payload(payload)) == plain(payload)
+    only_messages = {"messages": list(memory.messages)}
+    assert json.loads(encode_payload(only_messages)) == plain(only_messages)
+    assert json.loads(encode_payload({"max_tokens": 10, "messages": []})) == {"max_tokens": 10, "messages": []}
+
+
+def test_edited_message_is_encoded_again(tmp_path):
+    memory = chat(tmp_path)
+    message = memory.messages[-1]
+    before = message.encode_json()
+    message.content[0].content[0].text = "Edited"
+    assert message.encode_json() == before
+    memory.refresh(-1)
+    assert b"Edited" in message.encode_json()
+
+
+def test_fragments_split_around_references(tmp_path):
+    ref = ImageStore(spill_dir=str(tmp_path)).put("aGVsbG8=", "image/png")
+    fragments = dumps_fragments({"images": [ref, ref], "text": "x"})
+    assert [type(fragment) is bytes for fragment in fragments] == [True, False, True, False, True]
+    assert json.loads(join_fragments(fragments)) == {"images": ["aGVsbG8=", "aGVsbG8="], "text": "x"}
@@ -0,0 +1,127 @@
+import asyncio
+import base64
+import types
+
+import pytest
+
+from techxmodule import sessions
+from techxmodule.messages import ChatMessage, Image
+from techxmodule.sessions import MemorySessionStore, SQLiteSessionStore, SessionStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sessions, "time", types.SimpleNamespace(monotonic=clock, time=clock))
+    return clock
+
+
+def conversation(text):
+    memory = ChatMessage()
+    memory.append_message("user", text)
+    return memory
+
+
+def texts(memory):
+    return [block.text for message in memory.messages for block in message.content]
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+def test_least_recently_used_session_is_evicted(clock):
+    store = MemorySessionStore(max_sessions=2, ttl=None)
+    store.save("a", conversation("a"))
+    store.save("b", conversation("b"))
+    store.load("a")
+    store.save("c", conversation("c"))
+    assert len(store) == 2
+    assert texts(store.load("a")) == ["a"]
+    assert texts(store.load("b")) == []
+
+
+def test_idle_session_expires(clock):
+    store = MemorySessionStore(ttl=60)
+    store.save("a", conversation("a"))
+    clock.now += 30
+    assert texts(store.load("a")) == ["a"]
+    clock.now += 61
+    assert texts(store.load("a")) == []
+    assert len(store) == 0
+
+
+def test_sqlite_round_trip_keeps_image_and_tool_blocks(tmp_path):
+    data = base64.b64encode(b"\x89PNG fake image bytes").decode("ascii")
+    memory = ChatMessage(max_chat_message=20, max_tokens=5000)
+    memory.append_message("user", "What is on this picture?", [Image("base64", "image/png", data)])
+    memory.append_tool([{"type": "text", "text": "Searching."},
+                        {"type": "tool_use", "id": "tool-1", "name": "browsing_web", "input": {"query": "cat"}}])
+    memory.append_tool_result([{"tool_id": "tool-1", "content": "A cat."}])
+    memory.append_message("assistant", "A cat.")
+
+    SQLiteSessionStore(str(tmp_path / "sessions.db")).save("s", memory)
+    loaded = SQLiteSessionStore(str(tmp_path / "sessions.db")).load("s")
+
+    assert [message.to_dict() for message in loaded.messages] == [message.to_dict() for message in memory.messages]
+    assert loaded.messages[0].content[1].source["data"].data() == data
+    assert (loaded.max_chat_message, loaded.max_tokens, loaded.total_tokens) == (20, 5000, memory.total_tokens)
+
+
+def test_sqlite_session_expires(tmp_path, clock):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"), ttl=60)
+    store.save("a", conversation("a"))
+    store.save("b", conversation("b"))
+    clock.now += 61
+    store.save("b", conversation("b"))
+    assert texts(store.load("a")) == []
+    assert store.purge_expired() == 0
+    assert texts(store.load("b")) == ["b"]
+
+
+@pytest.mark.parametrize("store", [MemorySessionStore(), SQLiteSessionStore(":memory:")], ids=["memory", "sqlite"])
+def test_concurrent_turns_of_a_session_run_one_after_the_other(store):
+    async def turn(question):
+        held = await store.begin_turn("s")
+        try:
+            memory = store.load("s")
+            memory.append_message("user", question)
+            await asyncio.sleep(0.01)  # streaming the answer
+            memory.append_message("assistant", f"answer to {question}")
+            store.save("s", memory)
+        finally:
+            held.release()
+
+    async def main():
+        await asyncio.gather(turn("first"), turn("second"), turn("third"))
+
+    asyncio.run(main())
+    assert texts(store.load("s")) == ["first", "answer to first", "second", "answer to second",
+                                      "third", "answer to third"]
+    assert store._turns == {}
+
+
+def test_cancelled_wait_for_a_turn_leaves_no_lock_behind():
+    store = MemorySessionStore()
+
+    async def main():
+        held = await store.begin_turn("s")
+        waiter = asyncio.ensure_future(store.begin_turn("s"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        held.release()
+        held.release()
+
+    asyncio.run(main())
+    assert store._turns == {}
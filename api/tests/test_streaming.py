@@ -0,0 +1,75 @@
+import json
+
+from techxmodule.streaming import ClaudeStreamDecoder, MessageDelta, MessageStart, TextDelta, ToolUse
+
+
+# Claude stream of a Bedrock response: text, a tool call with its input split over
+# several input_json_delta events, then text again
+RECORDED = [
+    {"type": "message_start", "message": {"id": "msg_1", "type": "message", "role": "assistant", "content": [],
+                                          "usage": {"input_tokens": 412, "output_tokens": 1,
+                                                    "cache_read_input_tokens": 300}}},
+    {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+    {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "[ Searching ]"}},
+    {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": " the web."}},
+    {"type": "content_block_stop", "index": 0},
+    {"type": "content_block_start", "index": 1,
+     "content_block": {"type": "tool_use", "id": "toolu_1", "name": "browsing_web", "input": {}}},
+    {"type": "content_block_delta", "index": 1, "delta": {"type": "input_json_delta", "partial_json": ""}},
+    {"type": "content_block_delta", "index": 1, "delta": {"type": "input_json_delta", "partial_json": "{\"search_"}},
+    {"type": "content_block_delta", "index": 1, "delta": {"type": "input_json_delta", "partial_json": "term\": \"Bedrock"}},
+    {"type": "content_block_delta", "index": 1, "delta": {"type": "input_json_delta", "partial_json": " pricing\"}"}},
+    {"type": "content_block_stop", "index": 1},
+    {"type": "content_block_start", "index": 2, "content_block": {"type": "text", "text": ""}},
+    {"type": "content_block_delta", "index": 2, "delta": {"type": "text_delta", "text": " Back soon."}},
+    {"type": "content_block_stop", "index": 2},
+    {"type": "message_delta", "delta": {"stop_reason": "tool_use", "stop_sequence": None},
+     "usage": {"output_tokens": 57}},
+    {"type": "message_stop"},
+]
+
+
+def test_interleaved_text_and_tool_use_blocks():
+    decoder = ClaudeStreamDecoder()
+    events = [decoder.feed_bytes(json.dumps(chunk).encode("utf-8")) for chunk in RECORDED]
+
+    assert [type(event).__name__ for event in events if event is not None] == [
+        "MessageStart", "TextDelta", "TextDelta", "ToolUse", "TextDelta", "MessageDelta"]
+    assert [(event.index, event.text) for event in events if type(event) is TextDelta] == [
+        (0, "[ Searching ]"), (0, " the web."), (2, " Back soon.")]
+    tool = next(event for event in events if type(event) is ToolUse)
+    assert (tool.index, tool.id, tool.name, tool.input) == (1, "toolu_1", "browsing_web", {"search_term": "Bedrock pricing"})
+
+    assert decoder.text == "[ Searching ] the web. Back soon."
+    assert decoder.body == [
+        {"type": "text", "text": "[ Searching ] the web."},
+        {"type": "tool_use", "id": "toolu_1", "name": "browsing_web", "input": {"search_term": "Bedrock pricing"}},
+        {"type": "text", "text": " Back soon."},
+    ]
+    assert decoder.tools == [decoder.body[1]]
+    assert decoder.stop_reason == "tool_use"
+    assert decoder.usage == {"input_tokens": 412, "output_tokens": 57, "cache_read_input_tokens": 300}
+    assert (decoder.cache_read_tokens, decoder.cache_write_tokens) == (300, 0)
+    assert type(events[0]) is MessageStart and type(events[-2]) is MessageDelta
+
+
+def test_reset_starts_a_new_message():
+    decoder = ClaudeStreamDecoder()
+    for chunk in RECORDED:
+        decoder.feed(chunk)
+    decoder.reset()
+    decoder.feed({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": "Hi"}})
+    decoder.feed({"type": "content_block_stop", "index": 0})
+    assert (decoder.body, decoder.tools, decoder.stop_reason) == ([{"type": "text", "text": "Hi"}], [], "")
+
+
+def test_tool_use_without_input_or_with_broken_input():
+    decoder = ClaudeStreamDecoder()
+    decoder.feed({"type": "content_block_start", "index": 0,
+                  "content_block": {"type": "tool_use", "id": "a", "name": "now", "input": {}}})
+    assert decoder.feed({"type": "content_block_stop", "index": 0}).input == {}
+    decoder.feed({"type": "content_block_start", "index": 1,
+                  "content_block": {"type": "tool_use", "id": "b", "name": "cut", "input": {}}})
+    decoder.feed({"type": "content_block_delta", "index": 1,
+                  "delta": {"type": "input_json_delta", "partial_json": "{\"query\": \"trunc"}})
+    assert decoder.feed({"type": "content_block_stop", "index": 1}).input == {}
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from techxmodule.core import Tools
+from techxmodule.models.chat import Claude
+from techxmodule.stub import FakeSession
+
+
+release_hung_tool = threading.Event()
+
+
+@Tools.tool("retrieve", "data")
+def sleep_tool(seconds: float):
+    """
+    @param seconds: Seconds to sleep.
+    """
+    time.sleep(seconds)
+    return f"slept {seconds}"
+
+
+@Tools.tool("retrieve", "data")
+def hang_tool():
+    """
+    Blocks until the test releases it.
+    """
+    release_hung_tool.wait(5)
+    return "released"
+
+
+@pytest.fixture
+def claude():
+    return Claude("3.5-sonnet", FakeSession(), "us-east-1")
+
+
+def call(name, position, **arguments):
+    return {"id": f"tool-{position}", "name": name, "input": arguments}
+
+
+def test_queued_tools_are_timed_from_their_start(claude):
+    tools = [call("sleep_tool", position, seconds=0.2) for position in range(3)]
+    results = claude.tool_use(tools, max_concurrency=1, timeout=0.35)
+    assert [result["content"] for result in results] == ["slept 0.2"] * 3
+    assert [result["tool_id"] for result in results] == ["tool-0", "tool-1", "tool-2"]
+
+
+def test_timed_out_tool_is_counted_as_hung_until_it_returns(claude):
+    release_hung_tool.clear()
+    results = claude.tool_use([call("hang_tool", 0), call("sleep_tool", 1, seconds=0)],
+                              max_concurrency=1, timeout=0.1)
+    assert "timed out" in results[0]["content"]
+    assert results[1]["content"] == "slept 0"
+    assert Claude._hung_tools == 1
+
+    release_hung_tool.set()
+    deadline = time.monotonic() + 2
+    while Claude._hung_tools and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert Claude._hung_tools == 0
+
+
+def test_saturated_pool_fails_fast(claude, monkeypatch):
+    monkeypatch.setattr(Claude, "_hung_tools", Claude.MAX_PROCESS_TOOL_CONCURRENCY)
+    started = time.monotonic()
+    results = claude.tool_use([call("sleep_tool", 0, seconds=1)])
+    assert "every tool worker is busy" in results[0]["content"]
+    assert time.monotonic() - started < 0.5
+
+
+def test_timed_out_tool_publishes_one_terminal_event(claude):
+    from techxmodule import events
+
+    bus = events.EventBus()
+    claude.event_bus = bus
+    received = []
+    bus.subscribe("tool.*", lambda event: received.append(event.id), events=True, inline=True)
+    release_hung_tool.clear()
+    claude.tool_use([call("hang_tool", 0)], timeout=0.05)
+    release_hung_tool.set()
+    time.sleep(0.1)
+    bus.flush(1)
+    assert received == [events.TOOL_START, events.TOOL_TIMEOUT]
@@ -0,0 +1,144 @@
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+
+import pytest
+
+from techxmodule.core import Tools
+
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Import-time budget of the model module, tools and the heavy utils dependencies must stay lazy
+IMPORT_BUDGET_MS = 150
+
+
+@pytest.fixture
+def tool_module(tmp_path, monkeypatch):
+    """
+    Write a tool module and make it the only pending tool module.
+    """
+    def write(name, body):
+        (tmp_path / f"{name}.py").write_text(textwrap.dedent(body))
+        monkeypatch.setattr(Tools, "_modules", [name])
+        return name
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(Tools, "_registry", dict(Tools._registry))
+    monkeypatch.setattr(Tools, "_module_locks", {})
+    monkeypatch.setattr(Tools, "_declarations", {})
+    yield write
+    for name in list(sys.modules):
+        if name.startswith("registry_test_"):
+            del sys.modules[name]
+
+
+def test_lookup_during_import_waits_for_the_module(tool_module):
+    tool_module("registry_test_slow", """
+        import time
+        from techxmodule.core import Tools
+
+        time.sleep(0.2)
+
+        @Tools.tool("retrieve", "data")
+        def slow_module_tool():
+            \"\"\"
+            Defined by a module slow to import.
+            \"\"\"
+            return "ok"
+    """)
+    found, errors = [], []
+
+    def lookup():
+        try:
+            found.append(Tools.get("slow_module_tool"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lookup) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len(found) == 4 and Tools._modules == []
+
+
+def test_failed_import_is_retried(tool_module, tmp_path):
+    marker = tmp_path / "failed_once"
+    tool_module("registry_test_flaky", f"""
+        import os
+        from techxmodule.core import Tools
+
+        if not os.path.exists({str(marker)!r}):
+            open({str(marker)!r}, "w").close()
+            raise RuntimeError("first import fails")
+
+        @Tools.tool("retrieve", "data")
+        def flaky_module_tool():
+            \"\"\"
+            Defined by a module failing on its first import.
+            \"\"\"
+            return "ok"
+    """)
+    with pytest.raises(RuntimeError):
+        Tools.get("flaky_module_tool")
+    assert Tools._modules == ["registry_test_flaky"]
+    assert Tools.get("flaky_module_tool")()["text"] == "ok"
+
+
+def test_schemas_are_read_without_importing_the_module(tool_module):
+    tool_module("registry_test_unimported", """
+        from typing import List
+        from techxmodule.core import Tools
+
+        raise RuntimeError("must not be imported for its schemas")
+
+        @Tools.tool("retrieve", "data", description="Look things up.")
+        def unimported_tool(query: str, tags: List[str] | None = None, limit: int = 3):
+            \"\"\"
+            @param query: What to look up.
+            \"\"\"
+    """)
+    assert Tools.schemas(["unimported_tool"]) == [{
+        "name": "unimported_tool",
+        "description": "Look things up.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "What to look up."},
+                "tags": {"type": "array", "items": {"type": "string"}},
+                "limit": {"type": "integer", "default": 3},
+            },
+            "required": ["query"],
+        },
+    }]
+    assert "registry_test_unimported" not in sys.modules
+
+
+def test_declared_schemas_match_the_imported_tools():
+    from techxmodule.schema import declared_schemas
+    declared = declared_schemas("tools")
+    assert set(declared) >= {"browsing_web", "browsing_video", "browsing_map", "scrape_webpage"}
+    for name, schema in declared.items():
+        assert schema == Tools.get(name).schema
+
+
+def test_server_import_leaves_the_tools_unimported():
+    code = ("import sys, main; print(' '.join(sorted(set(sys.modules) & "
+            "{'tools', 'duckduckgo_search', 'httpx', 'techxmodule.crawler'})))")
+    loaded = subprocess.run([sys.executable, "-c", code], cwd=API_DIR,
+                            capture_output=True, text=True, check=True).stdout.split()
+    assert loaded == []
+
+
+def test_model_module_import_time():
+    timings = []
+    for _ in range(5):
+        report = subprocess.run([sys.executable, "-X", "importtime", "-c", "import techxmodule.models.chat"],
+                                cwd=API_DIR, capture_output=True, text=True, check=True).stderr
+        for line in report.splitlines():
+            if line.rstrip().endswith("| techxmodule.models.chat"):
+                timings.append(int(line.split("|")[1]) / 1000)
+    assert min(timings) <= IMPORT_BUDGET_MS, f"import took {min(timings):.1f} ms"
@@ -0,0 +1,56 @@
+import random
+import re
+
+from techxmodule import utils
+
+
+TAGS = "instructions|examples|context|documents"
+ATTRIBUTES = r"(?:\s[^<>]*?)?"
+
+
+def reference(tags):
+    # Self-closing tag, or opening tag up to the first closing tag of the same name
+    return re.compile(rf"<(?:{tags}){ATTRIBUTES}/>"
+                      rf"|<({tags}){ATTRIBUTES}>.*?</\1{ATTRIBUTES}/?>", re.DOTALL)
+
+
+def test_closing_tag_with_whitespace_or_attributes_closes_the_element():
+    assert utils.clean_tag("a<context>x</context >b") == "ab"
+    assert utils.clean_tag("a<context id=1>x</context\n>b") == "ab"
+    assert utils.clean_tag("a<context>x</context id=1>b<context>y</context>c") == "abc"
+    assert utils.REQUEST_TAG.extract("<request>q</request >") == [("request", "q")]
+
+
+def test_matches_a_dotall_regex_on_random_markup():
+    pieces = ["a", " ", "\n", "<", ">", "/", "=", "x",
+              "<context>", "</context>", "<context", "</context", "<context/>", "<documents id=1>",
+              "</documents >", "<request>", "</request>", "</request ", "<examples>", "</examples>",
+              "</instructions>", "<contexts>"]
+    strip_reference, keep_reference = reference(TAGS), reference("request")
+    rng = random.Random(0)
+    for _ in range(20_000):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 30)))
+        assert utils.clean_tag(text) == strip_reference.sub("", text), text
+        assert utils.REQUEST_TAG.keep(text) == "".join(
+            match.group(0) for match in keep_reference.finditer(text)), text
+
+
+def test_json_to_xml_escapes_and_names_list_items():
+    document = {"results": [{"title": "a & b", "href": "x?a=1&b=2"}], "n": 3}
+    assert utils.json_to_xml(document) == ("<results><result><title>a &amp; b</title>"
+                                           "<href>x?a=1&amp;b=2</href></result></results><n>3</n>")
+    assert utils.json_to_xml('{"a": "<b>"}') == "<a>&lt;b&gt;</a>"
+
+
+def test_json_to_xml_handles_deep_nesting():
+    document = {"leaf": "value"}
+    for level in range(20_000):
+        document = {f"level{level}": document}
+    xml = utils.json_to_xml(document)
+    assert xml.startswith("<level19999><level19998>") and xml.endswith("</level19998></level19999>")
+    assert xml.count("<leaf>value</leaf>") == 1
+
+
+def test_combine_string_ends_every_line():
+    assert utils.combine_string(["a", "b"]) == "a\nb\n"
+    assert utils.combine_string([]) == ""
@@ -1,30 +1,44 @@
+import os
+
 from techxmodule.core import Tools
+from techxmodule.cache import CachePolicy
+from techxmodule.context import ContextPacker, ranked
+from techxmodule.crawler import CrawlService
 from techxmodule.utils import json_to_xml
 from duckduckgo_search import DDGS
 
 
-import scrapy
-from scrapy.crawler import CrawlerProcess
-from scrapy import signals
-from scrapy.signalmanager import dispatcher
-from bs4 import BeautifulSoup
-import re
+# Search results are reused across turns and users for a few minutes.
+# Set GRACII_TOOL_CACHE_DB to persist them in a local SQLite file.
+SEARCH_CACHE = CachePolicy(ttl=600, maxsize=512, path=os.getenv("GRACII_TOOL_CACHE_DB"))
+# Search snippets: mirrored / syndicated results are dropped as near-duplicates
+SEARCH_PACKER = ContextPacker(max_tokens=1500)
+# Seconds a search request may take, tools must return before Claude.TOOL_TIMEOUT
+# or their worker thread stays busy after the caller gave up on them
+SEARCH_TIMEOUT = 10
 
 
-@Tools.tool("retrieve", "data")
-def browsing_web(search_term):
+@Tools.tool("retrieve", "data", cache=SEARCH_CACHE)
+def browsing_web(search_term: str):
     """
-    Function to retrieve links and topics from internet browser
+    Function to retrieve, browsing links and topics from internet browser
+
+    @param search_term: The keyword or term that you want to search for
     """
-    result = ""
-    for i in DDGS().text(search_term, max_results=5):
-        result += json_to_xml(i)
-    return result
+    results = DDGS(timeout=SEARCH_TIMEOUT).text(search_term, max_results=5)
+    return SEARCH_PACKER.render(ranked(
+        {"source": item.get("href"), "content": f"{item.get('title', '')}\n{item.get('body', '')}"}
+        for item in results))
     
     
-@Tools.tool("retrieve", "data")
-def browsing_video(search_term):
-    return json_to_xml(DDGS().videos(
+@Tools.tool("retrieve", "data", cache=SEARCH_CACHE)
+def browsing_video(search_term: str):
+    """
+    Function to search for the most relevant recent video on the internet
+
+    @param search_term: The keyword or term of the video that you want to search for
+    """
+    return json_to_xml(DDGS(timeout=SEARCH_TIMEOUT).videos(
         keywords=search_term,
         region="wt-wt",
         safesearch="off",
@@ -34,10 +48,10 @@ def browsing_video(search_term):
         max_results=1))
 
     
-@Tools.tool("retrieve", "data")
+@Tools.tool("retrieve", "data", cache=SEARCH_CACHE)
 def browsing_map(
         search_term: str, 
-        place: str,
+        place: str | None = None,
         street: str | None = None,
         city: str | None = None,
         county: str | None = None,
@@ -48,8 +62,24 @@ def browsing_map(
         longitude: str | None = None,
         radius: int = 5,
         max_results: int = 5):
+    """
+    Function to get location or search for facilities around the areas.
+
+    @param search_term: The keyword or term of type of the facility that you want to search for. For example: 'shop', 'gas', etc...
+    @param place: The place, location that you want to search around it. If this parameter is set, the other location parameters are not used.
+    @param street: House number/street.
+    @param city: City of search.
+    @param county: County of search.
+    @param state: State of search.
+    @param country: Country of search.
+    @param postalcode: Postal code of search.
+    @param latitude: Geographic coordinate (north-south position).
+    @param longitude: Geographic coordinate (east-west position).
+    @param radius: Expand the search square by the distance in kilometers.
+    @param max_results: Maximum number of results.
+    """
     result = ""
-    for i in DDGS().maps(
+    for i in DDGS(timeout=SEARCH_TIMEOUT).maps(
             search_term,
             place,
             street,
@@ -66,78 +96,61 @@ def browsing_map(
     return result
 
 
-class WebpageSpider(scrapy.Spider):
-    name = 'webpage_spider'
-    
-    def __init__(self, url=None, max_pages=5, *args, **kwargs):
-        super(WebpageSpider, self).__init__(*args, **kwargs)
-        self.start_urls = [url]
-        self.max_pages = max_pages
-        self.pages_crawled = 0
+# One crawler for the whole process, its connection pool is reused by every call.
+# Each page is reduced to at most PAGE_CHARS of text, a whole result to SCRAPE_CHARS.
+PAGE_CHARS = 4000
+SCRAPE_CHARS = 12000
+CRAWL_TIMEOUT = 45
+# Upper bound of the max_pages requested by the model
+MAX_SCRAPE_PAGES = 10
+crawler = CrawlService(page_chars=PAGE_CHARS)
+# Pages reached first in the crawl rank higher; boilerplate-only pages are dropped as duplicates
+SCRAPE_PACKER = ContextPacker(max_tokens=SCRAPE_CHARS // 4)
 
-    def parse(self, response):
-        self.pages_crawled += 1
-        yield {'url': response.url, 'content': response.text}
 
-        if self.pages_crawled < self.max_pages:
-            links = response.css('a::attr(href)').getall()
-            for link in links:
-                if link.startswith('/'):
-                    yield response.follow(link, self.parse)
+@Tools.tool("retrieve", "data")
+def scrape_webpage(url: str, max_pages: int = 5):
+    """
+    Function access into the webpage an scarpe all the available informations from the body of the webpage.
+
+    @param url: The url link of the webpage that you want to srape the information
+    @param max_pages: Maximum number of pages of the same site to read, starting from the url.
+    """
+    max_pages = max(1, min(max_pages, MAX_SCRAPE_PAGES))
+    results = crawler.crawl(url, max_pages=max_pages, timeout=CRAWL_TIMEOUT)
+    
+    if results:
+        return SCRAPE_PACKER.render(ranked(
+            {"source": item['url'], "content": item['content']} for item in results))
+    else:
+        return None
 
 
-from bs4 import BeautifulSoup
-import re
+# Local knowledge base built with `python -m techxmodule.retrieval ingest <files> <index dir>`,
+# opened on first use from GRACII_KB_PATH
+KB_PATH = os.getenv("GRACII_KB_PATH")
+_knowledge_base = None
 
-def clean_html(content):
-    soup = BeautifulSoup(content, 'html.parser')
-    
-    # Remove unwanted tags
-    for tag in soup(['script', 'style', 'svg', 'noscript']):
-        tag.decompose()
-    
-    # Remove all attributes except href for links
-    for tag in soup.find_all():
-        if tag.name == 'a' and tag.has_attr('href'):
-            tag.attrs = {}
-        else:
-            tag.attrs = {}
-    
-    # Convert the soup back to a string
-    cleaned_html = str(soup.body) if soup.body else str(soup)
-    
-    # Remove extra whitespace
-    cleaned_html = re.sub(r'\s+', ' ', cleaned_html).strip()
-    
-    # Remove empty tags
-    cleaned_html = re.sub(r'<[^>]*>\s*</[^>]*>', '', cleaned_html)
-    
-    return cleaned_html
 
-@Tools.tool("retrieve", "data")
-def scrape_webpage(url, max_pages=5):
-    results = []
+def knowledge_base():
+    global _knowledge_base
+    if _knowledge_base is None:
+        from techxmodule.retrieval import KnowledgeBase
+        _knowledge_base = KnowledgeBase(KB_PATH)
+    return _knowledge_base
 
-    def crawler_results(signal, sender, item, response, spider):
-        results.append(item)
 
-    dispatcher.connect(crawler_results, signal=signals.item_passed)
+@Tools.tool("retrieve", "documents")
+def retrieve_knowledge(query: str, max_results: int = 5):
+    """
+    Function to search the internal knowledge base for passages relevant to a question.
 
-    process = CrawlerProcess(settings={
-        'LOG_LEVEL': 'ERROR',
-        'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    })
-    
-    process.crawl(WebpageSpider, url=url, max_pages=max_pages)
-    process.start()
-    
-    if results:
-        all_content = '\n\n'.join([clean_html(item['content']) for item in results])
-        return all_content
-    else:
-        return None
+    @param query: The question or keywords to look up in the knowledge base
+    @param max_results: Maximum number of passages to return.
+    """
+    return knowledge_base().retrieve(query, max_results)
 
 if __name__ == "__main__":
     url = "https://en.wikipedia.org/wiki/Boeing_777"
     content = scrape_webpage(url)
-    print(content)
\ No newline at end of file
+    print(content)
@@ -28,6 +28,8 @@ function App() {
   const sidePanelRef = useRef<HTMLDivElement>(null)
   const lastScrollTop = useRef(0)
   const isScrollingRef = useRef(false)
+  // Conversation id assigned by the server on the first answer, sent back with every message
+  const sessionIdRef = useRef<string | null>(null)
 
   const [overlayHeight, setOverlayHeight] = useState(150) // Default height in pixels
 
@@ -109,6 +111,7 @@ function App() {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
+            ...(sessionIdRef.current ? { 'X-Session-Id': sessionIdRef.current } : {}),
           },
           body: JSON.stringify({ message: input }),
         });
@@ -116,6 +119,7 @@ function App() {
         if (!response.ok) {
           throw new Error(`HTTP error! status: ${response.status}`);
         }
+        sessionIdRef.current = response.headers.get('X-Session-Id') ?? sessionIdRef.current;
 
         const reader = response.body?.getReader();
         const decoder = new TextDecoder();